@@ -0,0 +1,473 @@
+from __future__ import annotations
+# bench_core.py
+"""
+Benchmarks of the simulation core, with a JSON report and regression gating.
+
+Timed operations, over particle counts 10^2 ... 10^6 and component counts
+5 ... 1000:
+    update_all                  ParticleManager.update_all (linear motion)
+    handle_collisions           batch collision engine, whole bank
+    handle_collision_scalar     original per-particle handle_collision loop
+                                (only up to 2e5 particle-component pairs)
+    populate_particles          spawning the particles in the fuel rods
+    neutron_energy_distribution sampling of each spectrum
+    material_lookup             cross-sections of the whole bank on the union
+                                energy grid of all the materials, and the
+                                sampling of the reactions (src/materials.py)
+    particle_step               move + collisions + mesh tally of one step,
+                                with the bank in spawn order (layout=spawn)
+                                or sorted along the Morton order of the
+                                particle cells (layout=morton)
+    sort_particles              ParticleManager.sort_particles of a bank in
+                                spawn order (Morton sort + compaction)
+    update_simulation_frame     one animation frame (physics + renderer +
+                                canvas draw) on the Agg backend
+    import                      start of a new interpreter importing one module
+                                (what every worker process pays), numpy and
+                                matplotlib.pyplot as references
+
+The headless modules (HEADLESS_MODULES) must not load matplotlib: the run
+fails when one of them does, whatever the timings.
+
+Every case loops its call until one run lasts --min-time (like timeit's
+autorange), and reports the median time per call over `--repeat` runs and a
+throughput (particles, or energies, per second). The report also gives the
+throughput ratio morton / spawn of each particle_step pair (layout_gains).
+With --baseline, each case is compared with the same case of a previous
+report, and the exit code is 1 when one is slower than the baseline by more
+than --threshold (0.2 = 20%). The import cases (a new process each, noisy)
+are not part of this throughput gate: they fail when they take more than
+--import-margin seconds longer than in the baseline.
+
+Everything runs offline, on the CPU, with the packages of requirements.txt.
+
+Command line (from the repository root):
+    python -m benchmarks.bench_core --output bench.json
+    python -m benchmarks.bench_core --quick --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_core --quick --baseline benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from src.area_reactor import ReactorArea
+from src.collision_engine import handle_collision, handle_collisions
+from src.materials import MaterialTable, load_material, sample_reactions
+from src.mesh_tally import MeshTally
+from src.neutron_energy_distribution import neutron_energy_distribution
+from src.particle_manager import ParticleManager
+from src.reactor_builder import populate_particles
+from src.reactor_geometry import reactor_limits
+from src.scenario import build_reactor, compile_scenario
+
+PARTICLE_COUNTS = (10**2, 10**3, 10**4, 10**5, 10**6)
+COMPONENT_COUNTS = (5, 50, 1000)
+QUICK_PARTICLE_COUNTS = (10**2, 10**3, 10**4)
+QUICK_COMPONENT_COUNTS = (5, 50)
+DISTRIBUTIONS = ("debug_uniform", "debug_normal", "watt", "maxwellian")
+LAYOUTS = ("spawn", "morton")
+STEP_MESH = (32, 32, 16)
+MATERIALS = ("uo2", "b4c", "h2o", "steel")
+
+# Startup cost, the geometry and physics must stay importable without matplotlib
+HEADLESS_MODULES = ("src.simulation_core", "src.batch_runner", "src.parallel_batches",
+                    "src.criticality", "src.checkpoint", "src.simulation_helpers")
+IMPORT_MODULES = ("numpy", "matplotlib.pyplot") + HEADLESS_MODULES + ("src.reactor_renderer",)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Work limits of the slow cases
+SCALAR_MAX_PAIRS = 2 * 10**5
+FRAME_MAX_PARTICLES = 10**5
+
+# Timing: runs per case, shortest run (s), allowed startup slowdown (s)
+REPEAT = 7
+MIN_TIME = 0.1
+IMPORT_MARGIN = 0.25
+
+
+# --------------------------
+# Test reactors and particles
+# --------------------------
+def make_reactor(num_components: int) -> ReactorArea:
+    """
+    Square lattice of num_components rods in a reactor 2 units per rod
+    wide, behaviors absorb / reflect / transmit in turn, fixed heights.
+    """
+    side = int(np.ceil(np.sqrt(num_components)))
+    positions = [[1.0 + 2 * (k % side), 1.0 + 2 * (k // side)] for k in range(num_components)]
+    groups = []
+    for k, behavior in enumerate(("absorb", "reflect", "transmit")):
+        chosen = positions[k::3]
+        if chosen:
+            groups.append({"kind": "rod", "positions": chosen, "width": 1.0, "depth": 1.0,
+                           "height": 2.0 + 2 * k, "behavior": behavior})
+    compiled = compile_scenario({"reactor": {"width": 2 * side, "depth": 2 * side,
+                                             "height": 8.0},
+                                 "components": groups})
+    return build_reactor(compiled)[0]
+
+
+def make_particles(reactor: ReactorArea, num_particles: int, seed: int = 0) -> ParticleManager:
+    """Particles uniform in the reactor, random velocities."""
+    rng = np.random.default_rng(seed)
+    particle_manager = ParticleManager(capacity=num_particles)
+    limits = np.array([reactor.width, reactor.depth, reactor.height])
+    particle_manager.spawn_many(rng.random((num_particles, 3)) * limits,
+                                rng.normal(0.0, 2.0, (num_particles, 3)),
+                                rng.uniform(0.1, 10.0, num_particles))
+    return particle_manager
+
+
+def time_case(call, reset=None, repeat: int = REPEAT,
+              min_time: float = MIN_TIME) -> tuple[float, int]:
+    """
+    Median wall time per call over `repeat` runs, after one warm-up call.
+    Each run makes `loops` calls, doubled until one run lasts min_time, so
+    that the short cases are not timed on a single call. reset() is called
+    before every call and is not timed.
+    Returns:
+        (seconds per call, loops)
+    """
+    def run(loops: int) -> float:
+        elapsed = 0.0
+        for _ in range(loops):
+            if reset is not None:
+                reset()
+            start = time.perf_counter()
+            call()
+            elapsed += time.perf_counter() - start
+        return elapsed
+
+    run(1)
+    loops = 1
+    first = run(loops)
+    while first < min_time:
+        loops *= 2
+        first = run(loops)
+    runs = [first] + [run(loops) for _ in range(repeat - 1)]
+    return float(np.median(runs)) / loops, loops
+
+
+# --------------------------
+# Cases: each one returns (call, reset, items), and optionally a cleanup
+# function called after the timing
+# --------------------------
+def case_update_all(num_particles: int):
+    particle_manager = make_particles(make_reactor(5), num_particles)
+    return (lambda: particle_manager.update_all(0.05)), None, num_particles
+
+
+def case_handle_collisions(num_particles: int, num_components: int):
+    reactor = make_reactor(num_components)
+    particle_manager = make_particles(reactor, num_particles)
+    bank = particle_manager.bank
+    bank.move(0.05)
+    saved = {key: value.copy() for key, value in bank.state().items()}
+    # absorptions and reflections change the bank, start again from the same state
+    return (lambda: handle_collisions(bank, reactor)), (lambda: bank.restore(saved)), num_particles
+
+
+def case_handle_collision_scalar(num_particles: int, num_components: int):
+    reactor = make_reactor(num_components)
+    particle_manager = make_particles(reactor, num_particles)
+    particle_manager.bank.move(0.05)
+    saved = {key: value.copy() for key, value in particle_manager.bank.state().items()}
+
+    def call() -> None:
+        for particle in particle_manager.particles:
+            for component in reactor.components:
+                if handle_collision(particle, component):
+                    break
+    return call, (lambda: particle_manager.bank.restore(saved)), num_particles
+
+
+def case_populate_particles(num_particles: int):
+    reactor = make_reactor(5)
+    fuel_rods = reactor.components
+    per_fuel = max(num_particles // len(fuel_rods), 1)
+    energies = np.full(per_fuel * len(fuel_rods), 1.0)
+    rng = np.random.default_rng(0)
+    holder = {}
+
+    def call() -> None:
+        holder["manager"] = ParticleManager(capacity=energies.shape[0])
+        # populate_particles prints a note on every call
+        with contextlib.redirect_stdout(io.StringIO()):
+            populate_particles(holder["manager"], fuel_rods, reactor.height, energies,
+                               per_fuel, 1.0, rng)
+    return call, None, energies.shape[0]
+
+
+def case_energy_distribution(num_particles: int, distribution: str):
+    rng = np.random.default_rng(0)
+    return (lambda: neutron_energy_distribution(distribution, num_particles, rng)), None, num_particles
+
+
+def case_material_lookup(num_particles: int):
+    rng = np.random.default_rng(0)
+    table = MaterialTable([load_material(name) for name in MATERIALS], rng=rng)
+    material = rng.integers(0, len(MATERIALS), num_particles)
+    energies = neutron_energy_distribution("watt", num_particles, rng)
+    path_length = np.full(num_particles, 0.1)
+
+    def call() -> None:
+        sample_reactions(table.lookup(material, energies), path_length, rng)
+    return call, None, num_particles
+
+
+def case_particle_step(num_particles: int, num_components: int, layout: str):
+    reactor = make_reactor(num_components)
+    particle_manager = make_particles(reactor, num_particles)
+    bank = particle_manager.bank
+    if layout == "morton":
+        particle_manager.sort_particles(reactor_limits(reactor))
+    mesh = MeshTally(reactor, STEP_MESH, capacity=num_particles)
+    saved = {key: value.copy() for key, value in bank.state().items()}
+
+    def call() -> None:
+        particle_manager.update_all(0.05)
+        mesh.score(bank, handle_collisions(bank, reactor), 0.05)
+    return call, (lambda: bank.restore(saved)), num_particles
+
+
+def case_sort_particles(num_particles: int):
+    reactor = make_reactor(5)
+    particle_manager = make_particles(reactor, num_particles)
+    bank = particle_manager.bank
+    # a few dead particles, removed by the same pass
+    bank.alive[::10] = False
+    saved = {key: value.copy() for key, value in bank.state().items()}
+    limits = reactor_limits(reactor)
+    return ((lambda: particle_manager.sort_particles(limits)), (lambda: bank.restore(saved)),
+            num_particles)
+
+
+def case_update_simulation_frame(num_particles: int, num_components: int):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from src.reactor_renderer import ReactorRenderer
+    from src.simulation_helpers import update_simulation
+
+    reactor = make_reactor(num_components)
+    particle_manager = make_particles(reactor, num_particles)
+    energies = particle_manager.bank.energy.copy()
+    fig = plt.figure(figsize=(12, 8))
+    ax = fig.add_subplot(111, projection="3d")
+    renderer = ReactorRenderer(ax, reactor, energies, "turbo")
+    state = {"running": True}
+
+    def call() -> None:
+        update_simulation(ax, fig, reactor, particle_manager, [], [], [], [], state,
+                          energies, 0.05, renderer=renderer)
+        fig.canvas.draw()
+    return call, None, num_particles, lambda: plt.close(fig)
+
+
+def case_import(module: str):
+    command = [sys.executable, "-c", f"import {module}"]
+    return (lambda: subprocess.run(command, cwd=ROOT, check=True)), None, 1
+
+
+def matplotlib_importers(modules: tuple = HEADLESS_MODULES) -> list:
+    """Modules of `modules` that load matplotlib when imported alone."""
+    found = []
+    for module in modules:
+        output = subprocess.run([sys.executable, "-c",
+                                 f"import sys, {module}; print('matplotlib' in sys.modules)"],
+                                cwd=ROOT, check=True, capture_output=True, text=True).stdout
+        if output.strip() == "True":
+            found.append(module)
+    return found
+
+
+def build_cases(particle_counts: tuple, component_counts: tuple) -> list:
+    """(name, params, factory) of every case of the grid."""
+    cases = [("import", {"module": module}, lambda module=module: case_import(module))
+             for module in IMPORT_MODULES]
+    for n in particle_counts:
+        cases.append(("update_all", {"particles": n}, lambda n=n: case_update_all(n)))
+        cases.append(("populate_particles", {"particles": n},
+                      lambda n=n: case_populate_particles(n)))
+        cases.append(("material_lookup", {"particles": n}, lambda n=n: case_material_lookup(n)))
+        cases.append(("sort_particles", {"particles": n}, lambda n=n: case_sort_particles(n)))
+        for name in DISTRIBUTIONS:
+            cases.append(("neutron_energy_distribution", {"particles": n, "distribution": name},
+                          lambda n=n, name=name: case_energy_distribution(n, name)))
+        for m in component_counts:
+            params = {"particles": n, "components": m}
+            cases.append(("handle_collisions", params,
+                          lambda n=n, m=m: case_handle_collisions(n, m)))
+            for layout in LAYOUTS:
+                cases.append(("particle_step", {**params, "layout": layout},
+                              lambda n=n, m=m, layout=layout: case_particle_step(n, m, layout)))
+            if n * m <= SCALAR_MAX_PAIRS:
+                cases.append(("handle_collision_scalar", params,
+                              lambda n=n, m=m: case_handle_collision_scalar(n, m)))
+            if n <= FRAME_MAX_PARTICLES:
+                cases.append(("update_simulation_frame", params,
+                              lambda n=n, m=m: case_update_simulation_frame(n, m)))
+    return cases
+
+
+def case_key(name: str, params: dict) -> str:
+    """Identifier of a case, used to match it with the baseline."""
+    return name + "[" + ",".join(f"{key}={params[key]}" for key in sorted(params)) + "]"
+
+
+def run_benchmarks(particle_counts: tuple = PARTICLE_COUNTS,
+                   component_counts: tuple = COMPONENT_COUNTS, repeat: int = REPEAT,
+                   only: str | None = None, verbose: bool = True,
+                   min_time: float = MIN_TIME) -> dict:
+    """
+    Run every case of the grid.
+        repeat, min_time: see time_case
+        only: run only the cases whose key contains this text
+    Returns:
+        report dict, see write_report
+    """
+    results = []
+    for name, params, factory in build_cases(particle_counts, component_counts):
+        key = case_key(name, params)
+        if only and only not in key:
+            continue
+        call, reset, items, *cleanup = factory()
+        seconds, loops = time_case(call, reset, repeat, min_time)
+        for function in cleanup:
+            function()
+        results.append({"key": key, "name": name, "params": params, "seconds": seconds,
+                        "loops": loops, "items": items,
+                        "throughput": items / max(seconds, 1e-12)})
+        if verbose:
+            print(f"{key:<72} {seconds * 1e3:>10.3f} ms  {items / max(seconds, 1e-12):>12.3e} /s"
+                  f"  x{loops}")
+    return {
+        "machine": {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "repeat": repeat,
+        "min_time": min_time,
+        "results": results,
+    }
+
+
+def layout_gains(report: dict) -> dict:
+    """
+    Throughput of particle_step with the Morton layout over the spawn
+    layout, for each (particles, components) timed with both.
+    """
+    steps = {}
+    for result in report["results"]:
+        if result["name"] == "particle_step":
+            params = result["params"]
+            steps[(params["particles"], params["components"], params["layout"])] = result
+    return {f"particles={n},components={m}": steps[(n, m, "morton")]["throughput"]
+            / steps[(n, m, "spawn")]["throughput"]
+            for n, m, layout in steps if layout == "spawn" and (n, m, "morton") in steps}
+
+
+def compare(report: dict, baseline: dict, threshold: float = 0.2,
+            import_margin: float = IMPORT_MARGIN) -> list:
+    """
+    Cases slower than the baseline by more than `threshold`, and import
+    cases more than `import_margin` seconds slower than the baseline (the
+    startup of a process is too noisy for a relative threshold).
+    Returns:
+        list of (key, throughput ratio current / baseline), worst first
+    """
+    reference = {result["key"]: result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        if result["key"] not in reference:
+            continue
+        previous = reference[result["key"]]
+        ratio = result["throughput"] / previous["throughput"]
+        result["baseline_ratio"] = ratio
+        if result["name"] == "import":
+            slower = result["seconds"] - previous["seconds"] > import_margin
+        else:
+            slower = ratio < 1.0 - threshold
+        if slower:
+            regressions.append((result["key"], ratio))
+    return sorted(regressions, key=lambda item: item[1])
+
+
+def write_report(report: dict, path: str) -> None:
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of the simulation core.")
+    parser.add_argument("--quick", action="store_true",
+                        help="small grid (10^2 - 10^4 particles, 5 - 50 components)")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help="timed runs per case, the median is reported")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME,
+                        help="shortest timed run in seconds, short calls are looped")
+    parser.add_argument("--only", default=None, help="run only the cases containing this text")
+    parser.add_argument("--output", default=None, help="JSON report file")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed throughput loss against the baseline (0.2 = 20%%)")
+    parser.add_argument("--import-margin", type=float, default=IMPORT_MARGIN,
+                        help="allowed startup slowdown of the import cases, in seconds")
+    parser.add_argument("--save-baseline", default=None,
+                        help="also write the report as the new baseline")
+    args = parser.parse_args(argv)
+
+    particle_counts = QUICK_PARTICLE_COUNTS if args.quick else PARTICLE_COUNTS
+    component_counts = QUICK_COMPONENT_COUNTS if args.quick else COMPONENT_COUNTS
+    report = run_benchmarks(particle_counts, component_counts, args.repeat, args.only,
+                            min_time=args.min_time)
+    report["layout_gains"] = layout_gains(report)
+    if report["layout_gains"]:
+        print("\nparticle_step throughput, Morton sorted / spawn order:")
+        for key, gain in report["layout_gains"].items():
+            print(f"    {key:<40} {gain:.2f}x")
+
+    status = 0
+    if not args.only or "import" in args.only:
+        importers = matplotlib_importers()
+        if importers:
+            print(f"\nmatplotlib is loaded by the headless modules {', '.join(importers)}")
+            status = 1
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.threshold, args.import_margin)
+        report["baseline"] = args.baseline
+        report["threshold"] = args.threshold
+        report["import_margin"] = args.import_margin
+        report["regressions"] = [{"key": key, "ratio": ratio} for key, ratio in regressions]
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than the baseline by more than "
+                  f"{100 * args.threshold:.0f}% (import: {args.import_margin * 1e3:.0f} ms):")
+            for key, ratio in regressions:
+                print(f"    {key:<72} {ratio:.2f}x")
+            status = 1
+        else:
+            print(f"\nNo regression against {args.baseline}")
+    if args.output:
+        write_report(report, args.output)
+    if args.save_baseline:
+        write_report(report, args.save_baseline)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
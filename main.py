@@ -4,73 +4,36 @@ Demo: Create a rectangular reactor with control rods, fuel, flux monitors,
 and a simple moving particle (neutron) demo with sliders.
 """
 
+import argparse
+
 import matplotlib.pyplot as plt
 #from matplotlib.widgets import Slider
 #from mpl_toolkits.mplot3d import Axes3D
 from matplotlib.animation import FuncAnimation
 
-from src.area_reactor import ReactorArea
-from src.particle_manager import ParticleManager
-from src.particle_visualization import draw_particles, add_energy_colorbar
-from src.reactor_builder import element_on_grid, flux_monitor_on_grid, populate_reactor, populate_particles
-from src.neutron_energy_distribution import neutron_energy_distribution
+from src.particle_visualization import add_energy_colorbar
+from src.particle_lod import LOD_MODES, LOD_THRESHOLD
+from src.profiling import Profiler
+from src.reactor_renderer import ReactorRenderer
+from src.reactor_builder import build_demo_reactor, build_scenario
 from src.simulation_helpers import create_sliders, update_simulation, connect_keyboard
+from src.simulation_worker import SimulationWorker
 
-def main():
-    # Create reactor        src/area_reactor.py
-    reactor = ReactorArea(width=10, depth=10, height=8)
-    # width and depth of the grid in the reactor
-    width = 1.9
-    depth = 1.9
-    
-    # --------------------------
-    # Rods geometry: grid position (x, y)
-    # --------------------------
-    # absorbers
-    absorber_coords = [(3, 3), (5, 5), (7, 7)]
-    height_absorber = 0
-    
-    # Fuel
-    fuel_coords = [(5, 7),  (7, 9)]
-    height_reactor = reactor.height
-
-    # flux monitor
-    monitor_coords = [(7, 3)]
-    # Flux monitors dimension
-    monitor_height = 0.95
-    width_flux_mon = 0.95
-    depth_flux_mon = 0.95
-    
-    # --------------------------
-    # Create objects
-    # --------------------------
-    # src/reactor_builder.py
-    absorber_rods = element_on_grid(absorber_coords, width, depth, 
-                    height_absorber, "blue", "Abs")
-    
-    neutron_flux_monitor = element_on_grid(monitor_coords, width_flux_mon, depth_flux_mon, 
-                                           monitor_height, "gray", "mon")
-
-    nuclear_fuel_rods = flux_monitor_on_grid(fuel_coords, width, depth, 
-                    height_reactor, "green")
-    
-    # Add all objects to reactor        # src.reactor_builder
-    reactor_elements = absorber_rods + nuclear_fuel_rods + neutron_flux_monitor
-    populate_reactor(reactor, reactor_elements)
-    
-    # Manage a collection of particles in the reactor   # src.particle_manager
-    particle_manager = ParticleManager()
-
-    # Number of particles at the beginning
-    particles_per_fuel = 5
-    num_particles = len(nuclear_fuel_rods) * particles_per_fuel
-    
-    # src.neutron_energy_distribution
-    energies = neutron_energy_distribution("debug_uniform", num_particles)
-    
-    # Particle system
-    populate_particles(particle_manager, nuclear_fuel_rods, reactor.height, energies, 
-                       particles_per_fuel, 1.0)
+def main(scenario: str | None = None, profile: bool = False, trace: str | None = None,
+         lod_mode: str = "subsample", lod_threshold: int | None = LOD_THRESHOLD):
+    # Reactor, rods, monitors and particles         src/reactor_builder.py
+    # scenario file (scenarios/*.json, *.toml), the demo layout by default
+    if scenario is None:
+        setup = build_demo_reactor(particles_per_fuel=5, distribution_name="debug_uniform")
+    else:
+        setup = build_scenario(scenario)
+    reactor = setup.reactor
+    absorber_rods = setup.absorber_rods
+    neutron_flux_monitor = setup.monitors
+    particle_manager = setup.particle_manager
+    energies = setup.energies
+    # the monitor slider range keeps the tallest monitor inside the reactor
+    monitor_height = max((monitor.height for monitor in neutron_flux_monitor), default=0.0)
 
     # --------------------------
     # Plot setup
@@ -84,9 +47,12 @@ def main():
     ax.set_facecolor("white")
     fig.patch.set_facecolor("white")
 
-    reactor.draw(ax)
+    # Geometry and particles are drawn once, then updated in place
     # particles in a range of colors, the last argument refers the color
-    draw_particles(ax, particle_manager, energies, "turbo")
+    # above lod_threshold particles: subsample, density voxels or wall heatmaps
+    renderer = ReactorRenderer(ax, reactor, energies, "turbo", lod_mode=lod_mode,
+                               lod_threshold=lod_threshold)
+    renderer.update(particle_manager)
     
     # Add colorbar
     add_energy_colorbar(fig, energies, "turbo")
@@ -114,13 +80,49 @@ def main():
     # --------------------------
     animation_state = {"running": False}
     connect_keyboard(fig, animation_state)
+
+    # --------------------------
+    # Profiling overlay (--profile), trace file of the frames (--trace)
+    # --------------------------
+    profiler = physics_profiler = None
+    if profile or trace:
+        profiler = Profiler(trace_path=trace)
+        physics_profiler = Profiler()
+        profiler.attach_overlay(fig, {"physics": physics_profiler})
+
+    # Physics runs in its own thread, the animation only draws its snapshots
+    # scripted rod moves of the scenario ([[motion]]) run in the worker too
+    worker = SimulationWorker(reactor, particle_manager, dt=0.05, profiler=physics_profiler,
+                              schedule=setup.schedule)
+    worker.start()
+
+    def on_close(event):
+        worker.stop()
+        if profiler is not None:
+            profiler.close()
+    fig.canvas.mpl_connect("close_event", on_close)
     
     animation = FuncAnimation(fig, lambda frame: update_simulation(
         ax, fig, reactor, particle_manager, absorber_slider + monitor_slider, 
         absorber_rods, monitor_slider, neutron_flux_monitor, animation_state, 
-        energies, dt=0.05), interval = 50)
+        energies, dt=0.05, renderer=renderer, worker=worker, profiler=profiler), interval = 50,
+        # mplot3d recomputes the projection of every artist when the view is
+        # rotated, a blitted background would keep the old view
+        blit=False, cache_frame_data=False)
     
     plt.show()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Interactive reactor simulation.")
+    parser.add_argument("scenario", nargs="?", default=None,
+                        help="scenario file (.toml / .json), the demo reactor by default")
+    parser.add_argument("--profile", action="store_true",
+                        help="show FPS and the time of each phase on the figure")
+    parser.add_argument("--trace", default=None,
+                        help="write the time of each frame to this .csv / .json file")
+    parser.add_argument("--lod", choices=LOD_MODES, default="subsample",
+                        help="drawing of large populations (default: %(default)s)")
+    parser.add_argument("--lod-threshold", type=int, default=LOD_THRESHOLD,
+                        help="alive particles above which --lod is used (default: %(default)s)")
+    args = parser.parse_args()
+    main(args.scenario, args.profile, args.trace, args.lod, args.lod_threshold)
@@ -6,7 +6,12 @@ This module acts as the container. Anything inside the reactor
 (control rods, sensors, particles, etc.) attaches here.
 """
 from typing import List
-from mpl_toolkits.mplot3d import Axes3D  
+
+import numpy as np
+
+from src.reactor_geometry import (component_bounds, component_box, behavior_codes,
+                                  reactor_limits)
+from src.spatial_index import UniformGridIndex, default_cell_size
 
 class ReactorArea:
     """
@@ -26,41 +31,108 @@ class ReactorArea:
 
         # Any component added (rods, sensors, etc.)
         self.components: List[object] = []
+        # Grid index over the component boxes, created on first use
+        self._index: UniformGridIndex | None = None
+        # Cross-sections of the component / wall materials (src/materials.py),
+        # None: the collision behaviors only
+        self.materials = None
+
+        # Geometry tables (lower, upper, behaviors), see geometry()
+        self.revision = 0           # bumped by every change of a component
+        self._geometry: tuple | None = None
+        self._rows: dict = {}       # id(component) -> row
+        self._dirty: set = set()    # rows changed since the last geometry()
+        self._untracked: list = []  # rows of components without change tracking
 
     # To add any component in the future
     def add(self, component: object) -> None:
         """Register a component inside the reactor."""
         self.components.append(component)
+        # the tables are built again with it (and it is watched) on the next geometry()
+        self.revision += 1
+
+    def _component_changed(self, component: object) -> None:
+        row = self._rows.get(id(component))
+        if row is None:
+            self._geometry = None
+        else:
+            self._dirty.add(row)
+        self.revision += 1
 
-    def draw_frame(self, ax: Axes3D) -> None:
+    def geometry(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
-        Draw the outer wireframe reactor box.
+        Packed tables of the components (src/reactor_geometry.py), kept up
+        to date incrementally: only the rows of the components that changed
+        since the last call are computed again, and moved in the spatial
+        index if there is one. The arrays are shared, do not modify them.
+        Returns:
+            lower, upper: (M, 3) box corners
+            behaviors: (M,) behavior codes
         """
-        width, depth, height = self.width, self.depth, self.height
-                                                
-        # Line segments (pairs of indices)          #    7 ----------6
-        edges_of_reactor = [                        #   / |         /|
-            (0,1), (1,2), (2,3), (3,0),             #  4--|--------5 |
-            (4,5), (5,6), (6,7), (7,4),             #  |  3--------|-2
-            (0,4), (1,5), (2,6), (3,7),             #  | /         |/
-        ]                                           #  0 ----------1
+        components = self.components
+        if self._geometry is None or self._geometry[0].shape[0] != len(components):
+            # first call, or components added (or removed from the list)
+            lower, upper = component_bounds(components)
+            self._geometry = (lower, upper, behavior_codes(components))
+            self._rows = {id(c): j for j, c in enumerate(components)}
+            # components without change tracking (e.g. a plain object with
+            # x_position, height, ...) are read again on every call
+            self._untracked = []
+            for j, component in enumerate(components):
+                watchers = getattr(component, "_watchers", None)
+                if watchers is None:
+                    self._untracked.append(j)
+                elif self._component_changed not in watchers:
+                    watchers.append(self._component_changed)
+            self._dirty.clear()
+            if self._index is not None:
+                self._index.sync(lower, upper)
+            return self._geometry
 
-        # 8 corners of the reactor
-        corners = [
-            (0, 0, 0), (width, 0, 0), (width, depth, 0), (0, depth, 0), # 0, 1, 2, 3
-            (0, 0, height), (width, 0, height), (width, depth, height), # 4, 5, 6,
-            (0, depth, height)                                          # 7
-        ]
+        if self._dirty or self._untracked:
+            lower, upper, behaviors = self._geometry
+            rows = np.array(sorted(self._dirty.union(self._untracked)), dtype=np.intp)
+            self._dirty.clear()
+            boxes = np.array([component_box(components[j]) for j in rows],
+                             dtype=np.float64).reshape(-1, 6)
+            moved = np.any((boxes[:, :3] != lower[rows]) | (boxes[:, 3:] != upper[rows]), axis=1)
+            lower[rows], upper[rows] = boxes[:, :3], boxes[:, 3:]
+            behaviors[rows] = behavior_codes([components[j] for j in rows])
+            if self._index is not None and moved.any():
+                self._index.update(rows[moved], lower[rows[moved]], upper[rows[moved]])
+        return self._geometry
+
+    def invalidate_geometry(self) -> None:
+        """Compute all the tables again on the next geometry() call, e.g. after a
+        component was moved horizontally or resized (x_position, width, ...
+        are not tracked)."""
+        self._geometry = None
+        self.revision += 1
+
+    def spatial_index(self, cell_size: float | None = None) -> UniformGridIndex:
+        """
+        Grid index over the bounding boxes of self.components.
+        Boxes whose height or base_height changed since the last call are
+        re-indexed (see geometry()), the rest of the grid is untouched.
+        """
+        lower, upper, _ = self.geometry()
+        if (self._index is None
+                or (cell_size is not None and cell_size != self._index.cell_size)):
+            limits = reactor_limits(self)
+            if cell_size is None:
+                cell_size = default_cell_size(limits, lower, upper)
+            self._index = UniformGridIndex(limits, cell_size)
+            self._index.build(lower, upper)
+        return self._index
 
-        # Connect the edges of the container (reactor)
-        for (i,j) in edges_of_reactor:
-            x = [corners[i][0], corners[j][0]]
-            y = [corners[i][1], corners[j][1]]
-            z = [corners[i][2], corners[j][2]]
-            ax.plot(x, y, z, color="white", linewidth=1.2)
+    # Drawing is in src/reactor_drawing.py, imported on first use so that
+    # the geometry does not need matplotlib
+    def draw_frame(self, ax, color: str = "white") -> None:
+        """Draw the outer wireframe reactor box."""
+        from src.reactor_drawing import draw_reactor_frame
+        draw_reactor_frame(ax, self, color)
 
-    def draw(self, ax: Axes3D) -> None:
+    def draw(self, ax, frame_color: str = "white") -> None:
         """Draw the frame and all components."""
-        self.draw_frame(ax)
-        for comp in self.components:
-            comp.draw(ax)
+        from src.reactor_drawing import draw_reactor
+        draw_reactor(ax, self, frame_color)
@@ -0,0 +1,337 @@
+from __future__ import annotations
+# batch_runner.py
+"""
+Headless simulation: builds the demo reactor and runs N steps of dt
+without any figure, then reports the throughput.
+
+Python:
+    from src.batch_runner import run_batch
+    report = run_batch(steps=1000, dt=0.05, particles_per_fuel=10000)
+
+Command line (from the repository root):
+    python -m src.batch_runner --steps 1000 --dt 0.05 --particles-per-fuel 10000
+
+With --mode event, each step is a window of dt simulated event by event
+(src/event_transport.py), so dt can be much larger:
+    python -m src.batch_runner --mode event --steps 20 --dt 2.5
+
+Long runs can be checkpointed and resumed (src/checkpoint.py), the resumed
+run gives the same result as an uninterrupted one:
+    python -m src.batch_runner --steps 1000 --seed 1 --checkpoint run.npz --checkpoint-every 100
+    python -m src.batch_runner --steps 1000 --seed 1 --resume run.npz
+
+--trace writes the time of each phase of every step (src/profiling.py) to
+a .csv or .json file, to compare two runs step by step:
+    python -m src.batch_runner --steps 200 --seed 1 --trace run_trace.csv
+
+--sort-every N removes the dead particles and sorts the others along the
+Morton order of their cells every N steps (ParticleManager.sort_particles),
+so the particles close in the reactor are close in memory:
+    python -m src.batch_runner --steps 1000 --particles-per-fuel 100000 --sort-every 50
+
+--implicit-capture and --weight-window weight the particles instead of
+killing them (src/variance_reduction.py), the monitors then report the
+relative error and figure of merit of their flux:
+    python -m src.batch_runner --steps 2000 --seed 1 --implicit-capture --weight-window 10 10 8
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.checkpoint import save_checkpoint, load_checkpoint
+from src.reactor_builder import DEMO_SCENARIO, build_scenario
+from src.reactor_geometry import component_box, reactor_limits
+from src.scenario import load_scenario
+from src.mesh_tally import MeshTally
+from src.profiling import Profiler
+from src.rod_motion import MotionSchedule
+from src.simulation_core import advance, advance_events
+from src.trajectory_recorder import TrajectoryRecorder, make_recorder
+from src.variance_reduction import WeightWindow, detector_importance, weight_cutoff
+
+
+def run_batch(steps: int, dt: float = 0.05, particles_per_fuel: int | None = None,
+              distribution_name: str | None = None, seed: int | None = None,
+              compact_every: int = 0, recorder: TrajectoryRecorder | None = None,
+              mesh_shape: tuple | None = None, mesh_output: str | None = None,
+              mode: str = "step", checkpoint_path: str | None = None,
+              checkpoint_every: int = 0, resume_from: str | None = None,
+              scenario: str | None = None, trace_path: str | None = None,
+              scram_time: float | None = None, implicit_capture: bool = False,
+              window_shape: tuple | None = None, window_ratio: float = 5.0,
+              window_decay: float | None = None, sort_every: int = 0) -> dict:
+    """
+    Run `steps` physics steps of `dt` and measure them.
+        particles_per_fuel, distribution_name: None takes them from the
+                          [source] section of the scenario (demo: 5 per
+                          fuel rod, "debug_uniform")
+        compact_every: remove dead particles every this many steps (0: never)
+        recorder: trajectory recording (src/trajectory_recorder.py), None: off
+        mesh_shape: (nx, ny, nz) of a mesh flux tally over the reactor, None: off
+        mesh_output: .npz file where the mesh tally is saved at the end
+        mode: "step" fixed time steps, "event" event-driven windows of dt
+        checkpoint_path: .npz file or directory written every checkpoint_every
+                         steps and at the end
+        resume_from: checkpoint of a run started with the same arguments,
+                     it continues from its step up to `steps` (the trajectory
+                     recorder is not part of the checkpoint)
+        scenario: scenario file (src/scenario.py) instead of the demo layout
+        trace_path: .csv / .json file with the phase times of every step
+        scram_time: insert all the absorbers at once at this time, on top of
+                    the [[motion]] of the scenario (src/rod_motion.py)
+        implicit_capture: the materials reduce the weights instead of
+                          absorbing (src/variance_reduction.py)
+        window_shape: (nx, ny, nz) of a weight window built from the distance
+                      to the monitors, None: off
+        window_ratio: upper / lower bound of the window
+        window_decay: decay length of the importance, see detector_importance
+        sort_every: remove dead particles and sort the others by the Morton
+                    order of their cells every this many steps (0: never),
+                    instead of compact_every on those steps
+    Returns:
+        dict with the counters and wall times, see format_report
+    """
+    if mode not in ("step", "event"):
+        raise ValueError(f"Mode '{mode}' not supported")
+    rng = np.random.default_rng(seed)
+
+    timings = {}
+    start = time.perf_counter()
+    setup = build_scenario(scenario or DEMO_SCENARIO, particles_per_fuel, distribution_name,
+                           recorder, rng)
+    timings["setup"] = time.perf_counter() - start
+    particle_manager = setup.particle_manager
+    if recorder is not None:
+        recorder.attach(setup.reactor)
+    schedule = setup.schedule
+    if scram_time is not None:
+        schedule = schedule or MotionSchedule()
+        absorbers = {id(rod) for rod in setup.absorber_rods}
+        rows = [j for j, c in enumerate(setup.reactor.components) if id(c) in absorbers]
+        schedule.scram(rows, scram_time, setup.reactor.height)
+    if implicit_capture:
+        if setup.reactor.materials is None:
+            raise ValueError("Implicit capture needs components or walls with a material")
+        setup.reactor.materials.implicit_capture = True
+    window = None
+    if window_shape is not None:
+        if not setup.monitors:
+            raise ValueError("The weight window needs a flux monitor to aim at")
+        targets = [np.add(box[:3], box[3:]) / 2 for box in map(component_box, setup.monitors)]
+        importance = detector_importance(setup.reactor, window_shape, targets, window_decay)
+        bank = particle_manager.bank
+        window = WeightWindow.from_importance(setup.reactor, importance,
+                                              bank.position[bank.alive], ratio=window_ratio,
+                                              rng=rng)
+    variance_reduction = {"split": 0, "created": 0, "rouletted": 0, "killed": 0}
+    tallies = []
+    if mesh_shape is not None:
+        mesh = MeshTally(setup.reactor, mesh_shape, capacity=len(particle_manager))
+        tallies.append(mesh)
+
+    particle_steps = 0
+    events = 0
+    first_step = 1
+    previous_time = 0.0     # run time before the checkpoint, for the figures of merit
+    if resume_from is not None:
+        extra = load_checkpoint(resume_from, setup.reactor, particle_manager, rng, tallies)
+        first_step = int(extra["completed_steps"]) + 1
+        particle_steps = int(extra["particle_steps"])
+        events = int(extra["events"])
+        previous_time = float(extra.get("run_time", 0.0))
+        for key in variance_reduction:
+            variance_reduction[key] = int(extra.get(f"weights_{key}", 0))
+    resumed_particle_steps = particle_steps
+
+    def checkpoint(step: int) -> None:
+        start = time.perf_counter()
+        save_checkpoint(checkpoint_path, setup.reactor, particle_manager, rng, tallies,
+                        {"completed_steps": step, "particle_steps": particle_steps,
+                         "events": events,
+                         "run_time": previous_time + time.perf_counter() - run_start,
+                         **{f"weights_{key}": count for key, count in variance_reduction.items()}})
+        timings["checkpoint"] = timings.get("checkpoint", 0.0) + time.perf_counter() - start
+
+    profiler = Profiler(trace_path=trace_path) if trace_path else None
+
+    run_start = time.perf_counter()
+    for step in range(first_step, steps + 1):
+        alive = particle_manager.bank.count_alive()
+        particle_steps += alive
+        # with a trace, the phases of each step are kept apart then summed
+        step_timings = timings if profiler is None else profiler.phases
+        if schedule is not None:
+            schedule.apply(setup.reactor, (step - 1) * dt, dt)
+        if mode == "event":
+            events += advance_events(setup.reactor, particle_manager, dt, step_timings,
+                                     tallies).events
+        else:
+            advance(setup.reactor, particle_manager, dt, step_timings, tallies)
+        if window is not None or implicit_capture:
+            window_start = time.perf_counter()
+            bank = particle_manager.bank
+            if window is not None:
+                changed = window.apply(bank)
+            else:
+                materials = setup.reactor.materials
+                changed = weight_cutoff(bank, materials.weight_cutoff,
+                                        materials.survival_weight, rng)
+            for key, count in changed._asdict().items():
+                variance_reduction[key] += count
+            step_timings["weights"] = (step_timings.get("weights", 0.0)
+                                       + time.perf_counter() - window_start)
+        if profiler is not None:
+            for phase, seconds in profiler.phases.items():
+                timings[phase] = timings.get(phase, 0.0) + seconds
+            profiler.count("particle_steps", alive)
+            profiler.end_frame()
+        if sort_every and step % sort_every == 0:
+            sort_start = time.perf_counter()
+            particle_manager.sort_particles(reactor_limits(setup.reactor))
+            timings["sort"] = timings.get("sort", 0.0) + time.perf_counter() - sort_start
+        elif compact_every and step % compact_every == 0:
+            compact_start = time.perf_counter()
+            particle_manager.remove_dead()
+            timings["compact"] = timings.get("compact", 0.0) + time.perf_counter() - compact_start
+        if checkpoint_path and checkpoint_every and step % checkpoint_every == 0:
+            checkpoint(step)
+    if checkpoint_path and not (checkpoint_every and steps % checkpoint_every == 0):
+        checkpoint(steps)
+    wall_time = time.perf_counter() - run_start
+    run_steps = steps - first_step + 1
+    if profiler is not None:
+        profiler.close()
+    if recorder is not None:
+        recorder.close()
+    if mesh_shape is not None and mesh_output is not None:
+        mesh.save(mesh_output)
+
+    return {
+        "mode": mode,
+        "steps": steps,
+        "dt": dt,
+        "events": events,
+        "initial_particles": len(setup.energies),
+        "alive_particles": particle_manager.bank.count_alive(),
+        "particle_steps": particle_steps,
+        "wall_time": wall_time,
+        "steps_per_second": run_steps / wall_time if wall_time > 0 else float("inf"),
+        "particle_steps_per_second": ((particle_steps - resumed_particle_steps) / wall_time
+                                      if wall_time > 0 else float("inf")),
+        "phase_times": timings,
+        "variance_reduction": variance_reduction if window is not None or implicit_capture
+                              else None,
+        "monitors": {c.label: c.tally.summary(previous_time + wall_time) for c in setup.reactor.components
+                     if getattr(c, "tally", None) is not None},
+    }
+
+
+def format_report(report: dict) -> str:
+    """Human readable summary of run_batch."""
+    lines = [
+        f"steps:                {report['steps']} (dt = {report['dt']}, {report['mode']} mode)",
+        f"particles:            {report['initial_particles']} at start, "
+        f"{report['alive_particles']} alive at the end",
+        f"wall time:            {report['wall_time']:.3f} s",
+        f"steps/s:              {report['steps_per_second']:.1f}",
+        f"particle-steps/s:     {report['particle_steps_per_second']:.3e}",
+    ]
+    if report["mode"] == "event":
+        lines.append(f"events:               {report['events']}")
+    lines.append("wall time per phase:")
+    for phase, seconds in report["phase_times"].items():
+        lines.append(f"    {phase:<16}  {seconds:.3f} s")
+    if report.get("variance_reduction"):
+        counts = report["variance_reduction"]
+        lines.append(f"weights:              {counts['split']} split into "
+                     f"{counts['created']} more, {counts['killed']} of "
+                     f"{counts['rouletted']} rouletted killed")
+    if report["monitors"]:
+        lines.append("monitor flux per step (track length / volume / dt):")
+    for label, summary in report["monitors"].items():
+        lines.append(f"    {label.replace(chr(10), ' '):<16}  {summary['flux']:.4g} "
+                     f"+- {summary['flux_std_error']:.2g}, "
+                     f"{summary['crossings']:.1f} crossings/step")
+        if "flux_fom" in summary:
+            lines.append(f"    {'':<16}  relative error {summary['flux_relative_error']:.3g}, "
+                         f"figure of merit {summary['flux_fom']:.4g} /s")
+    return "\n".join(lines)
+
+
+def main(argv: list | None = None) -> dict:
+    parser = argparse.ArgumentParser(description="Run the reactor simulation without a display.")
+    parser.add_argument("--steps", type=int, default=1000, help="number of time steps")
+    parser.add_argument("--dt", type=float, default=0.05, help="time step")
+    parser.add_argument("--particles-per-fuel", type=int, default=None,
+                        help="neutrons born in each fuel rod (default: [source] of the "
+                             "scenario, 5 for the demo)")
+    parser.add_argument("--distribution", default=None,
+                        help="energy distribution name (src/neutron_energy_distribution.py), "
+                             "default: [source] of the scenario, debug_uniform for the demo")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--compact-every", type=int, default=0,
+                        help="remove dead particles every N steps (0: never)")
+    parser.add_argument("--sort-every", type=int, default=0,
+                        help="remove dead particles and sort the others by Morton cell order "
+                             "every N steps (0: never)")
+    parser.add_argument("--record", choices=["off", "ring", "stream", "frames"], default="off",
+                        help="trajectory recording mode")
+    parser.add_argument("--record-length", type=int, default=16,
+                        help="positions kept per particle in ring mode")
+    parser.add_argument("--record-path", default=None,
+                        help="output file in stream and frames modes")
+    parser.add_argument("--record-every", type=int, default=1,
+                        help="stream / frames mode: record every N steps")
+    parser.add_argument("--record-stride", type=int, default=1,
+                        help="stream / frames mode: record one particle out of N")
+    parser.add_argument("--mesh", type=int, nargs=3, default=None, metavar=("NX", "NY", "NZ"),
+                        help="score a flux / absorption mesh tally with this resolution")
+    parser.add_argument("--mesh-output", default=None, help=".npz file for the mesh tally")
+    parser.add_argument("--mode", choices=["step", "event"], default="step",
+                        help="fixed time steps, or event-driven transport over windows of dt")
+    parser.add_argument("--checkpoint", default=None,
+                        help="checkpoint .npz file or directory (src/checkpoint.py)")
+    parser.add_argument("--checkpoint-every", type=int, default=0,
+                        help="write the checkpoint every N steps (0: only at the end)")
+    parser.add_argument("--resume", default=None, help="continue the run of this checkpoint")
+    parser.add_argument("--scenario", default=None,
+                        help="scenario file (.toml / .json) instead of the demo reactor, "
+                             "its [source] and [run] sections replace the defaults above")
+    parser.add_argument("--trace", default=None,
+                        help="write the phase times of every step to this .csv / .json file")
+    parser.add_argument("--scram", type=float, default=None, metavar="TIME",
+                        help="insert all the absorbers at once at this time")
+    parser.add_argument("--implicit-capture", action="store_true",
+                        help="reduce the particle weights instead of absorbing in the materials")
+    parser.add_argument("--weight-window", type=int, nargs=3, default=None,
+                        metavar=("NX", "NY", "NZ"),
+                        help="split / roulette with a weight window aimed at the monitors")
+    parser.add_argument("--window-ratio", type=float, default=5.0,
+                        help="upper / lower bound of the weight window")
+    parser.add_argument("--window-decay", type=float, default=None,
+                        help="decay length of the monitor importance (quarter of the reactor)")
+    args = parser.parse_args(argv)
+    if args.scenario is not None:
+        # [run] of the file gives the defaults, options given on the command line
+        # win ([source] is applied by build_scenario to the options left to None)
+        run = load_scenario(args.scenario).settings.get("run", {})
+        parser.set_defaults(**{key.replace("-", "_"): value for key, value in run.items()})
+        args = parser.parse_args(argv)
+
+    recorder = None
+    if args.record != "off":
+        recorder = make_recorder(args.record, args.record_length, args.record_path,
+                                 args.record_every, args.record_stride)
+    report = run_batch(args.steps, args.dt, args.particles_per_fuel, args.distribution,
+                       args.seed, args.compact_every, recorder, args.mesh, args.mesh_output,
+                       args.mode, args.checkpoint, args.checkpoint_every, args.resume,
+                       args.scenario, args.trace, args.scram, args.implicit_capture,
+                       args.weight_window, args.window_ratio, args.window_decay,
+                       args.sort_every)
+    print(format_report(report))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+from __future__ import annotations
+# checkpoint.py
+"""
+Checkpoint and restart of a simulation.
+
+Everything that changes during a run is saved as plain NumPy arrays:
+    particles     ParticleManager.state(): bank columns, ids, step counter
+    components    height and base_height of every reactor component
+                  (ControlRod, NeutronMonitor, ...)
+    tallies       state() of every monitor tally (NeutronMonitor.tally) and
+                  of the extra tallies of the run (e.g. MeshTally)
+    rng           bit_generator.state of the np.random.Generator, as JSON
+    extra         any other arrays of the caller (e.g. the runner settings)
+
+Two formats:
+    "run.npz"     one compressed file
+    "run_ckpt/"   any path not ending in .npz: a directory with one .npy per
+                  array, read back memory-mapped
+
+The reactor itself (layout, behaviors) is not saved: it is built again the
+same way (e.g. reactor_builder.build_demo_reactor) and the checkpoint is
+loaded on top of it. Loading is one bulk copy per array, nothing is
+created per particle, and a resumed run is bit-identical to a run that
+was never interrupted.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+from src.area_reactor import ReactorArea
+from src.particle_manager import ParticleManager
+
+FORMAT_VERSION = 1
+
+
+def _monitors(reactor: ReactorArea) -> list:
+    """(index, component) of the components with a tally."""
+    return [(j, c) for j, c in enumerate(reactor.components)
+            if getattr(c, "tally", None) is not None]
+
+
+def collect_state(reactor: ReactorArea, particle_manager: ParticleManager,
+                  rng: np.random.Generator | None = None, tallies: list = (),
+                  extra: dict | None = None) -> dict:
+    """Flat dict name -> array of the whole simulation state."""
+    state = {"format_version": np.array(FORMAT_VERSION)}
+    for key, value in particle_manager.state().items():
+        state[f"particles.{key}"] = value
+
+    components = reactor.components
+    state["components.label"] = np.array([str(c.label) for c in components])
+    state["components.height"] = np.array([getattr(c, "height", 0.0) for c in components],
+                                          dtype=np.float64)
+    state["components.base_height"] = np.array([getattr(c, "base_height", 0.0)
+                                                for c in components], dtype=np.float64)
+
+    for j, component in _monitors(reactor):
+        for key, value in component.tally.state().items():
+            state[f"monitor.{j}.{key}"] = value
+    for i, tally in enumerate(tallies):
+        for key, value in tally.state().items():
+            state[f"tally.{i}.{key}"] = value
+
+    if rng is not None:
+        state["rng.state"] = np.array(json.dumps(rng.bit_generator.state))
+    for key, value in (extra or {}).items():
+        state[f"extra.{key}"] = np.asarray(value)
+    return state
+
+
+def save_checkpoint(path: str, reactor: ReactorArea, particle_manager: ParticleManager,
+                    rng: np.random.Generator | None = None, tallies: list = (),
+                    extra: dict | None = None) -> None:
+    """
+    Write the state to `path` (.npz file or directory). The old checkpoint is
+    only replaced once the new one is complete.
+    """
+    state = collect_state(reactor, particle_manager, rng, tallies, extra)
+    path = os.fspath(path)
+    temporary = path.rstrip("/\\") + ".tmp"
+    if path.endswith(".npz"):
+        with open(temporary, "wb") as file:
+            np.savez_compressed(file, **state)
+        os.replace(temporary, path)
+        return
+
+    if os.path.isdir(temporary):
+        shutil.rmtree(temporary)
+    os.makedirs(temporary)
+    for key, value in state.items():
+        np.save(os.path.join(temporary, key + ".npy"), value)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(temporary, path)
+
+
+def read_checkpoint(path: str) -> dict:
+    """Flat dict name -> array, directory checkpoints are memory-mapped."""
+    path = os.fspath(path)
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+    state = {}
+    for name in os.listdir(path):
+        if name.endswith(".npy"):
+            state[name[:-4]] = np.load(os.path.join(path, name), mmap_mode="r")
+    return state
+
+
+def _section(state: dict, prefix: str) -> dict:
+    """Entries of `state` starting with prefix, without it."""
+    return {key[len(prefix):]: value for key, value in state.items()
+            if key.startswith(prefix)}
+
+
+def load_checkpoint(path: str, reactor: ReactorArea, particle_manager: ParticleManager,
+                    rng: np.random.Generator | None = None, tallies: list = ()) -> dict:
+    """
+    Restore a checkpoint in place, into objects built like the saved ones
+    (same components in the same order, same extra tallies).
+    Returns:
+        the "extra" arrays given to save_checkpoint
+    """
+    state = read_checkpoint(path)
+    version = int(state["format_version"])
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Checkpoint format {version} not supported")
+
+    labels = [str(label) for label in state["components.label"]]
+    if labels != [str(c.label) for c in reactor.components]:
+        raise ValueError("Checkpoint components do not match the reactor")
+    for component, height, base in zip(reactor.components, state["components.height"],
+                                       state["components.base_height"]):
+        component.height = float(height)
+        component.base_height = float(base)
+
+    particle_manager.restore(_section(state, "particles."))
+    for j, component in _monitors(reactor):
+        component.tally.restore(_section(state, f"monitor.{j}."))
+    for i, tally in enumerate(tallies):
+        tally.restore(_section(state, f"tally.{i}."))
+
+    if rng is not None:
+        if "rng.state" not in state:
+            raise ValueError("Checkpoint has no random generator state")
+        rng.bit_generator.state = json.loads(str(state["rng.state"]))
+    return _section(state, "extra.")
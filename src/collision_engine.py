@@ -1,6 +1,12 @@
 from __future__ import annotations
+from typing import NamedTuple
 import numpy as np
 
+from src.materials import (ABSORPTION, FISSION, NO_MATERIAL, SCATTER, isotropic_directions,
+                           sample_reactions, scattered_energies, survival_probability)
+from src.reactor_geometry import reactor_limits, BEHAVIOR_NONE
+from src.spatial_index import UniformGridIndex
+
 def handle_collision(particle, obj, elastic: bool = True) -> bool:
     """
     Check and handle collision between a particle and a rectangular object.
@@ -71,7 +77,8 @@ def handle_collision(particle, obj, elastic: bool = True) -> bool:
         # if it does not have one, by default: reflect
         behavior = getattr(obj, "collision_behavior", "reflect")
         
-        if behavior == "absorb":
+        # a fission also absorbs the neutron, the new ones come from src/criticality.py
+        if behavior in ("absorb", "fission"):
             particle.absorb()   # defined method
             # Collision
             return True
@@ -95,3 +102,353 @@ def handle_collision(particle, obj, elastic: bool = True) -> bool:
     
     # No collision
     return False
+
+
+# --------------------------
+# Batch engine: whole bank against all the reactor components
+# --------------------------
+# Outcome of each particle after handle_collisions
+OUTCOME_NONE      = 0
+OUTCOME_ABSORB    = 1
+OUTCOME_REFLECT   = 2
+OUTCOME_INELASTIC = 3   # reflect with elastic=False
+OUTCOME_TRANSMIT  = 4
+OUTCOME_FISSION   = 5   # absorbed by a "fission" component
+OUTCOME_SCATTER   = 6   # scattered inside a material (src/materials.py)
+
+NO_COMPONENT = -1
+
+
+class CollisionResults(NamedTuple):
+    """
+    Every crossing found in one step, one row per particle of the bank.
+        component: index in reactor.components of the hit box, -1 if none
+                   (or of the material box where the particle collided)
+        normal: outward normal of the entered face (int8, zeros if none)
+        outcome: OUTCOME_* code of the component collision
+        wall: (N, 3) bool, axes where the particle was reflected by a wall
+        captured_weight: weight lost by implicit capture in this step, None
+                         without it (MaterialTable.implicit_capture)
+    """
+    component: np.ndarray
+    normal: np.ndarray
+    outcome: np.ndarray
+    wall: np.ndarray
+    captured_weight: np.ndarray | None = None
+
+
+def _inside(points: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """
+    Bool mask of the points inside [lower, upper], bounds included.
+    Axis by axis: much faster than np.all(..., axis=1) on (N, 3) arrays.
+    """
+    lower, upper = lower.T, upper.T
+    return ((points[:, 0] >= lower[0]) & (points[:, 0] <= upper[0]) &
+            (points[:, 1] >= lower[1]) & (points[:, 1] <= upper[1]) &
+            (points[:, 2] >= lower[2]) & (points[:, 2] <= upper[2]))
+
+
+def _entered_faces(rows: np.ndarray, position0: np.ndarray, position1: np.ndarray,
+                   lower: np.ndarray, upper: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Face crossed by each entering segment `rows`, same order as handle_collision.
+    Rows without a crossed face (no collision in handle_collision) are dropped.
+    """
+    p0, p1 = position0[rows], position1[rows]
+    if lower.ndim == 2:
+        lower, upper = lower[rows], upper[rows]
+    cross_low  = (p0 < lower) & (p1 >= lower)     # from left / front / bottom
+    cross_high = (p0 > upper) & (p1 <= upper)     # from right / back / top
+    crossed = cross_low | cross_high
+    has_face = crossed.any(axis=1)
+
+    rows, cross_low, crossed = rows[has_face], cross_low[has_face], crossed[has_face]
+    axis = crossed.argmax(axis=1)   # first crossed axis (x, y, z)
+    normal = np.zeros((rows.shape[0], 3), dtype=np.int8)
+    normal[np.arange(rows.shape[0]), axis] = np.where(
+        cross_low[np.arange(rows.shape[0]), axis], -1, 1)
+    return rows, normal
+
+
+def detect_crossings(position0: np.ndarray, position1: np.ndarray,
+                     lower: np.ndarray, upper: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized version of the entering test of handle_collision.
+        position0, position1: (N, 3) positions before and after the step
+        lower, upper: (3,) corners of one box, or (N, 3) one box per row
+    Returns:
+        rows: indices of the rows that entered their box
+        normal: (len(rows), 3) int8 normal of the first crossed face,
+                checked in the same order as handle_collision (x, y, z)
+    """
+    entered = ~_inside(position0, lower, upper) & _inside(position1, lower, upper)
+    return _entered_faces(np.flatnonzero(entered), position0, position1, lower, upper)
+
+
+def _first_hits(position0: np.ndarray, position1: np.ndarray, lower: np.ndarray,
+                upper: np.ndarray, behaviors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    First entered box of each segment, testing the boxes one by one.
+    Returns:
+        component (-1 if none) and normal of every segment.
+    """
+    n = position0.shape[0]
+    component = np.full(n, NO_COMPONENT, dtype=np.intp)
+    normal = np.zeros((n, 3), dtype=np.int8)
+
+    free = np.ones(n, dtype=bool)
+    for j in range(lower.shape[0]):
+        if behaviors[j] == BEHAVIOR_NONE:
+            continue
+        # Segments that already collided are not tested against the next boxes
+        entered = free & _inside(position1, lower[j], upper[j])
+        entered &= ~_inside(position0, lower[j], upper[j])
+        rows, face = _entered_faces(np.flatnonzero(entered), position0, position1,
+                                    lower[j], upper[j])
+        component[rows] = j
+        normal[rows] = face
+        free[rows] = False
+    return component, normal
+
+
+def _first_hits_indexed(position0: np.ndarray, position1: np.ndarray, lower: np.ndarray,
+                        upper: np.ndarray, behaviors: np.ndarray,
+                        index: UniformGridIndex) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Same result as _first_hits, but only the (segment, box) pairs returned
+    by the spatial index are tested.
+    """
+    n = position0.shape[0]
+    component = np.full(n, NO_COMPONENT, dtype=np.intp)
+    normal = np.zeros((n, 3), dtype=np.int8)
+
+    rows, items = index.candidates(position0, position1)
+    valid = behaviors[items] != BEHAVIOR_NONE
+    rows, items = rows[valid], items[valid]
+    hits, face = detect_crossings(position0[rows], position1[rows], lower[items], upper[items])
+    rows, items = rows[hits], items[hits]
+
+    # pairs are sorted by (row, component): keep the first box of each row
+    rows, first = np.unique(rows, return_index=True)
+    component[rows] = items[first]
+    normal[rows] = face[first]
+    return component, normal
+
+
+# Outcome of each behavior code, for elastic and inelastic reflections
+_OUTCOMES = {
+    True:  np.array([OUTCOME_NONE, OUTCOME_ABSORB, OUTCOME_REFLECT, OUTCOME_TRANSMIT,
+                     OUTCOME_FISSION], dtype=np.int8),
+    False: np.array([OUTCOME_NONE, OUTCOME_ABSORB, OUTCOME_INELASTIC, OUTCOME_TRANSMIT,
+                     OUTCOME_FISSION], dtype=np.int8),
+}
+
+
+def absorbed_mask(outcome: np.ndarray) -> np.ndarray:
+    """Particles that stopped in this step: absorbed, with or without fission."""
+    return (outcome == OUTCOME_ABSORB) | (outcome == OUTCOME_FISSION)
+
+# Below this number of components, testing every box is faster than the index
+INDEX_MIN_COMPONENTS = 16
+
+
+def reflect_walls(bank, limits: np.ndarray) -> np.ndarray:
+    """
+    Reflect alive particles that left the box [0, limits] and clamp them on the wall.
+    Returns:
+        (N, 3) bool mask of the reflected axes.
+    """
+    position, velocity = bank.position, bank.velocity
+    outside = (position < 0) | (position > limits)
+    outside &= bank.alive[:, None]
+    np.clip(position, 0, limits, out=position, where=outside)
+    velocity[outside] *= -1
+    return outside
+
+
+def handle_collisions(bank, reactor, elastic: bool = True, walls: bool = True,
+                      use_index: bool | None = None) -> CollisionResults:
+    """
+    Batch version of handle_collision for every alive particle of a ParticleBank
+    against every box of reactor.components, then against the reactor walls.
+
+    A particle collides at most with one component per step: the first one
+    (in reactor.components order) whose box it entered, as if handle_collision
+    was called for each component until it returns True.
+
+    With reactor.materials (src/materials.py), the components with a
+    material are media instead: particles enter them, then the ones inside
+    may be absorbed or scattered during the step, and the walls may absorb.
+
+        use_index: query reactor.spatial_index() for the candidate boxes of each
+                   particle. By default only with INDEX_MIN_COMPONENTS or more.
+    """
+    n = bank.size
+    components = reactor.components
+    lower, upper, behaviors = reactor.geometry()
+    materials = getattr(reactor, "materials", None)
+    if use_index is None:
+        use_index = len(components) >= INDEX_MIN_COMPONENTS
+
+    component = np.full(n, NO_COMPONENT, dtype=np.intp)
+    normal = np.zeros((n, 3), dtype=np.int8)
+    outcome = np.zeros(n, dtype=np.int8)
+
+    alive = np.flatnonzero(bank.alive)
+    if alive.shape[0] and len(components):
+        position0, position1 = bank.prev_position[alive], bank.position[alive]
+        if use_index:
+            hit, face = _first_hits_indexed(position0, position1, lower, upper,
+                                            behaviors, reactor.spatial_index())
+        else:
+            hit, face = _first_hits(position0, position1, lower, upper, behaviors)
+        component[alive] = hit
+        normal[alive] = face
+        collided = component != NO_COMPONENT
+        outcome[collided] = _OUTCOMES[elastic][behaviors[component[collided]]]
+        if materials is not None:
+            # a medium lets the particles in, its material decides the rest
+            medium = collided & (materials.component_ids(components)[component] != NO_MATERIAL)
+            outcome[medium] = OUTCOME_TRANSMIT
+
+    # Apply the outcomes
+    bank.alive[absorbed_mask(outcome)] = False
+
+    bounce = np.flatnonzero((outcome == OUTCOME_REFLECT) | (outcome == OUTCOME_INELASTIC))
+    bank.position[bounce] = bank.prev_position[bounce]
+    # v - 2 (v.n) n, n is a unit axis: only the normal component flips
+    axis = np.abs(normal[bounce]).argmax(axis=1)
+    bank.velocity[bounce, axis] *= -1
+
+    inelastic = np.flatnonzero(outcome == OUTCOME_INELASTIC)
+    bank.velocity[inelastic] *= 0.5
+    bank.energy[inelastic] *= 0.25    # velocity is reduced by half
+
+    captured_weight = (np.zeros(n) if materials is not None and materials.implicit_capture
+                       else None)
+    results = CollisionResults(component, normal, outcome, np.zeros((n, 3), dtype=bool),
+                               captured_weight)
+    if materials is not None and len(components):
+        collide_materials(bank, reactor, results, use_index)
+    if walls:
+        results = collide_walls(bank, reactor, results)
+    return results
+
+
+def _medium_rows(points: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+                 media: np.ndarray, index: UniformGridIndex | None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    First medium box (rows of media) containing each point, like _first_hits.
+    Returns:
+        rows of the points inside a medium and their box
+    """
+    if index is None:
+        box = np.full(points.shape[0], NO_COMPONENT, dtype=np.intp)
+        for j in media:
+            box[(box == NO_COMPONENT) & _inside(points, lower[j], upper[j])] = j
+        rows = np.flatnonzero(box != NO_COMPONENT)
+        return rows, box[rows]
+    is_medium = np.zeros(lower.shape[0], dtype=bool)
+    is_medium[media] = True
+    rows, items = index.candidates(points, points)
+    keep = is_medium[items]
+    rows, items = rows[keep], items[keep]
+    keep = _inside(points[rows], lower[items], upper[items])
+    rows, first = np.unique(rows[keep], return_index=True)
+    return rows, items[keep][first]
+
+
+def _positive(energy: np.ndarray) -> np.ndarray:
+    """Energies as divisors: a neutron at rest keeps a zero speed."""
+    return np.maximum(energy, np.finfo(np.float64).tiny)
+
+
+def collide_materials(bank, reactor, results: CollisionResults,
+                      use_index: bool = False) -> None:
+    """
+    Collisions inside the components with a material (src/materials.py),
+    for the alive particles that did not bounce on a component in this
+    step. The whole step length counts as the path in the medium (exact
+    for particles that were already inside). Updates the bank and results.
+    With implicit capture, every collision scatters and the weight lost
+    goes to results.captured_weight.
+    """
+    materials = reactor.materials
+    ids = materials.component_ids(reactor.components)
+    media = np.flatnonzero(ids != NO_MATERIAL)
+    free = np.flatnonzero(bank.alive & ((results.outcome == OUTCOME_NONE) |
+                                        (results.outcome == OUTCOME_TRANSMIT)))
+    if media.shape[0] == 0 or free.shape[0] == 0:
+        return
+    lower, upper, _ = reactor.geometry()
+    index = reactor.spatial_index() if use_index else None
+    inside, box = _medium_rows(bank.position[free], lower, upper, media, index)
+    rows = free[inside]
+    if rows.shape[0] == 0:
+        return
+
+    rng = materials.rng
+    material = ids[box]
+    energy = bank.energy[rows]
+    path_length = np.linalg.norm(bank.position[rows] - bank.prev_position[rows], axis=1)
+    cross_sections = materials.lookup(material, energy)
+    reaction = sample_reactions(cross_sections, path_length, rng, materials.implicit_capture)
+
+    captured = reaction == ABSORPTION
+    fission = reaction == FISSION
+    scatter = np.flatnonzero(reaction == SCATTER)
+    reacted = rows[reaction >= 0]
+    results.component[reacted] = box[reaction >= 0]
+    results.normal[reacted] = 0
+    results.outcome[rows[captured]] = OUTCOME_ABSORB
+    results.outcome[rows[fission]] = OUTCOME_FISSION
+    bank.alive[rows[captured | fission]] = False
+
+    scattered = rows[scatter]
+    if materials.implicit_capture:
+        survival = survival_probability(cross_sections[scatter])
+        results.captured_weight[scattered] += bank.weight[scattered] * (1.0 - survival)
+        bank.weight[scattered] *= survival
+    new_energy = scattered_energies(energy[scatter], materials.mass_number[material[scatter]], rng)
+    speed = (np.linalg.norm(bank.velocity[scattered], axis=1)
+             * np.sqrt(new_energy / _positive(energy[scatter])))
+    bank.velocity[scattered] = isotropic_directions(scatter.shape[0], rng) * speed[:, None]
+    bank.energy[scattered] = new_energy
+    results.outcome[scattered] = OUTCOME_SCATTER
+
+
+def collide_walls(bank, reactor, results: CollisionResults) -> CollisionResults:
+    """
+    Reflect the particles on the reactor walls (reflect_walls). With a wall
+    material, each of them is absorbed with probability
+    (absorption + fission) / total, the others lose a scattering energy.
+    With implicit capture, all of them are reflected with their weight
+    multiplied by scatter / total.
+    Returns:
+        results with the reflected axes in `wall`
+    """
+    wall = reflect_walls(bank, reactor_limits(reactor))
+    materials = getattr(reactor, "materials", None)
+    if materials is None or materials.wall == NO_MATERIAL:
+        return results._replace(wall=wall)
+
+    rows = np.flatnonzero(wall.any(axis=1))
+    energy = bank.energy[rows]
+    cross_sections = materials.lookup(np.full(rows.shape[0], materials.wall), energy)
+    rng = materials.rng
+    if materials.implicit_capture:
+        survival = survival_probability(cross_sections)
+        results.captured_weight[rows] += bank.weight[rows] * (1.0 - survival)
+        bank.weight[rows] *= survival
+        absorbed = np.zeros(rows.shape[0], dtype=bool)
+    else:
+        total = cross_sections.sum(axis=1)
+        absorbed = rng.random(rows.shape[0]) * total < total - cross_sections[:, SCATTER]
+    bank.alive[rows[absorbed]] = False
+    results.outcome[rows[absorbed]] = OUTCOME_ABSORB
+
+    kept = rows[~absorbed]
+    new_energy = scattered_energies(energy[~absorbed], materials.mass_number[materials.wall], rng)
+    bank.velocity[kept] *= np.sqrt(new_energy / _positive(energy[~absorbed]))[:, None]
+    bank.energy[kept] = new_energy
+    return results._replace(wall=wall)
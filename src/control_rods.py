@@ -3,8 +3,6 @@ from __future__ import annotations
 """
 Defines a simple control rod object that can be placed inside the reactor.
 """
-from mpl_toolkits.mplot3d import Axes3D
-from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 
 
 class ControlRod:
@@ -14,7 +12,7 @@ class ControlRod:
     """
     def __init__(self, x_position: float, y_position: float, width: float, 
              depth: float, height: float, color_rod: str, label: str, 
-             base_height: float = 0.0):
+             base_height: float = 0.0, collision_behavior: str = "reflect"):
 
 
         """
@@ -26,15 +24,58 @@ class ControlRod:
             label: Identifier label.
             base_height: Optional Z-position of the base (default 0.0). 
                          Useful for monitors that move up and down.
+            collision_behavior: What happens to a neutron entering the rod:
+                         "absorb", "reflect", "transmit" or "fission".
         """
         self.x_position = x_position
         self.y_position = y_position
-        self.height     = height
         self.width      = width
         self.depth      = depth
         self.label      = label
         self.color_rod  = color_rod
-        self.base_height = base_height
+
+        # Change tracking: every change of height, base_height or
+        # collision_behavior bumps the revision and calls the watchers
+        # (ReactorArea.add registers one), so the geometry tables, the
+        # spatial index and the renderer only update the rods that moved
+        self.revision = 0
+        self._watchers: list = []
+        self._height = height
+        self._base_height = base_height
+        self._collision_behavior = collision_behavior
+
+    def _update(self, name: str, value) -> None:
+        """Set a tracked attribute, nothing happens if the value is the same."""
+        if getattr(self, name) == value:
+            return
+        setattr(self, name, value)
+        self.revision += 1
+        for watcher in self._watchers:
+            watcher(self)
+
+    @property
+    def height(self) -> float:
+        return self._height
+
+    @height.setter
+    def height(self, value: float) -> None:
+        self._update("_height", value)
+
+    @property
+    def base_height(self) -> float:
+        return self._base_height
+
+    @base_height.setter
+    def base_height(self, value: float) -> None:
+        self._update("_base_height", value)
+
+    @property
+    def collision_behavior(self) -> str:
+        return self._collision_behavior
+
+    @collision_behavior.setter
+    def collision_behavior(self, value: str) -> None:
+        self._update("_collision_behavior", value)
 
     def set_height(self, new_height: float) -> None:
         """Update rod height."""
@@ -44,8 +85,8 @@ class ControlRod:
         """Update the vertical position of the base."""
         self.base_height = new_base
 
-    def draw(self, ax: Axes3D) -> None:
-        """Draw the rod as a vertical rectangular prism."""
+    def faces(self) -> list:
+        """6 faces of the rectangular prism, each as a list of 4 vertices."""
 
         # Corners, z0 is base, z1 is top
         z0 = self.base_height
@@ -53,8 +94,7 @@ class ControlRod:
         x0, y0 = self.x_position - self.width/2, self.y_position - self.depth/2
         x1, y1 = self.x_position + self.width/2, self.y_position + self.depth/2
 
-        # Define 6 faces (each as list of 4 vertices)
-        faces = [
+        return [
             # bottom
             [(x0,y0,z0),(x1,y0,z0),(x1,y1,z0),(x0,y1,z0)],
             # top
@@ -69,8 +109,7 @@ class ControlRod:
             [(x1,y0,z0),(x1,y1,z0),(x1,y1,z1),(x1,y0,z1)],
         ]
 
-        poly3d = Poly3DCollection(faces, facecolors=self.color_rod, alpha=0.35, linewidths=0.5)
-        ax.add_collection3d(poly3d)
-
-        # Label above the top of the rod
-        ax.text(self.x_position, self.y_position, z1 + 0.2, self.label, color="black")
+    def draw(self, ax) -> None:
+        """Draw the rod as a vertical rectangular prism (src/reactor_drawing.py)."""
+        from src.reactor_drawing import draw_component
+        draw_component(ax, self)
@@ -0,0 +1,309 @@
+from __future__ import annotations
+# criticality.py
+"""
+Fission source iteration (power iteration) and k-effective.
+
+Components with collision_behavior "fission" are the fuel: every neutron
+absorbed there is a fission site that produces on average
+    nu * fission_fraction
+new neutrons (attributes of the component, DEFAULT_NU and
+DEFAULT_FISSION_FRACTION if missing). With reactor.materials, a component
+whose material has a fission cross-section is fuel too: its collisions
+choose between capture and fission (src/materials.py), and every fission
+produces nu neutrons on average. One generation transports the source
+neutrons (src/event_transport.py) until they are all absorbed; the fission
+sites found become the source of the next generation.
+
+k of one generation = expected fission neutrons / source neutrons.
+The first `inactive` generations only let the source shape converge, k-eff
+is the mean over the `active` ones, with its standard error and confidence
+interval.
+
+Population control: the fission bank is split (sites copied) or rouletted
+(sites dropped) to exactly source_size sites before the next generation,
+so memory and time per generation stay the same for a supercritical or a
+subcritical core.
+
+Python:
+    from src.criticality import run_demo_criticality
+    result = run_demo_criticality(source_size=20000, inactive=10, active=40, seed=1)
+
+Command line (from the repository root):
+    python -m src.criticality --source-size 20000 --inactive 10 --active 40 --seed 1
+"""
+import argparse
+import time
+from statistics import NormalDist
+from typing import NamedTuple
+
+import numpy as np
+
+from src.area_reactor import ReactorArea
+from src.event_transport import transport
+from src.flux_tally import RunningStat
+from src.materials import FISSION, NO_MATERIAL
+from src.neutron_energy_distribution import neutron_energy_distribution
+from src.particle_manager import ParticleManager
+from src.reactor_builder import build_demo_reactor, random_velocities
+from src.reactor_geometry import (component_bounds, behavior_codes, reactor_limits,
+                                  BEHAVIOR_FISSION)
+
+# Mean number of neutrons per fission (U-235, thermal)
+DEFAULT_NU = 2.43
+# Fraction of the absorptions in the fuel that are fissions (the rest are captures)
+DEFAULT_FISSION_FRACTION = 0.42
+# Mesh of the Shannon entropy of the source, see source_entropy
+ENTROPY_MESH = (8, 8, 8)
+
+
+class GenerationResult(NamedTuple):
+    """
+    One generation of the power iteration.
+        k: expected fission neutrons per source neutron
+        fission_sites: sites banked, before population control
+        absorbed: source neutrons absorbed (in fuel or not)
+        lost: neutrons still alive after max_generation_time (killed)
+        entropy: Shannon entropy of the source (bits), flat once converged
+    """
+    k: float
+    fission_sites: int
+    absorbed: int
+    lost: int
+    entropy: float
+
+
+def fission_yields(components: list, materials=None) -> np.ndarray:
+    """
+    Expected neutrons per fission site in each component, 0 if not fuel.
+    A "fission" component banks all its absorptions (nu * fission_fraction),
+    a fissile material only its fissions (nu).
+        materials: MaterialTable of the reactor (src/materials.py), or None
+    """
+    behaviors = behavior_codes(components)
+    ids = (materials.component_ids(components) if materials is not None
+           else np.full(len(components), NO_MATERIAL))
+    yields = np.zeros(len(components))
+    for j, component in enumerate(components):
+        nu = getattr(component, "nu", DEFAULT_NU)
+        if ids[j] != NO_MATERIAL:
+            if materials.table[ids[j], :, FISSION].max() > 0:
+                yields[j] = nu
+        elif behaviors[j] == BEHAVIOR_FISSION:
+            yields[j] = nu * getattr(component, "fission_fraction", DEFAULT_FISSION_FRACTION)
+    return yields
+
+
+def sample_fission_bank(sites: np.ndarray, components: np.ndarray, yields: np.ndarray,
+                        rng: np.random.Generator) -> tuple[np.ndarray, float]:
+    """
+    Neutrons born at each fission site: floor(yield + u), u uniform in [0, 1),
+    so the mean is the yield of the component.
+    Returns:
+        new sites (one row per neutron) and the expected number of neutrons
+    """
+    expected = yields[components]
+    count = np.floor(expected + rng.random(expected.shape[0])).astype(np.intp)
+    return np.repeat(sites, count, axis=0), float(expected.sum())
+
+
+def population_control(sites: np.ndarray, target: int,
+                       rng: np.random.Generator) -> np.ndarray:
+    """
+    Exactly `target` sites from the fission bank:
+        more sites than target: Russian roulette, a random subset survives
+        fewer sites: splitting, every site is copied target // M times and
+                     target % M random ones once more
+    """
+    count = sites.shape[0]
+    if count == 0:
+        raise RuntimeError("No fission sites left: the chain reaction died out")
+    if count > target:
+        keep = rng.choice(count, target, replace=False)
+    else:
+        keep = np.concatenate((np.repeat(np.arange(count), target // count),
+                               rng.choice(count, target % count, replace=False)))
+    return sites[np.sort(keep)]
+
+
+def source_entropy(sites: np.ndarray, limits: np.ndarray,
+                   shape: tuple = ENTROPY_MESH) -> float:
+    """Shannon entropy (bits) of the sites over a coarse mesh of the reactor."""
+    cells = np.floor(sites / limits * np.array(shape)).astype(np.intp)
+    cells = np.clip(cells, 0, np.array(shape) - 1)
+    counts = np.bincount(np.ravel_multi_index(cells.T, shape), minlength=int(np.prod(shape)))
+    p = counts[counts > 0] / sites.shape[0]
+    return float(-(p * np.log2(p)).sum())
+
+
+class PowerIteration:
+    """
+    Power iteration on a reactor whose fuel components have the "fission"
+    behavior or a fissile material. The particle bank is allocated once for
+    source_size neutrons.
+    """
+
+    def __init__(self, reactor: ReactorArea, source_size: int = 10000,
+                 distribution_name: str = "watt", rng: np.random.Generator | None = None,
+                 window: float = 1.0, max_generation_time: float = 2000.0,
+                 particle_mass: float = 1.0) -> None:
+        """
+        Args:
+            source_size: neutrons per generation (population control target)
+            distribution_name: energy spectrum of the fission neutrons
+            window: time of the first event transport call of a generation, the
+                    next ones are twice longer each (few slow neutrons at the end)
+            max_generation_time: neutrons still alive after this are killed
+                                 (e.g. slow ones, or trapped in a bouncing path
+                                 that never meets an absorbing component)
+        """
+        self.reactor = reactor
+        self.source_size = int(source_size)
+        self.distribution_name = distribution_name
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.window = window
+        self.max_generation_time = max_generation_time
+        self.particle_mass = particle_mass
+
+        materials = getattr(reactor, "materials", None)
+        if materials is not None and materials.implicit_capture:
+            # the fission sites are the analog absorptions
+            raise ValueError("The power iteration does not support implicit capture")
+        self.yields = fission_yields(reactor.components, materials)
+        if not np.any(self.yields > 0):
+            raise ValueError("The reactor has no component with the 'fission' behavior "
+                             "or a fissile material")
+        self.particle_manager = ParticleManager(capacity=self.source_size)
+        self.source = self.initial_source()
+        self.generations: list[GenerationResult] = []
+
+    def initial_source(self) -> np.ndarray:
+        """source_size points uniform inside the fuel components."""
+        lower, upper = component_bounds(self.reactor.components)
+        fuel = np.flatnonzero(self.yields > 0)
+        volumes = np.prod(upper[fuel] - lower[fuel], axis=1)
+        if volumes.sum() > 0:
+            choice = self.rng.choice(fuel, self.source_size, p=volumes / volumes.sum())
+        else:
+            choice = self.rng.choice(fuel, self.source_size)
+        return lower[choice] + self.rng.random((self.source_size, 3)) * (upper[choice] - lower[choice])
+
+    def run_generation(self) -> GenerationResult:
+        """Transport the current source to the end and build the next one."""
+        bank = self.particle_manager.bank
+        bank.take(np.zeros(0, dtype=np.intp))     # empty, keeps the arrays
+        energies = neutron_energy_distribution(self.distribution_name, self.source_size,
+                                               self.rng)
+        self.particle_manager.spawn_many(self.source,
+                                         random_velocities(energies, self.rng,
+                                                           self.particle_mass),
+                                         energies)
+        entropy = source_entropy(self.source, reactor_limits(self.reactor))
+
+        sites, components = [], []
+        absorbed = 0
+        elapsed = 0.0
+        window = self.window
+        while bank.count_alive() and elapsed < self.max_generation_time:
+            window = min(window, self.max_generation_time - elapsed)
+            results = transport(bank, self.reactor, window)
+            sites.append(results.fission_sites)
+            components.append(results.fission_components)
+            absorbed += int(results.absorbed.sum()) + results.wall_absorbed
+            elapsed += window
+            window *= 2
+        lost = bank.count_alive()
+        bank.alive[:] = False
+
+        new_sites, expected = sample_fission_bank(np.concatenate(sites),
+                                                  np.concatenate(components),
+                                                  self.yields, self.rng)
+        self.source = population_control(new_sites, self.source_size, self.rng)
+        result = GenerationResult(expected / self.source_size, new_sites.shape[0],
+                                  absorbed, lost, entropy)
+        self.generations.append(result)
+        return result
+
+    def run(self, inactive: int = 10, active: int = 40, confidence: float = 0.95,
+            verbose: bool = False) -> dict:
+        """
+        Run inactive + active generations.
+        Returns:
+            dict with k_eff (mean of the active generations), std_error,
+            confidence_interval, and the k / entropy of every generation
+        """
+        k_active = RunningStat()
+        start = time.perf_counter()
+        for generation in range(inactive + active):
+            result = self.run_generation()
+            if generation >= inactive:
+                k_active.update(result.k)
+            if verbose:
+                kind = "inactive" if generation < inactive else "active"
+                print(f"{generation + 1:>4} {kind:<9} k = {result.k:.5f}  "
+                      f"entropy = {result.entropy:.3f}  sites = {result.fission_sites}")
+        wall_time = time.perf_counter() - start
+
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        k_eff, std_error = float(k_active.mean), float(k_active.std_error)
+        return {
+            "k_eff": k_eff,
+            "std_error": std_error,
+            "confidence": confidence,
+            "confidence_interval": (k_eff - z * std_error, k_eff + z * std_error),
+            "inactive": inactive,
+            "active": active,
+            "source_size": self.source_size,
+            "k": [g.k for g in self.generations],
+            "entropy": [g.entropy for g in self.generations],
+            "lost": sum(g.lost for g in self.generations),
+            "wall_time": wall_time,
+        }
+
+
+def run_demo_criticality(source_size: int = 10000, inactive: int = 10, active: int = 40,
+                         seed: int | None = None, absorber_height: float = 0.0,
+                         distribution_name: str = "watt", confidence: float = 0.95,
+                         verbose: bool = False) -> dict:
+    """
+    k-eff of the demo reactor (src/reactor_builder.py) with fissile fuel rods.
+        absorber_height: insertion of the 3 absorber rods, 0 = withdrawn
+    """
+    rng = np.random.default_rng(seed)
+    setup = build_demo_reactor(0, distribution_name, rng=rng)
+    for rod in setup.fuel_rods:
+        rod.collision_behavior = "fission"
+    for rod in setup.absorber_rods:
+        rod.set_height(absorber_height)
+    iteration = PowerIteration(setup.reactor, source_size, distribution_name, rng)
+    return iteration.run(inactive, active, confidence, verbose)
+
+
+def main(argv: list | None = None) -> dict:
+    parser = argparse.ArgumentParser(description="k-effective of the demo reactor.")
+    parser.add_argument("--source-size", type=int, default=10000,
+                        help="neutrons per generation")
+    parser.add_argument("--inactive", type=int, default=10,
+                        help="generations skipped while the source converges")
+    parser.add_argument("--active", type=int, default=40,
+                        help="generations averaged for k-eff")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--absorber-height", type=float, default=0.0,
+                        help="height of the absorber rods (0: withdrawn)")
+    parser.add_argument("--distribution", default="watt",
+                        help="fission spectrum (src/neutron_energy_distribution.py)")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="confidence level of the interval")
+    args = parser.parse_args(argv)
+
+    result = run_demo_criticality(args.source_size, args.inactive, args.active, args.seed,
+                                  args.absorber_height, args.distribution, args.confidence,
+                                  verbose=True)
+    low, high = result["confidence_interval"]
+    print(f"k-eff = {result['k_eff']:.5f} +- {result['std_error']:.5f} "
+          f"({100 * result['confidence']:.0f}% interval {low:.5f} - {high:.5f}), "
+          f"{result['wall_time']:.2f} s")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+from __future__ import annotations
+# event_transport.py
+"""
+Event-driven transport: every particle flies straight to its next event.
+
+The time-stepped engine (collision_engine.handle_collisions) only looks at
+the two ends of each step, so a fast neutron can jump over a thin rod, and a
+slow one needs many steps to cross empty space. Here the analytic ray-box
+distance (slab method) to every component and to the reactor walls gives
+the time of the next event of each particle, and the particle jumps there:
+    component entered: absorb / reflect / transmit, same rules as the
+                       time-stepped engine
+    reactor wall:      specular reflection
+    collision:         in a component with a material (src/materials.py),
+                       at an exponential distance -ln(u) / total
+With reactor.materials, the components with a material are media, as in
+the time-stepped engine: particles enter them whatever their behavior, a
+flight inside one ends at its collision or where it leaves the box, and
+the reaction is chosen in proportion to its cross-section (absorption,
+fission or scattering, implicit capture included). A wall material makes
+the walls absorb with probability (absorption + fission) / total.
+A window of `duration` is simulated with as many event rounds as needed,
+each round vectorized over all the particles that still have time left.
+
+The time-stepped mode stays the one used by the animation
+(simulation_core.advance), this one is simulation_core.advance_events.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from src.collision_engine import INDEX_MIN_COMPONENTS, NO_COMPONENT, _inside, _positive
+from src.flux_tally import near_box, segment_scores
+from src.materials import (FISSION, NO_MATERIAL, SCATTER, isotropic_directions,
+                           sample_reactions, scattered_energies, survival_probability)
+from src.reactor_geometry import (component_box, reactor_limits, BEHAVIOR_NONE,
+                                  BEHAVIOR_ABSORB, BEHAVIOR_REFLECT, BEHAVIOR_TRANSMIT,
+                                  BEHAVIOR_FISSION)
+from src.spatial_index import UniformGridIndex
+
+# With the spatial index, rays are only followed for this many grid cells per
+# round: longer flights are cut in several rounds with no event
+LOOKAHEAD_CELLS = 4.0
+
+
+class EventResults(NamedTuple):
+    """
+    Counters of one transport window.
+        component_hits: boxes entered, per component (any behavior)
+        absorbed: absorptions per component (fissions included)
+        wall_hits: reflections on the reactor walls (absorptions by a wall
+                   material included)
+        events: component, wall and collision events
+        rounds: vectorized event rounds needed for the window
+        unfinished: particles stopped by max_rounds before the end of the window
+        fission_sites: (K, 3) positions of the absorptions in "fission" components
+        fission_components: (K,) component of each fission site
+        collisions: collisions in the materials of the components
+        wall_absorbed: particles absorbed by the wall material
+    """
+    component_hits: np.ndarray
+    absorbed: np.ndarray
+    wall_hits: int
+    events: int
+    rounds: int
+    unfinished: int
+    fission_sites: np.ndarray
+    fission_components: np.ndarray
+    collisions: int = 0
+    wall_absorbed: int = 0
+
+
+def ray_box_entry(position: np.ndarray, inverse: np.ndarray, still: np.ndarray,
+                  lower: np.ndarray, upper: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Slab intersection of the rays position + velocity * t with boxes.
+        inverse: 1 / velocity (inf where the velocity is 0)
+        still: velocity == 0
+        lower, upper: (3,) corners of one box, or (N, 3) one box per ray
+    Returns:
+        t_enter, t_exit: times where the ray is inside the box, t_enter > t_exit if never
+        axis: axis of the face crossed at t_enter
+    """
+    n = position.shape[0]
+    t_enter = np.full(n, -np.inf)
+    t_exit = np.full(n, np.inf)
+    axis = np.zeros(n, dtype=np.int8)
+    for a in range(3):
+        low, high = lower[..., a], upper[..., a]
+        with np.errstate(invalid="ignore"):
+            t_low  = (low - position[:, a]) * inverse[:, a]
+            t_high = (high - position[:, a]) * inverse[:, a]
+        near = np.minimum(t_low, t_high)
+        far  = np.maximum(t_low, t_high)
+        # no motion along this axis: inside the slab forever, or never
+        if still[:, a].any():
+            inside = (position[:, a] >= low) & (position[:, a] <= high)
+            near = np.where(still[:, a], np.where(inside, -np.inf, np.inf), near)
+            far  = np.where(still[:, a], np.where(inside, np.inf, -np.inf), far)
+        later = near > t_enter
+        axis[later] = a
+        np.maximum(t_enter, near, out=t_enter)
+        np.minimum(t_exit, far, out=t_exit)
+    return t_enter, t_exit, axis
+
+
+def wall_times(position: np.ndarray, velocity: np.ndarray, limits: np.ndarray) -> np.ndarray:
+    """(N, 3) time until each particle reaches the wall of each axis, inf if never."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(velocity > 0, (limits - position) / velocity,
+                     np.where(velocity < 0, -position / velocity, np.inf))
+    return np.maximum(t, 0.0)
+
+
+def next_component_events(position: np.ndarray, velocity: np.ndarray, lower: np.ndarray,
+                          upper: np.ndarray, behaviors: np.ndarray, t_limit: np.ndarray,
+                          index: UniformGridIndex | None = None
+                          ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    First box entered by each ray before t_limit. A box that already
+    contains the particle (bounds included) is not an event, like in
+    handle_collision. Ties go to the first box in reactor.components order.
+    Returns:
+        t_hit (inf if none), component (-1 if none), axis of the entered face
+    """
+    n = position.shape[0]
+    t_hit = np.full(n, np.inf)
+    component = np.full(n, NO_COMPONENT, dtype=np.intp)
+    axis = np.zeros(n, dtype=np.int8)
+    with np.errstate(divide="ignore"):
+        inverse = 1.0 / velocity
+    still = velocity == 0
+
+    if index is None:
+        for j in range(lower.shape[0]):
+            if behaviors[j] == BEHAVIOR_NONE:
+                continue
+            t_enter, t_exit, face = ray_box_entry(position, inverse, still, lower[j], upper[j])
+            hit = (t_enter <= t_exit) & (t_enter >= 0) & (t_enter <= t_limit)
+            hit &= t_enter < t_hit
+            hit &= ~_inside(position, lower[j], upper[j])
+            t_hit[hit] = t_enter[hit]
+            component[hit] = j
+            axis[hit] = face[hit]
+        return t_hit, component, axis
+
+    # Only the boxes near the part of the ray flown before t_limit
+    rows, items = index.candidates(position, position + velocity * t_limit[:, None])
+    valid = behaviors[items] != BEHAVIOR_NONE
+    rows, items = rows[valid], items[valid]
+    t_enter, t_exit, face = ray_box_entry(position[rows], inverse[rows], still[rows],
+                                          lower[items], upper[items])
+    hit = (t_enter <= t_exit) & (t_enter >= 0) & (t_enter <= t_limit[rows])
+    hit &= ~_inside(position[rows], lower[items], upper[items])
+    rows, items, t_enter, face = rows[hit], items[hit], t_enter[hit], face[hit]
+
+    # earliest box of each row, then lowest component index
+    order = np.lexsort((items, t_enter, rows))
+    rows, first = np.unique(rows[order], return_index=True)
+    first = order[first]
+    t_hit[rows] = t_enter[first]
+    component[rows] = items[first]
+    axis[rows] = face[first]
+    return t_hit, component, axis
+
+
+def medium_exits(position: np.ndarray, velocity: np.ndarray, lower: np.ndarray,
+                 upper: np.ndarray, media: np.ndarray, index: UniformGridIndex | None = None
+                 ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Medium box each particle flies in: the first one (in reactor.components
+    order) that contains it, bounds included, and that it does not leave
+    at once (a particle on a face going out is not in that box).
+        media: rows of the boxes with a material
+    Returns:
+        rows of the particles in a medium, their box, and the time and axis
+        of the face where they leave it
+    """
+    if index is None:
+        inside = [np.flatnonzero(_inside(position, lower[j], upper[j])) for j in media]
+        rows = np.concatenate(inside)
+        items = np.repeat(media, [r.shape[0] for r in inside])
+    else:
+        is_medium = np.zeros(lower.shape[0], dtype=bool)
+        is_medium[media] = True
+        rows, items = index.candidates(position, position)
+        keep = is_medium[items]
+        rows, items = rows[keep], items[keep]
+        keep = _inside(position[rows], lower[items], upper[items])
+        rows, items = rows[keep], items[keep]
+
+    point, speed = position[rows], velocity[rows]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        far = np.where(speed > 0, (upper[items] - point) / speed,
+                       np.where(speed < 0, (lower[items] - point) / speed, np.inf))
+    axis = far.argmin(axis=1)
+    t_exit = far[np.arange(rows.shape[0]), axis]
+    keep = t_exit > 0
+    rows, items, t_exit, axis = rows[keep], items[keep], t_exit[keep], axis[keep]
+
+    order = np.lexsort((items, rows))
+    rows, first = np.unique(rows[order], return_index=True)
+    first = order[first]
+    return rows, items[first], t_exit[first], axis[first]
+
+
+def transport(bank, reactor, duration: float, elastic: bool = True, walls: bool = True,
+              use_index: bool | None = None, tallies: list = (),
+              max_rounds: int = 100000) -> EventResults:
+    """
+    Move every alive particle of the bank for `duration`, event by event.
+    bank.prev_position is set to the positions at the start of the window.
+
+        elastic: inelastic reflections halve the velocity (energy / 4) as in
+                 handle_collisions
+        use_index: query reactor.spatial_index() for the boxes near each ray,
+                   by default only with INDEX_MIN_COMPONENTS or more
+        tallies: objects with score_tracks(position0, position1, energies, weights),
+                 score_absorptions(positions, energies, weights) and end_step(dt)
+                 (e.g. mesh_tally.MeshTally). The monitor tallies
+                 (NeutronMonitor.tally) are always scored. Scores are
+                 weighted by bank.weight.
+        max_rounds: safety limit on the event rounds of one window
+    """
+    components = reactor.components
+    num_components = len(components)
+    lower, upper, behaviors = reactor.geometry()
+    # Flat boxes (e.g. a fully withdrawn rod, height 0) are never entered
+    flat = (upper <= lower).any(axis=1)
+    behaviors = np.where(flat, BEHAVIOR_NONE, behaviors).astype(np.int8)
+    limits = reactor_limits(reactor)
+    if use_index is None:
+        use_index = num_components >= INDEX_MIN_COMPONENTS
+    index = reactor.spatial_index() if use_index and num_components else None
+
+    materials = getattr(reactor, "materials", None)
+    media = np.zeros(0, dtype=np.intp)
+    if materials is not None:
+        rng = materials.rng
+        ids = materials.component_ids(components)
+        media = np.flatnonzero((ids != NO_MATERIAL) & ~flat)
+        # a medium lets the particles in, its material decides the rest
+        behaviors[media] = BEHAVIOR_TRANSMIT
+    wall_material = materials is not None and materials.wall != NO_MATERIAL
+
+    # Track length and crossings of each monitor, summed over the flights
+    monitors = [(j, c, component_box(c)) for j, c in enumerate(components)
+                if getattr(c, "tally", None) is not None]
+    monitor_length = np.zeros(len(monitors))
+    monitor_crossings = np.zeros(len(monitors))
+
+    component_hits = np.zeros(num_components, dtype=np.int64)
+    weighted_hits = np.zeros(num_components)
+    absorbed = np.zeros(num_components, dtype=np.int64)
+    wall_hits = 0
+    wall_absorbed = 0
+    collisions = 0
+    events = 0
+    rounds = 0
+    fission_sites = []
+    fission_components = []
+
+    np.copyto(bank.prev_position, bank.position)
+    active = np.flatnonzero(bank.alive)
+    remaining = np.full(active.shape[0], float(duration))
+
+    while active.shape[0] and rounds < max_rounds:
+        rounds += 1
+        position = bank.position[active]
+        velocity = bank.velocity[active]
+        energy = bank.energy[active]
+        weight = bank.weight[active]
+
+        # The flight ends at the first of: end of the window, wall, box
+        # entered, collision in a medium or exit from it
+        if walls:
+            t_wall = wall_times(position, velocity, limits)
+            t_limit = np.minimum(remaining, t_wall.min(axis=1))
+        else:
+            t_limit = remaining.copy()
+        if index is not None:
+            with np.errstate(divide="ignore"):
+                t_look = LOOKAHEAD_CELLS * index.cell_size / np.linalg.norm(velocity, axis=1)
+            np.minimum(t_limit, t_look, out=t_limit)
+        if media.shape[0]:
+            inside, medium, t_out, out_axis = medium_exits(position, velocity, lower, upper,
+                                                        media, index)
+            cross_sections = materials.lookup(ids[medium], energy[inside])
+            rate = cross_sections.sum(axis=1) * np.linalg.norm(velocity[inside], axis=1)
+            u = rng.random(inside.shape[0])
+            t_collide = np.full(inside.shape[0], np.inf)
+            np.divide(-np.log1p(-u), rate, out=t_collide, where=rate > 0)
+            t_limit[inside] = np.minimum(t_limit[inside], np.minimum(t_out, t_collide))
+        t_hit, component, face = next_component_events(position, velocity, lower, upper,
+                                                       behaviors, t_limit, index)
+        flight = np.minimum(t_hit, t_limit)
+        new_position = position + velocity * flight[:, None]
+
+        hit = np.flatnonzero(component != NO_COMPONENT)
+        hit_component = component[hit]
+        # Put the particles exactly on the surface they reached, so that the
+        # next round neither finds the same box again nor misses the wall
+        new_position[hit] = np.clip(new_position[hit], lower[hit_component],
+                                    upper[hit_component])
+        if walls:
+            wall = (t_wall <= flight[:, None]) & (component == NO_COMPONENT)[:, None]
+            np.clip(new_position, 0, limits, out=new_position)
+        else:
+            wall = np.zeros((active.shape[0], 3), dtype=bool)
+        collide = np.zeros(0, dtype=np.intp)
+        if media.shape[0]:
+            # nothing else happened first: a collision, or the particle left
+            # the medium and is put exactly on the face (not inside any more)
+            free = (component[inside] == NO_COMPONENT) & ~wall[inside].any(axis=1)
+            reached = free & (t_collide <= flight[inside])
+            left = np.flatnonzero(free & ~reached & (t_out <= flight[inside]))
+            box, axis = medium[left], out_axis[left]
+            new_position[inside[left], axis] = np.where(velocity[inside[left], axis] > 0,
+                                                        upper[box, axis], lower[box, axis])
+            collide = np.flatnonzero(reached)
+
+        # Scores of the flights
+        for tally in tallies:
+            tally.score_tracks(position, new_position, energy, weight)
+        if monitors:
+            low = np.minimum(position, new_position)
+            high = np.maximum(position, new_position)
+            for k, (j, monitor, box) in enumerate(monitors):
+                near = np.flatnonzero(near_box(low, high, box))
+                if near.shape[0]:
+                    length, crossings = segment_scores(position[near], new_position[near],
+                                                       np.array(box[:3]), np.array(box[3:]),
+                                                       weight[near])
+                    monitor_length[k] += length
+                    monitor_crossings[k] += crossings
+
+        # Apply the events
+        behavior = behaviors[hit_component]
+        absorb = hit[(behavior == BEHAVIOR_ABSORB) | (behavior == BEHAVIOR_FISSION)]
+        fission = hit[behavior == BEHAVIOR_FISSION]
+        bounce = hit[behavior == BEHAVIOR_REFLECT]
+        velocity[bounce, face[bounce]] *= -1
+        if not elastic:
+            velocity[bounce] *= 0.5
+            energy[bounce] *= 0.25    # velocity is reduced by half
+        velocity[wall] *= -1
+        for tally in tallies:
+            tally.score_absorptions(new_position[absorb], energy[absorb], weight[absorb])
+        component_hits += np.bincount(hit_component, minlength=num_components)
+        weighted_hits += np.bincount(hit_component, weights=weight[hit], minlength=num_components)
+        absorbed += np.bincount(component[absorb], minlength=num_components)
+        if fission.shape[0]:
+            fission_sites.append(new_position[fission])
+            fission_components.append(component[fission])
+
+        killed = [absorb]
+        if collide.shape[0]:
+            rows = inside[collide]
+            material = ids[medium[collide]]
+            # the collision happened, only its reaction is sampled
+            reaction = sample_reactions(cross_sections[collide], np.full(collide.shape[0], np.inf),
+                                        rng, materials.implicit_capture)
+            captured = np.flatnonzero(reaction != SCATTER)
+            sites = rows[reaction == FISSION]
+            for tally in tallies:
+                tally.score_absorptions(new_position[rows[captured]], energy[rows[captured]],
+                                        weight[rows[captured]])
+            absorbed += np.bincount(medium[collide[captured]], minlength=num_components)
+            if sites.shape[0]:
+                fission_sites.append(new_position[sites])
+                fission_components.append(medium[collide[reaction == FISSION]])
+            killed.append(rows[captured])
+
+            scatter = np.flatnonzero(reaction == SCATTER)
+            scattered = rows[scatter]
+            if materials.implicit_capture:
+                survival = survival_probability(cross_sections[collide[scatter]])
+                for tally in tallies:
+                    tally.score_absorptions(new_position[scattered], energy[scattered],
+                                            weight[scattered] * (1.0 - survival))
+                weight[scattered] *= survival
+            new_energy = scattered_energies(energy[scattered],
+                                            materials.mass_number[material[scatter]], rng)
+            speed = (np.linalg.norm(velocity[scattered], axis=1)
+                     * np.sqrt(new_energy / _positive(energy[scattered])))
+            velocity[scattered] = isotropic_directions(scattered.shape[0], rng) * speed[:, None]
+            energy[scattered] = new_energy
+            collisions += collide.shape[0]
+
+        walled = np.flatnonzero(wall.any(axis=1))
+        if wall_material and walled.shape[0]:
+            wall_xs = materials.lookup(np.full(walled.shape[0], materials.wall), energy[walled])
+            if materials.implicit_capture:
+                survival = survival_probability(wall_xs)
+                for tally in tallies:
+                    tally.score_absorptions(new_position[walled], energy[walled],
+                                            weight[walled] * (1.0 - survival))
+                weight[walled] *= survival
+                stopped = np.zeros(walled.shape[0], dtype=bool)
+            else:
+                total = wall_xs.sum(axis=1)
+                stopped = rng.random(walled.shape[0]) * total < total - wall_xs[:, SCATTER]
+                for tally in tallies:
+                    tally.score_absorptions(new_position[walled[stopped]],
+                                            energy[walled[stopped]], weight[walled[stopped]])
+            kept = walled[~stopped]
+            new_energy = scattered_energies(energy[kept], materials.mass_number[materials.wall],
+                                            rng)
+            velocity[kept] *= np.sqrt(new_energy / _positive(energy[kept]))[:, None]
+            energy[kept] = new_energy
+            killed.append(walled[stopped])
+            wall_absorbed += int(np.count_nonzero(stopped))
+        killed = np.concatenate(killed)
+
+        bank.position[active] = new_position
+        bank.velocity[active] = velocity
+        bank.energy[active] = energy
+        if materials is not None:
+            bank.weight[active] = weight
+        bank.alive[active[killed]] = False
+        wall_hits += walled.shape[0]
+        events += hit.shape[0] + walled.shape[0] + collide.shape[0]
+
+        remaining -= flight
+        keep = remaining > 0
+        keep[killed] = False
+        active, remaining = active[keep], remaining[keep]
+
+    for tally in tallies:
+        tally.end_step(duration)
+    for k, (j, monitor, box) in enumerate(monitors):
+        volume = float(np.prod(np.array(box[3:]) - np.array(box[:3])))
+        monitor.tally.add_step(float(monitor_length[k]), float(weighted_hits[j]),
+                               float(monitor_crossings[k]), volume, duration)
+
+    return EventResults(component_hits, absorbed, wall_hits, events, rounds,
+                        int(active.shape[0]),
+                        np.concatenate(fission_sites) if fission_sites else np.zeros((0, 3)),
+                        np.concatenate(fission_components) if fission_components
+                        else np.zeros(0, dtype=np.intp),
+                        collisions, wall_absorbed)
@@ -0,0 +1,259 @@
+from __future__ import annotations
+# flux_tally.py
+"""
+Track-length flux tallies for the neutron monitors.
+
+Each step, the segment prev_position -> position of every particle is
+clipped against the monitor box (slab method), all particles at once.
+The length inside the box divided by (volume * dt) is the track-length
+estimate of the scalar flux for that step. Collisions and surface
+crossings are counted as well, and every quantity keeps a running mean
+and variance over the steps. Every score is multiplied by the statistical
+weight of the particle (src/variance_reduction.py).
+
+The figure of merit of a tally, 1 / (R**2 * T) with R the relative
+standard error and T the computing time, does not depend on the length
+of the run: it compares the efficiency of two ways of running the same
+problem (e.g. analog against implicit capture and weight windows).
+"""
+import numpy as np
+
+from src.collision_engine import CollisionResults, absorbed_mask
+from src.reactor_geometry import component_box
+
+
+class RunningStat:
+    """
+    Running mean and variance of a scalar or array quantity (Welford).
+    """
+
+    def __init__(self, shape: tuple = ()) -> None:
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)      # sum of squared deviations
+
+    def update(self, value: np.ndarray | float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self._m2 = self._m2 + delta * (value - self.mean)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Sample variance of the scored values."""
+        if self.count < 2:
+            return np.zeros_like(self.mean)
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std_error(self) -> np.ndarray:
+        """Standard error of the mean."""
+        if self.count < 2:
+            return np.zeros_like(self.mean)
+        return np.sqrt(self.variance / self.count)
+
+    @property
+    def relative_error(self) -> np.ndarray:
+        """Standard error / mean, inf where the mean is 0."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.mean != 0, self.std_error / np.abs(self.mean), np.inf)
+
+    def figure_of_merit(self, seconds: float) -> np.ndarray:
+        """1 / (relative_error**2 * seconds), 0 when nothing was scored."""
+        relative = self.relative_error
+        with np.errstate(divide="ignore"):
+            return np.where(np.isfinite(relative) & (seconds > 0),
+                            1.0 / (relative ** 2 * seconds), 0.0)
+
+    def state(self) -> dict:
+        return {"count": np.array(self.count), "mean": np.asarray(self.mean),
+                "m2": np.asarray(self._m2)}
+
+    def restore(self, state: dict) -> None:
+        self.count = int(state["count"])
+        self.mean = np.array(state["mean"], dtype=np.float64)
+        self._m2 = np.array(state["m2"], dtype=np.float64)
+
+
+def clip_segments(position0: np.ndarray, position1: np.ndarray,
+                  lower: np.ndarray, upper: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Slab clipping of the segments position0 -> position1 against a box.
+        lower, upper: (3,) corners of one box, or (N, 3) one box per row
+    Returns:
+        t_enter, t_exit: fractions of the segment (0 = position0, 1 = position1)
+                         where it is inside the box, t_enter > t_exit if never
+    """
+    direction = position1 - position0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inverse = 1.0 / direction
+        t_low  = (lower - position0) * inverse
+        t_high = (upper - position0) * inverse
+    t_near = np.minimum(t_low, t_high)
+    t_far  = np.maximum(t_low, t_high)
+
+    # Axis without motion: inside the slab for the whole step, or never
+    still = direction == 0
+    inside_slab = (position0 >= lower) & (position0 <= upper)
+    t_near = np.where(still, np.where(inside_slab, -np.inf, np.inf), t_near)
+    t_far  = np.where(still, np.where(inside_slab, np.inf, -np.inf), t_far)
+
+    t_enter = np.maximum(t_near.max(axis=1), 0.0)
+    t_exit  = np.minimum(t_far.min(axis=1), 1.0)
+    return t_enter, t_exit
+
+
+def _inside(points: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    return ((points[:, 0] >= lower[0]) & (points[:, 0] <= upper[0]) &
+            (points[:, 1] >= lower[1]) & (points[:, 1] <= upper[1]) &
+            (points[:, 2] >= lower[2]) & (points[:, 2] <= upper[2]))
+
+
+def segment_box_lengths(position0: np.ndarray, position1: np.ndarray,
+                        lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """Length of each segment inside the box."""
+    t_enter, t_exit = clip_segments(position0, position1, lower, upper)
+    fraction = np.maximum(t_exit - t_enter, 0.0)
+    return fraction * np.linalg.norm(position1 - position0, axis=1)
+
+
+def segment_scores(position0: np.ndarray, position1: np.ndarray,
+                   lower: np.ndarray, upper: np.ndarray,
+                   weights: np.ndarray | None = None) -> tuple[float, float]:
+    """
+    Total track length of the segments inside the box and total number of
+    crossings of its surface, each segment counted with its weight if given.
+    """
+    t_enter, t_exit = clip_segments(position0, position1, lower, upper)
+    fraction = np.maximum(t_exit - t_enter, 0.0)
+    if weights is not None:
+        fraction *= weights
+    length = float(fraction @ np.linalg.norm(position1 - position0, axis=1))
+    crossings = count_crossings(position0, position1, lower, upper, (t_enter, t_exit))
+    if weights is None:
+        return length, float(crossings.sum())
+    return length, float(crossings @ weights)
+
+
+def near_box(low: np.ndarray, high: np.ndarray, box: tuple) -> np.ndarray:
+    """
+    Mask of the segments whose bounding box [low, high] touches the box
+    (x_min, y_min, z_min, x_max, y_max, z_max). Cheap filter before clipping.
+    """
+    return ((low[:, 0] <= box[3]) & (high[:, 0] >= box[0]) &
+            (low[:, 1] <= box[4]) & (high[:, 1] >= box[1]) &
+            (low[:, 2] <= box[5]) & (high[:, 2] >= box[2]))
+
+
+def count_crossings(position0: np.ndarray, position1: np.ndarray,
+                    lower: np.ndarray, upper: np.ndarray,
+                    clipped: tuple | None = None) -> np.ndarray:
+    """
+    Number of times (0, 1 or 2) each segment crosses the box surface.
+        clipped: (t_enter, t_exit) if clip_segments was already called
+    """
+    inside0 = _inside(position0, lower, upper)
+    inside1 = _inside(position1, lower, upper)
+    t_enter, t_exit = clipped or clip_segments(position0, position1, lower, upper)
+    # going in and out during the same step
+    through = ~inside0 & ~inside1 & (t_enter < t_exit)
+    return (inside0 != inside1).astype(np.int64) + 2 * through
+
+
+class MonitorTally:
+    """
+    Flux, collision and crossing tally of one monitor box.
+
+    Per step, the scores are (weighted by the particle weights):
+        flux:       sum of track lengths inside the box / (volume * dt)
+        collisions: particles that collided with the monitor (CollisionResults)
+        crossings:  crossings of the box surface
+    `flux`, `collisions` and `crossings` are RunningStat over the steps.
+    """
+
+    def __init__(self) -> None:
+        self.flux = RunningStat()
+        self.collisions = RunningStat()
+        self.crossings = RunningStat()
+        self.track_length = 0.0         # total over all steps
+
+    def score(self, position0: np.ndarray, position1: np.ndarray, box: tuple,
+              num_collisions: float, dt: float, weights: np.ndarray | None = None) -> None:
+        """
+        Score one step.
+            position0, position1: segments of the particles moving in this step
+            box: (x_min, y_min, z_min, x_max, y_max, z_max) of the monitor
+            weights: statistical weight of each segment, 1 if None
+        """
+        lower, upper = np.array(box[:3]), np.array(box[3:])
+        length, crossings = segment_scores(position0, position1, lower, upper, weights)
+        self.add_step(length, num_collisions, crossings, float(np.prod(upper - lower)), dt)
+
+    def add_step(self, length: float, num_collisions: float, crossings: float,
+                 volume: float, dt: float) -> None:
+        """
+        Score one step from its totals, when they were computed elsewhere
+        (e.g. summed over the flights of event_transport.transport).
+        """
+        self.track_length += length
+        self.flux.update(length / (volume * dt) if volume > 0 and dt > 0 else 0.0)
+        self.collisions.update(float(num_collisions))
+        self.crossings.update(float(crossings))
+
+    def summary(self, seconds: float | None = None) -> dict:
+        """
+        Running means and standard errors per step.
+            seconds: computing time of the run, adds the relative error and
+                     figure of merit of each quantity (e.g. "flux_fom")
+        """
+        summary = {
+            "steps": self.flux.count,
+            "flux": float(self.flux.mean), "flux_std_error": float(self.flux.std_error),
+            "collisions": float(self.collisions.mean),
+            "collisions_std_error": float(self.collisions.std_error),
+            "crossings": float(self.crossings.mean),
+            "crossings_std_error": float(self.crossings.std_error),
+        }
+        if seconds is not None:
+            for name in ("flux", "collisions", "crossings"):
+                stat = getattr(self, name)
+                summary[f"{name}_relative_error"] = float(stat.relative_error)
+                summary[f"{name}_fom"] = float(stat.figure_of_merit(seconds))
+        return summary
+
+    def state(self) -> dict:
+        state = {"track_length": np.array(self.track_length)}
+        for name in ("flux", "collisions", "crossings"):
+            for key, value in getattr(self, name).state().items():
+                state[f"{name}.{key}"] = value
+        return state
+
+    def restore(self, state: dict) -> None:
+        self.track_length = float(state["track_length"])
+        for name in ("flux", "collisions", "crossings"):
+            getattr(self, name).restore({key: state[f"{name}.{key}"]
+                                         for key in ("count", "mean", "m2")})
+
+
+def score_monitor_tallies(reactor, bank, results: CollisionResults, dt: float) -> None:
+    """
+    Score the tally of every component that has one (NeutronMonitor.tally)
+    with the segments of the particles that moved in this step: alive ones
+    and those absorbed during it, each one with its weight.
+    """
+    monitors = [(j, c) for j, c in enumerate(reactor.components)
+                if getattr(c, "tally", None) is not None]
+    if not monitors:
+        return
+    moved = bank.alive | absorbed_mask(results.outcome)
+    position0, position1 = bank.prev_position, bank.position
+    low, high = np.minimum(position0, position1), np.maximum(position0, position1)
+    collided = results.component >= 0
+    hits = np.bincount(results.component[collided], weights=bank.weight[collided],
+                       minlength=len(reactor.components))
+    for j, monitor in monitors:
+        box = component_box(monitor)
+        # Only the segments whose bounding box touches the monitor matter
+        near = np.flatnonzero(moved & near_box(low, high, box))
+        monitor.tally.score(position0[near], position1[near], box, hits[j], dt,
+                            bank.weight[near])
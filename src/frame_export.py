@@ -0,0 +1,174 @@
+from __future__ import annotations
+# frame_export.py
+"""
+Off-screen export of a recorded run as PNG frames or an MP4 movie.
+
+The run is recorded with the "frames" mode of src/trajectory_recorder.py
+(positions, energies and component heights every N steps):
+    python -m src.batch_runner --steps 2000 --record frames --record-path run.frames --record-every 5
+
+then drawn again without a window, on the Agg backend, by a process pool:
+every worker builds the same reactor (demo or scenario file), and for each
+of its frames sets the component heights, draws the reactor with
+ReactorArea.draw and the particles with the turbo colormap of
+add_energy_colorbar, and saves frame_000000.png, frame_000001.png, ...
+With an .mp4 output and ffmpeg on the PATH, the frames are then encoded.
+
+Command line (from the repository root):
+    python -m src.frame_export run.frames --output frames/ --workers 4
+    python -m src.frame_export run.frames --output frames/ --video run.mp4 --fps 30
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.particle_lod import LOD_THRESHOLD
+from src.trajectory_recorder import index_frames, read_frame
+
+FRAME_NAME = "frame_{:06d}.png"
+
+
+def _render_chunk(task: tuple) -> int:
+    """
+    Draw and save a run of consecutive frames, in a worker process.
+    Returns:
+        number of frames written
+    """
+    (frames_path, records, first_number, output_dir, scenario, energy_range, dpi,
+     size, cmap_name, max_points) = task
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from src.particle_visualization import add_energy_colorbar, scatter_particles
+    from src.reactor_builder import DEMO_SCENARIO
+    from src.scenario import build_reactor, load_scenario
+
+    reactor = build_reactor(load_scenario(scenario or DEMO_SCENARIO))[0]
+    data = np.memmap(frames_path, dtype=np.uint8, mode="r")
+
+    fig = plt.figure(figsize=size)
+    ax = fig.add_subplot(111, projection="3d")
+    fig.patch.set_facecolor("white")
+    add_energy_colorbar(fig, energy_range, cmap_name)
+
+    for k, record in enumerate(records):
+        frame = read_frame(data, record)
+        if frame["heights"].shape[0] != len(reactor.components):
+            raise ValueError(f"Frame {frame['step']} has {frame['heights'].shape[0]} components, "
+                             f"the reactor {len(reactor.components)}")
+        for component, height, base in zip(reactor.components, frame["heights"],
+                                           frame["base_heights"]):
+            component.height = float(height)
+            component.base_height = float(base)
+
+        ax.cla()
+        ax.set_xlim(0, reactor.width)
+        ax.set_ylim(0, reactor.depth)
+        ax.set_zlim(0, reactor.height)
+        ax.set_facecolor("white")
+        # the default white outline would vanish on the white background
+        reactor.draw(ax, frame_color="black")
+        scatter_particles(ax, frame["positions"], frame["energies"], energy_range, cmap_name,
+                          max_points=max_points)
+        ax.text2D(0.02, 0.98, f"step {frame['step']}, {frame['positions'].shape[0]} particles",
+                  transform=ax.transAxes)
+        fig.savefig(os.path.join(output_dir, FRAME_NAME.format(first_number + k)), dpi=dpi)
+    plt.close(fig)
+    return len(records)
+
+
+def export_frames(frames_path: str, output_dir: str, scenario: str | None = None,
+                  workers: int | None = None, every: int = 1, dpi: int = 100,
+                  size: tuple = (12, 8), energy_range: tuple | None = None,
+                  cmap_name: str = "turbo", chunk_size: int | None = None,
+                  max_points: int | None = LOD_THRESHOLD) -> int:
+    """
+    Draw every `every`-th record of a frames file into output_dir.
+        scenario: scenario file of the run, the demo reactor by default
+        workers: processes of the pool (1: in this process)
+        energy_range: (min, max) of the color scale, by default the energies
+                      of the first frame (the source, as in main.py)
+        chunk_size: consecutive frames drawn by one task
+        max_points: larger frames draw a stratified subsample (src/particle_lod.py)
+    Returns:
+        number of frames written
+    """
+    records = index_frames(frames_path)[::max(int(every), 1)]
+    if not records:
+        raise ValueError(f"No frame in '{frames_path}'")
+    os.makedirs(output_dir, exist_ok=True)
+    if energy_range is None:
+        first = read_frame(np.memmap(frames_path, dtype=np.uint8, mode="r"), records[0])
+        energies = first["energies"]
+        energy_range = (float(energies.min()), float(energies.max())) if energies.size else (0.0, 1.0)
+    energy_range = np.asarray(energy_range, dtype=np.float64)
+
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        # a few tasks per worker, each one sets up its figure once
+        chunk_size = max(1, -(-len(records) // (4 * workers)))
+    tasks = [(frames_path, records[i:i + chunk_size], i, output_dir, scenario, energy_range,
+              dpi, tuple(size), cmap_name, max_points) for i in range(0, len(records), chunk_size)]
+    if workers == 1:
+        return sum(_render_chunk(task) for task in tasks)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(_render_chunk, tasks))
+
+
+def make_video(output_dir: str, video_path: str, fps: float = 30.0) -> bool:
+    """
+    Encode the frames of output_dir with ffmpeg (H.264, yuv420p).
+    Returns:
+        False, and nothing is done, when ffmpeg is not installed
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return False
+    subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-framerate", str(fps),
+                    "-i", os.path.join(output_dir, FRAME_NAME.replace("{:06d}", "%06d")),
+                    "-c:v", "libx264", "-pix_fmt", "yuv420p",
+                    # libx264 needs even sizes
+                    "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", video_path], check=True)
+    return True
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Draw a recorded run off-screen.")
+    parser.add_argument("frames", help="file recorded with --record frames")
+    parser.add_argument("--output", default="frames", help="directory of the PNG frames")
+    parser.add_argument("--video", default=None, help="also encode an .mp4 (needs ffmpeg)")
+    parser.add_argument("--fps", type=float, default=30.0, help="frames per second of the video")
+    parser.add_argument("--scenario", default=None,
+                        help="scenario file of the run, the demo reactor by default")
+    parser.add_argument("--workers", type=int, default=None, help="processes, all CPUs by default")
+    parser.add_argument("--every", type=int, default=1, help="draw one recorded frame out of N")
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--size", type=float, nargs=2, default=(12, 8), metavar=("W", "H"),
+                        help="figure size in inches")
+    parser.add_argument("--energy-range", type=float, nargs=2, default=None,
+                        metavar=("MIN", "MAX"), help="color scale, first frame by default")
+    parser.add_argument("--max-points", type=int, default=LOD_THRESHOLD,
+                        help="particles drawn per frame, a stratified subsample above")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    count = export_frames(args.frames, args.output, args.scenario, args.workers, args.every,
+                          args.dpi, args.size, args.energy_range,
+                          max_points=args.max_points)
+    elapsed = time.perf_counter() - start
+    print(f"{count} frames written to {args.output} in {elapsed:.1f} s "
+          f"({count / elapsed:.1f} frames/s)")
+    if args.video:
+        if make_video(args.output, args.video, args.fps):
+            print(f"video written to {args.video}")
+        else:
+            print("ffmpeg not found, only the PNG frames were written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+from __future__ import annotations
+# materials.py
+"""
+Energy dependent cross-sections of the materials of the components and walls.
+
+One CSV file per material in data/materials/<name>.csv: macroscopic
+cross-sections (interactions per unit length of the reactor) at each
+energy in MeV, and the mass number of the target nucleus for the energy
+lost in a scattering:
+    # Boron carbide absorber
+    # mass_number = 11
+    energy,absorption,scatter,fission
+    1e-05,10.08,0.25,0
+    ...
+
+A MaterialTable puts all the materials of a reactor on the union of their
+energy grids once (linear interpolation, so nothing is lost), as one
+(materials, energies, reactions) array: the cross-sections of the whole
+bank are then one np.searchsorted on the grid plus one interpolation,
+whatever the material of each particle.
+
+In the fixed time step mode (collision_engine.handle_collisions), a
+component with a material is a medium: particles enter it whatever its
+collision_behavior, and a particle inside it collides during a step of
+length ds with probability 1 - exp(-total * ds). The reaction is chosen
+in proportion to its cross-section:
+    absorption  captured
+    fission     absorbed, a fission site (as the "fission" behavior)
+    scatter     elastic scattering on a nucleus of mass A: isotropic
+                direction, energy uniform in [alpha E, E],
+                alpha = ((A - 1) / (A + 1))**2
+A wall material (reactor.materials.wall) gives the reactor walls an
+albedo: a particle hitting a wall is absorbed with probability
+(absorption + fission) / total, else reflected with a scattering energy.
+With implicit_capture, nothing is absorbed: every collision scatters and
+the weight of the particle is multiplied by scatter / total
+(src/variance_reduction.py).
+The event driven transport (src/event_transport.py, criticality) uses the
+same media, with an exponential distance -ln(u) / total to the next
+collision instead of a collision probability per step.
+
+Scenario files name the material of each component group (material =
+"uo2") and, in the [materials] section, the material of the walls and
+the directory of the CSV files:
+    [materials]
+    walls = "steel"
+    directory = "data/materials"    # relative to the repository root
+    implicit_capture = true         # optional, weight_cutoff / survival_weight
+"""
+import csv
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+# Columns of the cross-section tables
+ABSORPTION = 0
+SCATTER    = 1
+FISSION    = 2
+REACTIONS = ("absorption", "scatter", "fission")
+NO_REACTION = -1
+
+NO_MATERIAL = -1
+
+MATERIALS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "data", "materials")
+
+
+class Material(NamedTuple):
+    """
+    Cross-sections of one material, as read from its file.
+        energy: (K,) increasing energies, MeV
+        cross_sections: (K, 3) absorption, scatter, fission per unit length
+        mass_number: of the target nucleus, energy lost by scattering
+    """
+    name: str
+    energy: np.ndarray
+    cross_sections: np.ndarray
+    mass_number: float
+    description: str = ""
+
+
+def read_material(path: str, name: str | None = None) -> Material:
+    """Parse a material CSV file (header comments, then the table)."""
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+    settings, description, rows = {}, [], []
+    with open(path, newline="") as file:
+        lines = [line.strip() for line in file if line.strip()]
+    for line in lines:
+        if not line.startswith("#"):
+            rows.append(line)
+        elif "=" in line:
+            key, value = line[1:].split("=", 1)
+            settings[key.strip()] = value.strip()
+        else:
+            description.append(line[1:].strip())
+
+    reader = csv.DictReader(rows)
+    missing = {"energy", *REACTIONS} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"Material '{name}' misses the columns {sorted(missing)}")
+    table = np.array([[float(row["energy"])] + [float(row[r]) for r in REACTIONS]
+                      for row in reader], dtype=np.float64).reshape(-1, 1 + len(REACTIONS))
+    energy, cross_sections = table[:, 0], table[:, 1:]
+    if energy.shape[0] < 2 or np.any(np.diff(energy) <= 0):
+        raise ValueError(f"Material '{name}' needs two or more increasing energies")
+    if np.any(cross_sections < 0):
+        raise ValueError(f"Material '{name}' has negative cross-sections")
+    return Material(name, energy, cross_sections, float(settings.get("mass_number", 1.0)),
+                    " ".join(description))
+
+
+def load_material(name: str, directory: str | None = None) -> Material:
+    """Material `name` of the data directory (MATERIALS_DIR by default)."""
+    path = os.path.join(directory or MATERIALS_DIR, f"{name}.csv")
+    if not os.path.exists(path):
+        raise ValueError(f"Material '{name}' not found ({path})")
+    return read_material(path, name)
+
+
+class MaterialTable:
+    """
+    Materials of one reactor on a shared energy grid.
+        table: (materials, energies, 3) cross-sections on energy_grid
+        wall: row of the wall material, NO_MATERIAL if the walls only reflect
+        rng: random generator of the collisions (checkpointed with the run
+             when it is the generator of the runner)
+        implicit_capture: reduce the weights instead of absorbing, the
+                          particles lighter than weight_cutoff are then
+                          rouletted to survival_weight by the runner
+    """
+
+    def __init__(self, materials: list, wall: str | None = None,
+                 rng: np.random.Generator | None = None, implicit_capture: bool = False,
+                 weight_cutoff: float = 0.25, survival_weight: float = 0.5) -> None:
+        self.materials = list(materials)
+        self.names = [material.name for material in self.materials]
+        if wall is not None and wall not in self.names:
+            raise ValueError(f"Wall material '{wall}' is not in the table")
+        self.wall = self.names.index(wall) if wall is not None else NO_MATERIAL
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.implicit_capture = implicit_capture
+        self.weight_cutoff = weight_cutoff
+        self.survival_weight = survival_weight
+
+        # union grid, every material interpolated on it (constant outside its range)
+        self.energy_grid = np.unique(np.concatenate([m.energy for m in self.materials]))
+        self.table = np.empty((len(self.materials), self.energy_grid.shape[0], len(REACTIONS)))
+        for i, material in enumerate(self.materials):
+            for r in range(len(REACTIONS)):
+                self.table[i, :, r] = np.interp(self.energy_grid, material.energy,
+                                                material.cross_sections[:, r])
+        self.mass_number = np.array([m.mass_number for m in self.materials])
+        self._spacing = np.diff(self.energy_grid)
+        self._component_ids: tuple | None = None
+
+    def index(self, name: str) -> int:
+        """Row of a material, ValueError if it is not in the table."""
+        try:
+            return self.names.index(name)
+        except ValueError:
+            raise ValueError(f"Material '{name}' is not in the table") from None
+
+    def component_ids(self, components: list) -> np.ndarray:
+        """
+        Row of the material of each component, NO_MATERIAL if none. Cached,
+        computed again when components are added (materials are set when
+        the reactor is built, they are not change tracked).
+        """
+        if self._component_ids is None or self._component_ids[0] != len(components):
+            ids = np.array([self.index(c.material) if getattr(c, "material", "") else NO_MATERIAL
+                            for c in components], dtype=np.intp)
+            self._component_ids = (len(components), ids)
+        return self._component_ids[1]
+
+    def lookup(self, material: np.ndarray, energy: np.ndarray) -> np.ndarray:
+        """
+        Cross-sections of each (material, energy) pair, one searchsorted for all.
+        Energies outside the grid get the values of its first / last point.
+        Returns:
+            (N, 3) absorption, scatter, fission
+        """
+        grid = self.energy_grid
+        k = np.searchsorted(grid, energy, side="right") - 1
+        np.clip(k, 0, grid.shape[0] - 2, out=k)
+        fraction = (energy - grid[k]) / self._spacing[k]
+        np.clip(fraction, 0.0, 1.0, out=fraction)
+        # rows of a flat (materials * energies, 3) view, one gather per bound
+        flat = self.table.reshape(-1, len(REACTIONS))
+        row = material * grid.shape[0] + k
+        low = np.take(flat, row, axis=0)
+        cross_sections = np.take(flat, row + 1, axis=0)
+        cross_sections -= low
+        cross_sections *= fraction[:, None]
+        cross_sections += low
+        return cross_sections
+
+
+def sample_reactions(cross_sections: np.ndarray, path_length: np.ndarray,
+                     rng: np.random.Generator, implicit_capture: bool = False) -> np.ndarray:
+    """
+    Reaction of each particle over its path in the medium.
+        implicit_capture: every collision is a SCATTER, the caller multiplies
+                          the weight by survival_probability
+    Returns:
+        ABSORPTION, SCATTER, FISSION or NO_REACTION for each row
+    """
+    total = cross_sections.sum(axis=1)
+    n = total.shape[0]
+    collide = rng.random(n) < -np.expm1(-total * path_length)
+    if implicit_capture:
+        return np.where(collide, SCATTER, NO_REACTION).astype(np.int8)
+    pick = rng.random(n) * total
+    absorption = cross_sections[:, ABSORPTION]
+    reaction = np.where(pick < absorption, ABSORPTION,
+                        np.where(pick < absorption + cross_sections[:, SCATTER], SCATTER, FISSION))
+    return np.where(collide, reaction, NO_REACTION).astype(np.int8)
+
+
+def survival_probability(cross_sections: np.ndarray) -> np.ndarray:
+    """scatter / total of each row, 1 where the total is 0."""
+    total = cross_sections.sum(axis=1)
+    survival = np.ones(total.shape[0])
+    np.divide(cross_sections[:, SCATTER], total, out=survival, where=total > 0)
+    return survival
+
+
+def scattered_energies(energy: np.ndarray, mass_number: np.ndarray,
+                       rng: np.random.Generator) -> np.ndarray:
+    """Energy after an elastic scattering, uniform in [alpha E, E]."""
+    alpha = ((mass_number - 1.0) / (mass_number + 1.0)) ** 2
+    return energy * (alpha + (1.0 - alpha) * rng.random(energy.shape[0]))
+
+
+def isotropic_directions(n: int, rng: np.random.Generator) -> np.ndarray:
+    """(n, 3) unit vectors, uniform on the sphere."""
+    direction = rng.normal(size=(n, 3))
+    norm = np.linalg.norm(direction, axis=1)
+    norm[norm == 0] = 1.0
+    return direction / norm[:, None]
+
+
+def material_table(components: list, settings: dict | None = None,
+                   rng: np.random.Generator | None = None) -> MaterialTable | None:
+    """
+    Table of the materials named by the components and the [materials]
+    section of a scenario, None when there are none.
+    """
+    settings = settings or {}
+    wall = settings.get("walls")
+    names = sorted({c.material for c in components if getattr(c, "material", "")}
+                   | ({wall} if wall else set()))
+    if not names:
+        return None
+    directory = settings.get("directory")
+    if directory is not None and not os.path.isabs(directory):
+        directory = os.path.join(os.path.dirname(os.path.dirname(MATERIALS_DIR)), directory)
+    return MaterialTable([load_material(name, directory) for name in names], wall, rng,
+                         bool(settings.get("implicit_capture", False)),
+                         float(settings.get("weight_cutoff", 0.25)),
+                         float(settings.get("survival_weight", 0.5)))
@@ -0,0 +1,297 @@
+from __future__ import annotations
+# mesh_tally.py
+"""
+Cartesian mesh tally over the whole reactor.
+
+The reactor box (width x depth x height) is split in nx x ny x nz voxels,
+optionally times a number of energy bins. Each step, the track length of
+every particle is scored in the voxels its segment crosses and every
+absorption in the voxel where it happened, with np.add.at into arrays
+allocated once (in place, and as fast as np.bincount with NumPy >= 1.25).
+Segments that stay in one voxel (most of them with small steps) are scored
+at once in the voxel of their start; the others, e.g. the long flights of
+the event mode, are cut at the voxel planes they cross first. The per
+particle work runs in scratch buffers that are reused between steps and
+only grow with the particle bank: only the segments that cross a plane
+(and the energy bins, if any) need arrays of their own.
+"""
+import numpy as np
+
+from src.area_reactor import ReactorArea
+from src.collision_engine import CollisionResults, absorbed_mask
+from src.reactor_geometry import reactor_limits
+
+AXES = {"x": 0, "y": 1, "z": 2}
+
+
+class MeshTally:
+    """
+    Flux and absorption tally on a regular mesh covering the reactor.
+        flux map: track length / (voxel volume * elapsed time)
+        absorption map: absorptions / elapsed time
+    """
+
+    def __init__(self, reactor: ReactorArea, shape: tuple = (20, 20, 16),
+                 energy_bins: np.ndarray | None = None, capacity: int = 1024) -> None:
+        """
+        Args:
+            shape: (nx, ny, nz) number of voxels along each axis
+            energy_bins: increasing bin edges in MeV, None for a single bin
+            capacity: initial size of the scratch buffers (number of particles)
+        """
+        self.limits = reactor_limits(reactor)
+        self.shape = tuple(int(n) for n in shape)
+        self.voxel_size = self.limits / np.array(self.shape)
+        self.voxel_volume = float(np.prod(self.voxel_size))
+        self.num_voxels = int(np.prod(self.shape))
+        self.energy_bins = None if energy_bins is None else np.asarray(energy_bins, dtype=np.float64)
+        self.num_energies = 1 if energy_bins is None else len(energy_bins) - 1
+
+        # Accumulated scores, flat index = energy_bin * num_voxels + voxel
+        self.track_length = np.zeros(self.num_energies * self.num_voxels)
+        self.absorptions = np.zeros(self.num_energies * self.num_voxels)
+        self.steps = 0
+        self.elapsed_time = 0.0
+
+        self._inverse_size = 1.0 / self.voxel_size
+        self._last_cell = np.array(self.shape, dtype=np.intp) - 1
+        self._strides = np.array([self.shape[1] * self.shape[2], self.shape[2], 1],
+                                 dtype=np.intp)
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        self._points  = np.empty((capacity, 3))
+        self._cells   = np.empty((capacity, 3), dtype=np.intp)
+        self._cells1  = np.empty((capacity, 3), dtype=np.intp)
+        self._flat    = np.empty(capacity, dtype=np.intp)
+        self._flat1   = np.empty(capacity, dtype=np.intp)
+        self._moved   = np.empty(capacity, dtype=bool)
+        self._lengths = np.empty(capacity)
+        self._before  = np.empty(capacity)
+        self._weights = np.empty(capacity)
+
+    def _locate(self, points: np.ndarray, cells: np.ndarray, flat: np.ndarray) -> None:
+        """Voxel (cells) and flat voxel index of `points`, into the given buffers."""
+        scaled = self._points[:points.shape[0]]
+        np.multiply(points, self._inverse_size, out=scaled)
+        # truncation is floor for the points inside, the others are clamped
+        np.copyto(cells, scaled, casting="unsafe")
+        np.maximum(cells, 0, out=cells)
+        np.minimum(cells, self._last_cell, out=cells)
+        np.dot(cells, self._strides, out=flat)
+
+    def _voxels(self, points: np.ndarray, energies: np.ndarray, n: int) -> np.ndarray:
+        """Flat (energy, voxel) index of `points`, computed in the scratch buffers."""
+        flat = self._flat[:n]
+        self._locate(points, self._cells[:n], flat)
+        if self.energy_bins is not None:
+            flat += self._energy_offsets(energies)
+        return flat
+
+    def _energy_offsets(self, energies: np.ndarray) -> np.ndarray:
+        """energy_bin * num_voxels of each energy, to add to the voxel indices."""
+        energy_bin = np.searchsorted(self.energy_bins, energies, side="right") - 1
+        np.clip(energy_bin, 0, self.num_energies - 1, out=energy_bin)
+        energy_bin *= self.num_voxels
+        return energy_bin
+
+    def _reserve(self, n: int) -> None:
+        if n > self._flat.shape[0]:
+            self._allocate(2 * n)
+
+    def score_tracks(self, position0: np.ndarray, position1: np.ndarray,
+                     energies: np.ndarray, weights: np.ndarray | None = None) -> None:
+        """
+        Score the track length of the segments position0 -> position1 in
+        every voxel they cross.
+            weights: optional factor of each segment (0 skips it)
+        """
+        n = position0.shape[0]
+        self._reserve(n)
+        lengths = self._lengths[:n]
+        direction = self._points[:n]
+        np.subtract(position1, position0, out=direction)
+        np.einsum("ij,ij->i", direction, direction, out=lengths)
+        np.sqrt(lengths, out=lengths)
+        if weights is not None:
+            lengths *= weights
+
+        cell0, cell1 = self._cells[:n], self._cells1[:n]
+        flat0, flat1 = self._flat[:n], self._flat1[:n]
+        self._locate(position0, cell0, flat0)
+        self._locate(position1, cell1, flat1)
+        if self.energy_bins is not None:
+            offsets = self._energy_offsets(energies)
+            flat0 += offsets
+            flat1 += offsets
+        moved = self._moved[:n]
+        np.not_equal(flat0, flat1, out=moved)
+        crossing = np.flatnonzero(moved)
+        steps = np.abs(np.take(cell1, crossing, axis=0) - np.take(cell0, crossing, axis=0))
+        planes = steps.sum(axis=1)
+        one, multi = crossing[planes == 1], crossing[planes > 1]
+
+        # In one voxel (most segments with small steps), or into the next
+        # one along one axis: the length up to the plane goes to the voxel
+        # of position0, the rest to the voxel of position1
+        before = self._before[:n]
+        np.copyto(before, lengths)
+        if one.shape[0]:
+            # np.take gathers whole rows, much faster than array[one] on (N, 3)
+            share = lengths[one] * self._plane_fractions(
+                *(np.take(array, one, axis=0) for array in (position0, position1, cell0, cell1)))
+            before[one] = share
+            np.add.at(self.track_length, flat1[one], lengths[one] - share)
+        before[multi] = 0.0
+        np.add.at(self.track_length, flat0, before)
+
+        # Longer segments, cut at every plane they cross
+        if multi.shape[0]:
+            self._score_split(*(np.take(array, multi, axis=0) for array in
+                                (position0, position1, cell0, cell1, energies, lengths)))
+
+    def _plane_fractions(self, position0: np.ndarray, position1: np.ndarray,
+                         cell0: np.ndarray, cell1: np.ndarray) -> np.ndarray:
+        """Fraction of each segment before the one voxel plane it crosses."""
+        fraction = np.ones(position0.shape[0])
+        for axis in range(3):
+            crossed = np.flatnonzero(cell0[:, axis] != cell1[:, axis])
+            start, end = position0[crossed, axis], position1[crossed, axis]
+            plane = np.maximum(cell0[crossed, axis], cell1[crossed, axis]) * self.voxel_size[axis]
+            fraction[crossed] = (plane - start) / (end - start)
+        return np.clip(fraction, 0.0, 1.0)
+
+    def _score_split(self, position0: np.ndarray, position1: np.ndarray, cell0: np.ndarray,
+                     cell1: np.ndarray, energies: np.ndarray, lengths: np.ndarray) -> None:
+        """
+        Score segments that cross several voxel planes: the crossing fractions t of
+        every plane between the cells of both ends are sorted per segment,
+        and each piece scores its share of the length at its own midpoint.
+        """
+        m = position0.shape[0]
+        direction = position1 - position0
+        step = np.sign(cell1 - cell0)
+        count = np.abs(cell1 - cell0)
+
+        # the planes crossed on each axis, with the t = 0 and t = 1 of every segment
+        segments = [np.arange(m), np.arange(m)]
+        fractions = [np.zeros(m), np.ones(m)]
+        for axis in range(3):
+            repeats = count[:, axis]
+            owner = np.repeat(np.arange(m), repeats)
+            k = np.arange(owner.shape[0]) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+            first = np.repeat(cell0[:, axis], repeats)
+            # plane between cells c and c + 1 going up, c and c - 1 going down
+            plane = np.where(np.repeat(step[:, axis], repeats) > 0, first + 1 + k, first - k)
+            t = ((plane * self.voxel_size[axis] - np.repeat(position0[:, axis], repeats))
+                 / np.repeat(direction[:, axis], repeats))
+            segments.append(owner)
+            fractions.append(np.clip(t, 0.0, 1.0))
+        segment = np.concatenate(segments)
+        t = np.concatenate(fractions)
+        order = np.lexsort((t, segment))
+        segment, t = segment[order], t[order]
+
+        # pieces between consecutive fractions of the same segment
+        piece = np.flatnonzero(segment[:-1] == segment[1:])
+        owner = segment[piece]
+        middle = 0.5 * (t[piece] + t[piece + 1])
+        points = position0[owner] + direction[owner] * middle[:, None]
+        scores = lengths[owner] * (t[piece + 1] - t[piece])
+        n = piece.shape[0]
+        self._reserve(n)
+        np.add.at(self.track_length, self._voxels(points, energies[owner], n), scores)
+
+    def score_absorptions(self, positions: np.ndarray, energies: np.ndarray,
+                          weights: np.ndarray | None = None) -> None:
+        """Score one absorption at each position, times its weight if given."""
+        n = positions.shape[0]
+        self._reserve(n)
+        np.add.at(self.absorptions, self._voxels(positions, energies, n),
+                  1.0 if weights is None else weights)
+
+    def end_step(self, dt: float) -> None:
+        """Close one scoring step (or event window) of length dt."""
+        self.steps += 1
+        self.elapsed_time += dt
+
+    def score(self, bank, results: CollisionResults, dt: float) -> None:
+        """
+        Score the segments and absorptions of one step, weighted by the
+        particle weights. The weight removed by implicit capture
+        (results.captured_weight) counts as absorbed where it happened.
+        """
+        n = bank.size
+        self._reserve(n)
+        absorbed = absorbed_mask(results.outcome)
+
+        # Track length of the particles that moved: alive or absorbed in this step
+        weights = self._weights[:n]
+        np.logical_or(bank.alive, absorbed, out=weights, casting="unsafe")
+        weights *= bank.weight
+        self.score_tracks(bank.prev_position, bank.position, bank.energy, weights)
+
+        # Absorptions where the particle stopped
+        self.score_absorptions(bank.position[absorbed], bank.energy[absorbed],
+                               bank.weight[absorbed])
+        if results.captured_weight is not None:
+            captured = np.flatnonzero(results.captured_weight)
+            self.score_absorptions(bank.position[captured], bank.energy[captured],
+                                   results.captured_weight[captured])
+        self.end_step(dt)
+
+    # --------------------------
+    # Results
+    # --------------------------
+    def flux_map(self) -> np.ndarray:
+        """Mean flux per voxel, shape (num_energies, nx, ny, nz)."""
+        scale = self.voxel_volume * self.elapsed_time
+        flux = self.track_length / scale if scale > 0 else np.zeros_like(self.track_length)
+        return flux.reshape((self.num_energies,) + self.shape)
+
+    def absorption_map(self) -> np.ndarray:
+        """Absorption rate per voxel, shape (num_energies, nx, ny, nz)."""
+        rate = (self.absorptions / self.elapsed_time if self.elapsed_time > 0
+                else np.zeros_like(self.absorptions))
+        return rate.reshape((self.num_energies,) + self.shape)
+
+    def slice(self, axis: str = "z", index: int = 0, quantity: str = "flux",
+              energy_bin: int | None = None) -> np.ndarray:
+        """
+        2D cut of a map, ready for a heatmap.
+            axis, index: cut at voxel `index` along "x", "y" or "z"
+            quantity: "flux" or "absorption"
+            energy_bin: one energy bin, None sums all of them
+        """
+        data = self.flux_map() if quantity == "flux" else self.absorption_map()
+        data = data.sum(axis=0) if energy_bin is None else data[energy_bin]
+        return np.take(data, index, axis=AXES[axis])
+
+    def plot_slice(self, ax, axis: str = "z", index: int = 0, quantity: str = "flux",
+                   energy_bin: int | None = None, cmap_name: str = "turbo"):
+        """Heatmap of slice() on a 2D matplotlib axes."""
+        data = self.slice(axis, index, quantity, energy_bin)
+        other = [name for name in AXES if name != axis]
+        extent = (0, self.limits[AXES[other[0]]], 0, self.limits[AXES[other[1]]])
+        image = ax.imshow(data.T, origin="lower", extent=extent, cmap=cmap_name, aspect="auto")
+        ax.set_xlabel(other[0])
+        ax.set_ylabel(other[1])
+        return image
+
+    def save(self, path: str) -> None:
+        """Write the maps and the mesh description to a .npz file."""
+        np.savez_compressed(
+            path, flux=self.flux_map(), absorption=self.absorption_map(),
+            limits=self.limits, shape=np.array(self.shape),
+            energy_bins=np.array([]) if self.energy_bins is None else self.energy_bins,
+            steps=np.array(self.steps), elapsed_time=np.array(self.elapsed_time))
+
+    def state(self) -> dict:
+        return {"track_length": self.track_length, "absorptions": self.absorptions,
+                "steps": np.array(self.steps), "elapsed_time": np.array(self.elapsed_time)}
+
+    def restore(self, state: dict) -> None:
+        self.track_length[:] = state["track_length"]
+        self.absorptions[:] = state["absorptions"]
+        self.steps = int(state["steps"])
+        self.elapsed_time = float(state["elapsed_time"])
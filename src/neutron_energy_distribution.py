@@ -1,28 +1,201 @@
 from __future__ import annotations
 # neutron_energy_distribution.py
+"""
+Energy spectra of the neutrons born in the fuel, in MeV.
 
+Every spectrum is an entry of `distribution_dict`: a function
+(num_neutrons, rng) -> energies, rng is a np.random.Generator.
+
+Physical spectra (Watt fission, Maxwellian, tabulated PDFs) are sampled by
+inverse CDF: the CDF is tabulated once on an energy grid, kept in a cache
+keyed by the spectrum name and its parameters, and every call only draws
+uniform numbers and interpolates them (np.interp), millions per call.
+
+New spectra are added without editing this module:
+    register_distribution("my_spectrum", lambda n, rng: ...)
+    register_tabulated("measured", energies, pdf)
+"""
 import numpy as np
 
+# Default spectrum parameters, thermal fission of U-235
+WATT_A = 0.988          # MeV
+WATT_B = 2.249          # 1/MeV
+MAXWELL_TEMPERATURE = 1.2895    # MeV
+
+# Points of the energy grid where the CDFs are tabulated
+GRID_POINTS = 8192
+# Points of the inverse CDF table, uniform in probability
+INVERSE_POINTS = 65537
+
+
+class TabulatedSampler:
+    """
+    Inverse-CDF sampler of a PDF given on an energy grid.
+    The PDF is integrated with the trapezoid rule, between two grid points
+    the CDF is linear (the energies are uniform inside each bin).
+
+    The inverse CDF is tabulated too, on a uniform grid of probabilities:
+    sampling is then a direct lookup plus a linear interpolation, without
+    any search.
+    """
+
+    def __init__(self, energies: np.ndarray, pdf: np.ndarray) -> None:
+        """
+        Args:
+            energies: increasing energy grid, MeV
+            pdf: probability density at each grid point, any normalization
+        """
+        energies = np.asarray(energies, dtype=np.float64)
+        pdf = np.asarray(pdf, dtype=np.float64)
+        if energies.ndim != 1 or energies.shape != pdf.shape or energies.shape[0] < 2:
+            raise ValueError("energies and pdf must be 1D arrays of the same length (>= 2)")
+        if np.any(np.diff(energies) <= 0):
+            raise ValueError("energies must be strictly increasing")
+        if np.any(pdf < 0) or energies[0] < 0:
+            raise ValueError("energies and pdf must be >= 0")
+
+        areas = 0.5 * (pdf[1:] + pdf[:-1]) * np.diff(energies)
+        cdf = np.concatenate(([0.0], np.cumsum(areas)))
+        if cdf[-1] <= 0:
+            raise ValueError("pdf must have a positive integral")
+        self.energies = energies
+        self.cdf = cdf / cdf[-1]
+        self.inverse = np.interp(np.linspace(0.0, 1.0, INVERSE_POINTS), self.cdf, energies)
+        self._slopes = np.diff(self.inverse)
+
+    def sample(self, num_neutrons: int, rng: np.random.Generator) -> np.ndarray:
+        """Draw num_neutrons energies."""
+        position = rng.random(num_neutrons)
+        position *= INVERSE_POINTS - 1
+        index = position.astype(np.intp)
+        # position becomes the fraction inside the bin
+        position -= index
+        position *= self._slopes[index]
+        position += self.inverse[index]
+        return position
+
+    def mean(self) -> float:
+        """Mean energy of the tabulated spectrum."""
+        middle = 0.5 * (self.energies[1:] + self.energies[:-1])
+        return float(middle @ np.diff(self.cdf))
+
+
+def watt_pdf(energies: np.ndarray, a: float = WATT_A, b: float = WATT_B) -> np.ndarray:
+    """Watt fission spectrum, exp(-E/a) sinh(sqrt(b E)), not normalized."""
+    return np.exp(-energies / a) * np.sinh(np.sqrt(b * energies))
+
+
+def maxwell_pdf(energies: np.ndarray, temperature: float = MAXWELL_TEMPERATURE) -> np.ndarray:
+    """Maxwellian spectrum, sqrt(E) exp(-E/T), not normalized."""
+    return np.sqrt(energies) * np.exp(-energies / temperature)
+
+
+# --------------------------
+# Sampler cache
+# --------------------------
+# (name, parameters) -> TabulatedSampler, built on first use
+_samplers: dict = {}
+
+
+def cached_sampler(name: str, params: tuple, build) -> TabulatedSampler:
+    """
+    Sampler of `name` with `params` from the cache, built with build() the
+    first time only.
+    """
+    key = (name, params)
+    sampler = _samplers.get(key)
+    if sampler is None:
+        sampler = build()
+        _samplers[key] = sampler
+    return sampler
+
+
+def watt_sampler(a: float = WATT_A, b: float = WATT_B,
+                 e_max: float = 20.0) -> TabulatedSampler:
+    def build() -> TabulatedSampler:
+        grid = np.linspace(0.0, e_max, GRID_POINTS)
+        return TabulatedSampler(grid, watt_pdf(grid, a, b))
+    return cached_sampler("watt", (a, b, e_max), build)
+
+
+def maxwell_sampler(temperature: float = MAXWELL_TEMPERATURE,
+                    e_max: float | None = None) -> TabulatedSampler:
+    """e_max: end of the grid, 30 * temperature by default (tail < 1e-11)."""
+    if e_max is None:
+        e_max = 30.0 * temperature
+    def build() -> TabulatedSampler:
+        grid = np.linspace(0.0, e_max, GRID_POINTS)
+        return TabulatedSampler(grid, maxwell_pdf(grid, temperature))
+    return cached_sampler("maxwellian", (temperature, e_max), build)
+
+
+def truncated_normal(num_neutrons: int, rng: np.random.Generator,
+                     loc: float = 1.0, scale: float = 0.5) -> np.ndarray:
+    """
+    Normal distribution restricted to E >= 0: negative draws are drawn again
+    (clipping them to 0 would pile them up at E = 0).
+    """
+    energies = rng.normal(loc, scale, size=num_neutrons)
+    negative = np.flatnonzero(energies < 0)
+    while negative.shape[0]:
+        energies[negative] = rng.normal(loc, scale, size=negative.shape[0])
+        negative = negative[energies[negative] < 0]
+    return energies
+
+
+# Each entry: function(num_neutrons, rng) -> energies, rng is a np.random.Generator
 distribution_dict = {
-    "debug_uniform": lambda num_neutrons: np.random.uniform(0.1, 10.0, size= num_neutrons),
-    "debug_normal": lambda num_neutrons: np.random.normal(loc=1.0, scale=0.5, size= num_neutrons)
+    "debug_uniform": lambda num_neutrons, rng: rng.uniform(0.1, 10.0, size= num_neutrons),
+    "debug_normal": lambda num_neutrons, rng: truncated_normal(num_neutrons, rng, 1.0, 0.5),
+    "watt": lambda num_neutrons, rng: watt_sampler().sample(num_neutrons, rng),
+    "maxwellian": lambda num_neutrons, rng: maxwell_sampler().sample(num_neutrons, rng),
 }
 
-def neutron_energy_distribution(distribution_name: str, num_neutrons: int) -> np.ndarray:
+
+def register_distribution(name: str, function, replace: bool = False) -> None:
+    """
+    Add a spectrum to distribution_dict.
+        function: function(num_neutrons, rng) -> energies (MeV, >= 0)
+        replace: allow replacing an existing entry
+    """
+    if name in distribution_dict and not replace:
+        raise ValueError(f"Distribution '{name}' already registered")
+    distribution_dict[name] = function
+
+
+def register_tabulated(name: str, energies: np.ndarray, pdf: np.ndarray,
+                       replace: bool = False) -> TabulatedSampler:
+    """
+    Register a user-supplied PDF (e.g. read from a file) as a spectrum.
+    The sampler is built here, once.
+    """
+    sampler = TabulatedSampler(energies, pdf)
+    _samplers[(name, ())] = sampler
+    register_distribution(name, lambda num_neutrons, rng: sampler.sample(num_neutrons, rng),
+                          replace)
+    return sampler
+
+
+def neutron_energy_distribution(distribution_name: str, num_neutrons: int,
+                                rng: np.random.Generator | None = None) -> np.ndarray:
     """
     Return array of neutron energies in MeV.
-    
+
     Parameters:
-        distribution_list: dict of functions returning energies
-        distribution_name: str, key in distribution_list
+        distribution_name: str, key in distribution_dict
         num_neutrons: int, number of neutrons
+        rng: random generator, a new unseeded one if None
     Returns:
         np.ndarray of energies
     """
     if distribution_name not in distribution_dict:
         raise ValueError(f"Distribution '{distribution_name}' not supported")
-    
-    energies = distribution_dict[distribution_name](num_neutrons)
-    # energies >= 0.0
-    energies = np.clip(energies, 0.0, None)
-    return energies
\ No newline at end of file
+    if rng is None:
+        rng = np.random.default_rng()
+
+    energies = np.asarray(distribution_dict[distribution_name](num_neutrons, rng),
+                          dtype=np.float64)
+    # Spectra must give energies >= 0.0, no clipping: it would distort them
+    if energies.shape[0] and energies.min() < 0:
+        raise ValueError(f"Distribution '{distribution_name}' returned negative energies")
+    return energies
@@ -0,0 +1,167 @@
+from __future__ import annotations
+# parallel_batches.py
+"""
+Independent Monte Carlo batches over a process pool.
+
+A run is split in `num_batches` batches. Batch i builds its own reactor and
+particles with a np.random.Generator seeded from child i of a single
+SeedSequence, so the result of each batch only depends on (seed, i): the
+merged tallies are bit-identical for a given seed whatever the number of
+worker processes or the order in which batches finish.
+
+Python:
+    from src.parallel_batches import run_parallel
+    result = run_parallel(num_batches=16, workers=4, seed=1, steps=500)
+
+Command line (from the repository root):
+    python -m src.parallel_batches --batches 16 --workers 4 --seed 1 --steps 500
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.collision_engine import NO_COMPONENT, absorbed_mask
+from src.reactor_builder import build_demo_reactor
+from src.simulation_core import advance
+
+# Default energy bins of the collision spectrum, MeV
+ENERGY_BINS = np.linspace(0.0, 10.0, 51)
+
+
+def run_one_batch(seed_sequence: np.random.SeedSequence, steps: int, dt: float,
+                  particles_per_fuel: int, distribution_name: str,
+                  energy_bins: np.ndarray) -> dict:
+    """
+    Run one batch from scratch and return its tallies.
+    Returns:
+        dict of arrays:
+            absorbed: absorptions per component
+            component_hits: collisions per component (any outcome, e.g. monitor hits)
+            wall_hits: reflections on the reactor walls
+            collision_spectrum: energies of the particles at their collisions
+    """
+    rng = np.random.default_rng(seed_sequence)
+    setup = build_demo_reactor(particles_per_fuel, distribution_name, rng=rng)
+    reactor, particle_manager = setup.reactor, setup.particle_manager
+    num_components = len(reactor.components)
+
+    absorbed = np.zeros(num_components, dtype=np.int64)
+    component_hits = np.zeros(num_components, dtype=np.int64)
+    wall_hits = np.zeros((), dtype=np.int64)
+    spectrum = np.zeros(len(energy_bins) - 1, dtype=np.int64)
+
+    for _ in range(steps):
+        results = advance(reactor, particle_manager, dt)
+        hit = results.component != NO_COMPONENT
+        component_hits += np.bincount(results.component[hit], minlength=num_components)
+        absorbed += np.bincount(results.component[absorbed_mask(results.outcome)],
+                                minlength=num_components)
+        wall_hits += np.count_nonzero(results.wall.any(axis=1))
+        spectrum += np.histogram(particle_manager.bank.energy[hit], bins=energy_bins)[0]
+
+    return {"absorbed": absorbed, "component_hits": component_hits,
+            "wall_hits": wall_hits, "collision_spectrum": spectrum}
+
+
+def _run_task(task: tuple) -> dict:
+    """Pool entry point, unpacks the arguments of run_one_batch."""
+    return run_one_batch(*task)
+
+
+def merge_tallies(batches: list) -> dict:
+    """
+    Combine the tallies of several batches, in the given order.
+    Returns:
+        for each tally name: {"total", "mean", "std_error"} where mean and
+        std_error are per batch (std_error = sample std / sqrt(num_batches))
+    """
+    merged = {}
+    for name in batches[0]:
+        values = np.stack([np.asarray(batch[name], dtype=np.float64) for batch in batches])
+        count = values.shape[0]
+        std = values.std(axis=0, ddof=1) if count > 1 else np.zeros_like(values[0])
+        merged[name] = {
+            "total": values.sum(axis=0),
+            "mean": values.mean(axis=0),
+            "std_error": std / np.sqrt(count),
+        }
+    return merged
+
+
+def run_parallel(num_batches: int = 8, workers: int | None = None, seed: int = 0,
+                 steps: int = 200, dt: float = 0.05, particles_per_fuel: int = 1000,
+                 distribution_name: str = "debug_uniform",
+                 energy_bins: np.ndarray | None = None) -> dict:
+    """
+    Run `num_batches` independent batches on `workers` processes and merge them.
+        workers: number of processes, os.cpu_count() if None, 1 runs in this process
+    Returns:
+        {"tallies": merge_tallies(...), "labels": component labels,
+         "energy_bins": bins, "wall_time": seconds, ...}
+    """
+    if energy_bins is None:
+        energy_bins = ENERGY_BINS
+    if workers is None:
+        workers = os.cpu_count() or 1
+    children = np.random.SeedSequence(seed).spawn(num_batches)
+    tasks = [(child, steps, dt, particles_per_fuel, distribution_name, energy_bins)
+             for child in children]
+
+    start = time.perf_counter()
+    if workers == 1:
+        batches = [_run_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map keeps the batch order, whatever order they finish in
+            batches = list(pool.map(_run_task, tasks))
+    wall_time = time.perf_counter() - start
+
+    reference = build_demo_reactor(0, distribution_name)
+    labels = [c.label for c in reference.reactor.components]
+    initial_particles = len(reference.fuel_rods) * particles_per_fuel
+    return {
+        "tallies": merge_tallies(batches),
+        "labels": labels,
+        "energy_bins": energy_bins,
+        "num_batches": num_batches,
+        "workers": workers,
+        "seed": seed,
+        "wall_time": wall_time,
+        # upper bound: counts every particle as alive during the whole batch
+        "particle_steps_per_second": num_batches * steps * initial_particles
+                                     / max(wall_time, 1e-12),
+    }
+
+
+def main(argv: list | None = None) -> dict:
+    parser = argparse.ArgumentParser(description="Parallel independent batches.")
+    parser.add_argument("--batches", type=int, default=8, help="number of batches")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="root seed of all the batches")
+    parser.add_argument("--steps", type=int, default=200, help="steps per batch")
+    parser.add_argument("--dt", type=float, default=0.05, help="time step")
+    parser.add_argument("--particles-per-fuel", type=int, default=1000,
+                        help="neutrons born in each fuel rod, per batch")
+    parser.add_argument("--distribution", default="debug_uniform",
+                        help="energy distribution name (src/neutron_energy_distribution.py)")
+    args = parser.parse_args(argv)
+
+    result = run_parallel(args.batches, args.workers, args.seed, args.steps, args.dt,
+                          args.particles_per_fuel, args.distribution)
+    tallies = result["tallies"]
+    print(f"{result['num_batches']} batches on {result['workers']} workers, "
+          f"{result['wall_time']:.2f} s")
+    print(f"{'component':<12}{'absorbed/batch':>20}{'hits/batch':>22}")
+    for i, label in enumerate(result["labels"]):
+        absorbed, hits = tallies["absorbed"], tallies["component_hits"]
+        print(f"{label.replace(chr(10), ' '):<12}"
+              f"{absorbed['mean'][i]:>12.1f} +- {absorbed['std_error'][i]:<6.1f}"
+              f"{hits['mean'][i]:>14.1f} +- {hits['std_error'][i]:<6.1f}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
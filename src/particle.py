@@ -1,4 +1,5 @@
 from __future__ import annotations
+from collections import deque
 import numpy as np
 
 """
@@ -12,17 +13,23 @@ class Particle:
     """
     Represents a single particle in 3D space.
     """
-    def __init__(self, position: np.ndarray, velocity: np.ndarray, energy: float):
+    def __init__(self, position: np.ndarray, velocity: np.ndarray, energy: float,
+                 history_length: int | None = 0):
         """
         Args:
             energy: Kinetic energy of the particle.
+            history_length: Number of past positions kept in self.history,
+                0 keeps none, None keeps all of them (memory grows every step).
         """
         self.position = np.array(position)
         self.prev_position = self.position.copy()   # used for collisions
         self.velocity = np.array(velocity)
         self.energy   = energy
         self.alive    = True  # Flag to know if particle is active
-        self.history  = [self.position.copy()]  # Store path for visualization
+        # Store path for visualization, oldest positions are dropped
+        self.history  = deque(maxlen=history_length)
+        if history_length != 0:
+            self.history.append(self.position.copy())
 
     def move(self, dt: float) -> None:
         """
@@ -35,7 +42,8 @@ class Particle:
         # Simple linear motion
         self.prev_position = self.position.copy()
         self.position += self.velocity * dt
-        self.history.append(self.position.copy())
+        if self.history.maxlen != 0:
+            self.history.append(self.position.copy())
 
     def absorb(self) -> None:
         """
@@ -0,0 +1,275 @@
+from __future__ import annotations
+# particle_bank.py
+"""
+Columnar (structure-of-arrays) storage for all the particles of a simulation.
+
+Instead of one Python object per neutron, every attribute lives in its own
+contiguous NumPy array, and moving, spawning or removing particles becomes a
+single bulk operation over the whole bank.
+"""
+import numpy as np
+
+
+class ParticleBank:
+    """
+    Stores position, prev_position, velocity, energy, statistical weight and
+    alive flag of N particles.
+
+    Arrays are allocated with some spare capacity and grow by doubling, so
+    spawning does not reallocate on every call. The public attributes
+    (position, velocity, ...) are views of the first `size` rows only.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        """
+        Args:
+            capacity: Number of rows allocated at the beginning.
+        """
+        capacity = max(int(capacity), 1)
+        self.size = 0
+        self._position      = np.zeros((capacity, 3), dtype=np.float64)
+        self._prev_position = np.zeros((capacity, 3), dtype=np.float64)
+        self._velocity      = np.zeros((capacity, 3), dtype=np.float64)
+        self._energy        = np.zeros(capacity, dtype=np.float64)
+        # Statistical weight, 1 for an analog particle (src/variance_reduction.py)
+        self._weight        = np.zeros(capacity, dtype=np.float64)
+        self._alive         = np.zeros(capacity, dtype=bool)
+        # Unique id of each particle, kept when the bank is compacted
+        self._id            = np.zeros(capacity, dtype=np.int64)
+        self.next_id = 0
+        # Scratch buffer for velocity * dt, avoids one allocation per step
+        self._step          = np.zeros((capacity, 3), dtype=np.float64)
+
+    # --------------------------
+    # Views of the active rows
+    # --------------------------
+    @property
+    def capacity(self) -> int:
+        return self._energy.shape[0]
+
+    @property
+    def position(self) -> np.ndarray:
+        return self._position[:self.size]
+
+    @property
+    def prev_position(self) -> np.ndarray:
+        return self._prev_position[:self.size]
+
+    @property
+    def velocity(self) -> np.ndarray:
+        return self._velocity[:self.size]
+
+    @property
+    def energy(self) -> np.ndarray:
+        return self._energy[:self.size]
+
+    @property
+    def weight(self) -> np.ndarray:
+        return self._weight[:self.size]
+
+    @property
+    def alive(self) -> np.ndarray:
+        return self._alive[:self.size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._id[:self.size]
+
+    def _columns(self) -> list[str]:
+        """Names of the storage arrays that hold one row per particle."""
+        return ["_position", "_prev_position", "_velocity", "_energy", "_weight", "_alive",
+                "_id"]
+
+    # --------------------------
+    # Bulk operations
+    # --------------------------
+    def reserve(self, capacity: int) -> None:
+        """Make sure the bank can hold at least `capacity` particles."""
+        if capacity <= self.capacity:
+            return
+        new_capacity = max(capacity, 2 * self.capacity)
+        for name in self._columns() + ["_step"]:
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def spawn_many(self, positions: np.ndarray, velocities: np.ndarray,
+                   energies: np.ndarray, weights: np.ndarray | None = None) -> None:
+        """Append many particles at once, all of them alive (weight 1 by default)."""
+        positions  = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        velocities = np.asarray(velocities, dtype=np.float64).reshape(-1, 3)
+        energies   = np.asarray(energies, dtype=np.float64).reshape(-1)
+        count = positions.shape[0]
+        if velocities.shape[0] != count or energies.shape[0] != count:
+            raise ValueError("positions, velocities and energies must have the same length")
+        if weights is None:
+            weights = 1.0
+        elif np.shape(weights) != (count,):
+            raise ValueError("weights must have one value per particle")
+
+        start, stop = self.size, self.size + count
+        self.reserve(stop)
+        self._position[start:stop]      = positions
+        self._prev_position[start:stop] = positions
+        self._velocity[start:stop]      = velocities
+        self._energy[start:stop]        = energies
+        self._weight[start:stop]        = weights
+        self._alive[start:stop]         = True
+        self._id[start:stop]            = np.arange(self.next_id, self.next_id + count)
+        self.next_id += count
+        self.size = stop
+
+    def spawn(self, position: np.ndarray, velocity: np.ndarray, energy: float) -> None:
+        """Append a single particle."""
+        self.spawn_many(position, velocity, [energy])
+
+    def move(self, dt: float) -> None:
+        """
+        Linear motion of every alive particle: position += velocity * dt.
+        Dead particles keep their position.
+        """
+        n = self.size
+        step = self._step[:n]
+        np.copyto(self._prev_position[:n], self._position[:n])
+        np.multiply(self._velocity[:n], dt, out=step)
+        step *= self._alive[:n, None]
+        self._position[:n] += step
+
+    def take(self, indices: np.ndarray) -> None:
+        """
+        Keep only the rows in `indices` (in that order) and move them to the
+        front of the storage. The allocated arrays are reused.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        count = indices.shape[0]
+        for name in self._columns():
+            array = getattr(self, name)
+            # np.take gathers whole rows, much faster than array[indices] on (N, 3)
+            array[:count] = np.take(array, indices, axis=0)
+        self.size = count
+
+    def compact(self) -> np.ndarray | None:
+        """
+        Remove dead particles in place.
+        Returns:
+            Old row of each kept particle, None if nothing was removed.
+        """
+        keep = np.flatnonzero(self._alive[:self.size])
+        if keep.shape[0] == self.size:
+            return None
+        self.take(keep)
+        return keep
+
+    def state(self) -> dict:
+        """Arrays of the active rows (views, no copy) and the id counter."""
+        state = {name.lstrip("_"): getattr(self, name)[:self.size] for name in self._columns()}
+        state["next_id"] = np.array(self.next_id)
+        return state
+
+    def restore(self, state: dict) -> None:
+        """
+        Replace the content of the bank by a state() dict, one bulk copy per
+        column (the arrays can be memory-mapped files).
+        """
+        size = state["energy"].shape[0]
+        self.size = 0
+        self.reserve(size)
+        for name in self._columns():
+            # states saved before the weights existed are analog
+            getattr(self, name)[:size] = state.get(name.lstrip("_"), 1.0)
+        self.next_id = int(state["next_id"])
+        self.size = size
+
+    def count_alive(self) -> int:
+        return int(np.count_nonzero(self._alive[:self.size]))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f"ParticleBank({self.size} particles, {self.count_alive()} alive)"
+
+
+class ParticleView:
+    """
+    Per-object access to one row of a ParticleBank.
+
+    Behaves like a Particle (position, velocity, energy, alive, absorb, ...)
+    but reads and writes the bank arrays directly. A view is only valid until
+    the bank is compacted or reordered.
+    """
+    __slots__ = ("bank", "index")
+
+    def __init__(self, bank: ParticleBank, index: int) -> None:
+        self.bank  = bank
+        self.index = index
+
+    @property
+    def position(self) -> np.ndarray:
+        return self.bank._position[self.index]
+
+    @position.setter
+    def position(self, value: np.ndarray) -> None:
+        self.bank._position[self.index] = value
+
+    @property
+    def prev_position(self) -> np.ndarray:
+        return self.bank._prev_position[self.index]
+
+    @prev_position.setter
+    def prev_position(self, value: np.ndarray) -> None:
+        self.bank._prev_position[self.index] = value
+
+    @property
+    def velocity(self) -> np.ndarray:
+        return self.bank._velocity[self.index]
+
+    @velocity.setter
+    def velocity(self, value: np.ndarray) -> None:
+        self.bank._velocity[self.index] = value
+
+    @property
+    def energy(self) -> float:
+        return float(self.bank._energy[self.index])
+
+    @energy.setter
+    def energy(self, value: float) -> None:
+        self.bank._energy[self.index] = value
+
+    @property
+    def weight(self) -> float:
+        return float(self.bank._weight[self.index])
+
+    @weight.setter
+    def weight(self, value: float) -> None:
+        self.bank._weight[self.index] = value
+
+    @property
+    def alive(self) -> bool:
+        return bool(self.bank._alive[self.index])
+
+    @alive.setter
+    def alive(self, value: bool) -> None:
+        self.bank._alive[self.index] = value
+
+    def move(self, dt: float) -> None:
+        """Move only this particle (prefer ParticleBank.move for many)."""
+        if not self.alive:
+            return
+        self.prev_position = self.position
+        self.position = self.position + self.velocity * dt
+
+    def absorb(self) -> None:
+        self.alive = False
+
+    def scatter(self, new_velocity: np.ndarray, energy_loss: float = 0.0) -> None:
+        self.velocity = new_velocity
+        self.energy = max(self.energy - energy_loss, 0.0)
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def __repr__(self) -> str:
+        return (f"ParticleView(pos={self.position}, vel={self.velocity}, "
+                f"energy={self.energy:.2f}, alive={self.alive})")
@@ -0,0 +1,114 @@
+from __future__ import annotations
+# particle_lod.py
+"""
+Level of detail for drawing large particle populations (NumPy only, the
+drawing itself is in reactor_renderer.py / particle_visualization.py).
+
+Above a threshold (LOD_THRESHOLD alive particles by default), drawing
+every neutron is slow and unreadable. Instead:
+    "subsample"   a stratified random subset: the reactor is cut in
+                  STRATA cells and each cell keeps the same fraction of
+                  its particles, so sparse regions do not vanish
+    "voxels"      one semi-transparent marker per occupied voxel of a 3D
+                  histogram, opacity from the density, color from the mean
+                  energy
+    "walls"       the histogram projected on three walls of the reactor
+                  (floor, back and left), as heatmaps of the mean energy
+All the binning is done with np.bincount, one pass over the particles.
+"""
+import numpy as np
+
+LOD_THRESHOLD = 10_000
+LOD_MODES = ("subsample", "voxels", "walls")
+STRATA = (8, 8, 8)
+
+
+def voxel_index(positions: np.ndarray, limits: np.ndarray, shape: tuple) -> np.ndarray:
+    """Flat index of the voxel of each position, in a grid `shape` over [0, limits]."""
+    shape = np.asarray(shape, dtype=np.intp)
+    cell = np.floor(positions / np.asarray(limits, dtype=np.float64) * shape).astype(np.intp)
+    np.clip(cell, 0, shape - 1, out=cell)
+    return np.ravel_multi_index(cell.T, tuple(shape))
+
+
+def stratified_subsample(positions: np.ndarray, max_points: int, limits: np.ndarray,
+                         rng: np.random.Generator | None = None,
+                         strata: tuple = STRATA) -> np.ndarray:
+    """
+    Indices of about max_points positions, the same fraction of each stratum.
+    Every stratum keeps floor(count * fraction) particles, plus one with the
+    probability of the remainder, so the total is max_points on average.
+    Returns:
+        sorted indices into positions
+    """
+    count = positions.shape[0]
+    if count <= max_points:
+        return np.arange(count)
+    if rng is None:
+        rng = np.random.default_rng()
+    cell = voxel_index(positions, limits, strata)
+    per_cell = np.bincount(cell, minlength=int(np.prod(strata)))
+    wanted = per_cell * (max_points / count)
+    quota = np.floor(wanted + rng.random(wanted.shape[0])).astype(np.intp)
+
+    # random order inside each cell (one sort of cell + a random fraction),
+    # then keep the first quota[cell] of them
+    order = np.argsort(cell + rng.random(count))
+    sorted_cells = cell[order]
+    first_of_cell = np.cumsum(per_cell) - per_cell
+    rank = np.arange(count) - first_of_cell[sorted_cells]
+    return np.sort(order[rank < quota[sorted_cells]])
+
+
+def density_grid(positions: np.ndarray, energies: np.ndarray, limits: np.ndarray,
+                 shape: tuple) -> tuple[np.ndarray, np.ndarray]:
+    """
+    3D histogram of the particles.
+    Returns:
+        counts: `shape` array of particles per voxel
+        energy_sum: `shape` array, sum of their energies (mean = sum / counts)
+    """
+    size = int(np.prod(shape))
+    cell = voxel_index(positions, limits, shape)
+    counts = np.bincount(cell, minlength=size).reshape(shape)
+    energy_sum = np.bincount(cell, weights=energies, minlength=size).reshape(shape)
+    return counts, energy_sum
+
+
+def voxel_centers(limits: np.ndarray, shape: tuple) -> np.ndarray:
+    """(prod(shape), 3) centers of the voxels, in flat index order."""
+    axes = [(np.arange(n) + 0.5) * (float(limit) / n) for limit, n in zip(limits, shape)]
+    grid = np.meshgrid(*axes, indexing="ij")
+    return np.stack([g.ravel() for g in grid], axis=1)
+
+
+def wall_projections(counts: np.ndarray, energy_sum: np.ndarray) -> dict:
+    """
+    Histogram summed across each axis, on the walls of wall_cells.
+    Returns:
+        {"floor": (nx, ny), "back": (nx, nz), "left": (ny, nz)} of
+        (counts, energy_sum) pairs
+    """
+    return {name: (counts.sum(axis=axis), energy_sum.sum(axis=axis))
+            for name, axis in (("floor", 2), ("back", 1), ("left", 0))}
+
+
+def wall_cells(limits: np.ndarray, shape: tuple) -> np.ndarray:
+    """
+    Quadrilaterals of the wall heatmaps, (nx*ny + nx*nz + ny*nz, 4, 3):
+    the floor (z = 0), the back wall (y = depth) and the left wall (x = 0),
+    cells in the order of wall_projections, raveled.
+    """
+    edges = [np.linspace(0.0, float(limit), n + 1) for limit, n in zip(limits, shape)]
+    walls = []
+    # (first axis, second axis, fixed axis, fixed value)
+    for a, b, fixed, value in ((0, 1, 2, 0.0), (0, 2, 1, float(limits[1])), (1, 2, 0, 0.0)):
+        lo_a, lo_b = np.meshgrid(edges[a][:-1], edges[b][:-1], indexing="ij")
+        hi_a, hi_b = np.meshgrid(edges[a][1:], edges[b][1:], indexing="ij")
+        quads = np.empty(lo_a.shape + (4, 3))
+        quads[..., fixed] = value
+        for corner, (u, v) in enumerate(((lo_a, lo_b), (hi_a, lo_b), (hi_a, hi_b), (lo_a, hi_b))):
+            quads[..., corner, a] = u
+            quads[..., corner, b] = v
+        walls.append(quads.reshape(-1, 4, 3))
+    return np.concatenate(walls)
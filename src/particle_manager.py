@@ -1,44 +1,109 @@
 from __future__ import annotations
 # particle_manager.py
-from src.particle import Particle
+from src.particle_bank import ParticleBank, ParticleView
+from src.spatial_index import MORTON_BITS, morton_order
+from src.trajectory_recorder import TrajectoryRecorder
 import numpy as np
 
 class ParticleManager:
     """
     Manages a collection of particles in the reactor.
     Handles spawning, updating, collisions, and removal.
+    The particles are stored column by column in a ParticleBank.
     """
 
-    def __init__(self):
-        self.particles: list[Particle] = []  # store all Particle instances
+    def __init__(self, capacity: int = 1024, recorder: TrajectoryRecorder | None = None):
+        """
+        Args:
+            recorder: optional trajectory recording (src/trajectory_recorder.py),
+                      None records nothing
+        """
+        self.bank = ParticleBank(capacity)  # store all particle arrays
+        self.recorder = recorder
+        self.step = 0       # number of update_all calls
+
+    @property
+    def particles(self) -> list[ParticleView]:
+        """
+        Per-object access, one view per stored particle.
+        Slow for large populations, use self.bank for bulk work.
+        """
+        return [ParticleView(self.bank, i) for i in range(self.bank.size)]
 
     def spawn(self, position: np.ndarray, velocity: np.ndarray, energy: float) -> None:
         """Add a new particle to the system."""
-        particle = Particle(position, velocity, energy)
-        self.particles.append(particle)
+        self.bank.spawn(position, velocity, energy)
+
+    def spawn_many(self, positions: np.ndarray, velocities: np.ndarray,
+                   energies: np.ndarray, weights: np.ndarray | None = None) -> None:
+        """Add many particles to the system at once."""
+        self.bank.spawn_many(positions, velocities, energies, weights)
 
     def update_all(self, dt: float) -> None:
         """Update all particles' positions."""
-        for particle in self.particles:
-            if particle.alive:
-                particle.move(dt)
+        self.bank.move(dt)
+        self.end_step()
 
-    def remove_dead(self) -> None:
-        """Remove all dead particles to keep the list clean."""
-        self.particles = [particle for particle in self.particles if particle.alive]
+    def end_step(self) -> None:
+        """Count one step and record the trajectories, after the bank was moved."""
+        self.step += 1
+        if self.recorder is not None:
+            self.recorder.record(self.bank, self.step)
+
+    def remove_dead(self) -> int:
+        """
+        Remove all dead particles, compacting the bank in place.
+        Returns:
+            Number of removed particles.
+        """
+        size = len(self.bank)
+        keep = self.bank.compact()
+        if keep is None:
+            return 0
+        if self.recorder is not None:
+            self.recorder.reorder(keep)
+        return size - keep.shape[0]
+
+    def sort_particles(self, limits: np.ndarray, bits: int = MORTON_BITS) -> int:
+        """
+        Remove the dead particles and sort the alive ones along the Morton
+        order of their cells (spatial_index.morton_order), in one bank.take:
+        neighbors in the reactor become neighbors in memory, so the per-cell
+        gathers of the collisions and tallies read contiguous data.
+            limits: (width, depth, height) of the reactor
+        Returns:
+            Number of removed particles.
+        """
+        size = len(self.bank)
+        alive = np.flatnonzero(self.bank.alive)
+        order = alive[morton_order(self.bank.position[alive], limits, bits)]
+        self.bank.take(order)
+        if self.recorder is not None:
+            self.recorder.reorder(order)
+        return size - order.shape[0]
+
+    def state(self) -> dict:
+        """Bank arrays and step counter, see ParticleBank.state."""
+        state = self.bank.state()
+        state["step"] = np.array(self.step)
+        return state
+
+    def restore(self, state: dict) -> None:
+        self.bank.restore(state)
+        self.step = int(state["step"])
 
     # "dunder" methods: special methods
-    
+
     # __len__: avoids TypeError: object of type 'ParticleManager' has no len()  def __len__(self) -> int:
     def __len__(self) -> int:
         """
             ParticleManager does not know what is the meaning of 'size'
-            __len__ says what i the meaning of 'size' of the array self.particles
+            __len__ says what i the meaning of 'size' of the bank
         """
-        return len(self.particles)
+        return len(self.bank)
 
     def __repr__(self) -> str:
         """
             Used to shows an object
         """
-        return f"ParticleManager({len(self.particles)} particles)"
+        return f"ParticleManager({len(self.bank)} particles)"
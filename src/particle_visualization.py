@@ -1,37 +1,50 @@
 from __future__ import annotations
 # particle_visualization.py
 import numpy as np
-import matplotlib.pyplot as plt
 from matplotlib import cm
 from matplotlib.colors import Normalize
 
+from src.particle_lod import LOD_THRESHOLD, stratified_subsample
+
 
 def draw_particles(ax, particle_manager, energy_distribution: list, 
-                   cmap_name: str="turbo") -> None:
+                   cmap_name: str="turbo", max_points: int | None = LOD_THRESHOLD) -> None:
     """
     Draw only current positions of particles (no trajectories).
         cmap_name : Matplotlib colormap name (e.g. 'turbo', 'bwr', 'coolwarm')
+        max_points: above this, a stratified subsample (src/particle_lod.py)
         
     """
+    bank = particle_manager.bank
+    alive = bank.alive
+    scatter_particles(ax, bank.position[alive], bank.energy[alive], energy_distribution,
+                      cmap_name, max_points=max_points)
+
+
+def scatter_particles(ax, positions: np.ndarray, energies: np.ndarray,
+                      energy_distribution, cmap_name: str = "turbo", point_size: float = 10,
+                      max_points: int | None = None):
+    """
+    All the particles in one scatter, colored by energy with the same
+    normalization as add_energy_colorbar (min / max of energy_distribution).
+    max_points: draw a stratified subsample of the reactor (the axes limits)
+                when there are more particles, None: all of them
+    Returns:
+        the scatter artist, None when there is no energy range
+    """
     if energy_distribution is None or len(energy_distribution) == 0:
-        return
-    
+        return None
+    if max_points is not None and positions.shape[0] > max_points:
+        limits = np.array([ax.get_xlim()[1], ax.get_ylim()[1], ax.get_zlim()[1]])
+        keep = stratified_subsample(positions, max_points, limits, np.random.default_rng(0))
+        positions, energies = positions[keep], energies[keep]
+
     # Colormap and normalization
     cmap = cm.get_cmap(cmap_name)
-    norm = Normalize(vmin=energy_distribution.min(), vmax=energy_distribution.max())
-    
-    for particle in particle_manager.particles:
-        if not particle.alive:
-            continue
-        # Normalize energy in color space
-        color = cmap(norm(particle.energy))
-        ax.scatter(
-            particle.position[0],
-            particle.position[1],
-            particle.position[2],
-            color=color,
-            s=10
-        )
+    norm = Normalize(vmin=np.min(energy_distribution), vmax=np.max(energy_distribution))
+    # Normalize energy in color space
+    return ax.scatter(positions[:, 0], positions[:, 1], positions[:, 2],
+                      c=cmap(norm(energies)), s=point_size)
 
 def add_energy_colorbar(fig, energy_distribution, cmap_name="turbo", label="Neutron Energy [MeV]"):
     """
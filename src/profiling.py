@@ -0,0 +1,242 @@
+from __future__ import annotations
+# profiling.py
+"""
+Lightweight per-phase profiling of the animation and of the physics core.
+
+A Profiler collects, for the current frame (or step):
+    phases      wall time of each named phase, seconds
+    counters    counts of the frame (e.g. "particle_steps")
+and end_frame() closes the frame: it goes into a rolling window (FPS,
+particle-steps/s, mean ms per phase) and, with a trace_path, into a trace
+as CSV (one row per frame) or JSON. The rows go to disk as the frames end,
+so a long traced run keeps no history in memory: a JSON trace is written
+in place, a CSV one as JSON lines next to it (trace_path + ".rows"), turned
+into the CSV by close() once every column is known.
+
+    profiler = Profiler(trace_path="run_trace.csv")
+    with profiler.phase("draw"):
+        ...
+    advance(reactor, particle_manager, dt, timings=profiler.phases)
+    profiler.count("particle_steps", len(particle_manager))
+    profiler.end_frame()
+
+`phases` is a plain dict, so it can be given as the `timings` argument of
+simulation_core.advance / advance_events: the core phases (move, collide,
+walls, tally, transport) land in the same frame.
+
+Disabled (Profiler(enabled=False)), phase() returns a shared do-nothing
+context manager and count() / end_frame() return at once. Callers that
+take an optional profiler use DISABLED when it is None.
+"""
+import collections
+import contextlib
+import csv
+import json
+import os
+import threading
+import time
+
+# Shared context manager of the disabled profilers
+_NO_TIMING = contextlib.nullcontext()
+
+
+class _PhaseTimer:
+    """Adds the time spent in a `with` block to profiler.phases[name]."""
+
+    __slots__ = ("phases", "name", "start")
+
+    def __init__(self, phases: dict, name: str) -> None:
+        self.phases = phases
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.phases[self.name] = (self.phases.get(self.name, 0.0)
+                                  + time.perf_counter() - self.start)
+
+
+class Profiler:
+    """
+    Named phase timers and counters, grouped by frame.
+    end_frame() may run in another thread than summary() (e.g. a
+    SimulationWorker profiled while the UI draws the overlay).
+    """
+
+    def __init__(self, enabled: bool = True, window: int = 60,
+                 trace_path: str | None = None) -> None:
+        """
+        Args:
+            window: number of frames of the rolling statistics
+            trace_path: .csv or .json file, complete after close(), None: no trace
+        """
+        if trace_path is not None and not trace_path.endswith((".csv", ".json")):
+            raise ValueError(f"Trace '{trace_path}' must be a .csv or .json file")
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.phases: dict = {}
+        self.counters: dict = {}
+        self.frame = 0
+        self._frames = collections.deque(maxlen=window)   # (end time, phases, counters)
+        self._trace_file = None             # open from the first traced frame to close()
+        self._trace_rows = 0
+        self._trace_columns: set = set()
+        self._trace_closed = False
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._overlay = None
+
+    def phase(self, name: str):
+        """Context manager timing one phase of the current frame."""
+        if not self.enabled:
+            return _NO_TIMING
+        return _PhaseTimer(self.phases, name)
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add a time measured elsewhere to a phase."""
+        if self.enabled:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: float = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def end_frame(self) -> None:
+        """Close the current frame and start a new one."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        phases, counters = self.phases, self.counters
+        with self._lock:
+            self._frames.append((now, phases, counters))
+        if self.trace_path is not None:
+            row = {"frame": self.frame, "time": now - self._start}
+            row.update((f"{name}_ms", 1e3 * seconds) for name, seconds in phases.items())
+            row.update(counters)
+            self._write_row(row)
+        # new dicts: the closed ones stay in the window unchanged
+        self.phases, self.counters = {}, {}
+        self.frame += 1
+
+    def drop_frame(self) -> None:
+        """Forget the phases and counters of the current frame."""
+        if self.enabled:
+            self.phases, self.counters = {}, {}
+
+    # --------------------------
+    # Rolling statistics
+    # --------------------------
+    def summary(self) -> dict:
+        """
+        Statistics of the frames of the window.
+        Returns:
+            dict with fps, the rate of each counter per second ("<name>_per_s")
+            and the mean ms per frame of each phase ("<name>_ms")
+        """
+        with self._lock:
+            frames = list(self._frames)
+        if len(frames) < 2:
+            return {"fps": 0.0}
+        # the first frame only marks the start of the window
+        elapsed = frames[-1][0] - frames[0][0]
+        frames = frames[1:]
+        summary = {"fps": len(frames) / elapsed if elapsed > 0 else 0.0}
+        totals = collections.Counter()
+        for _, _, counters in frames:
+            totals.update(counters)
+        for name, total in totals.items():
+            summary[f"{name}_per_s"] = total / elapsed if elapsed > 0 else 0.0
+        phases = collections.Counter()
+        for _, frame_phases, _ in frames:
+            phases.update(frame_phases)
+        for name, seconds in phases.items():
+            summary[f"{name}_ms"] = 1e3 * seconds / len(frames)
+        return summary
+
+    def format_summary(self, title: str = "") -> str:
+        """Few lines of text for the overlay or the console."""
+        summary = self.summary()
+        lines = [f"{title}{summary['fps']:6.1f} fps"]
+        for key, value in summary.items():
+            if key.endswith("_per_s"):
+                lines.append(f"{key[:-6].replace('_', '-')}/s {value:10.3e}")
+        for key, value in summary.items():
+            if key.endswith("_ms"):
+                lines.append(f"  {key[:-3]:<10} {value:7.2f} ms")
+        return "\n".join(lines)
+
+    # --------------------------
+    # On-screen overlay
+    # --------------------------
+    def attach_overlay(self, fig, others: dict | None = None,
+                       position: tuple = (0.01, 0.99), every: int = 10) -> None:
+        """
+        Show the rolling statistics in the corner of a figure.
+            others: {title: Profiler} shown below (e.g. the worker thread)
+            every: refresh the text every this many frames
+        """
+        text = fig.text(position[0], position[1], "", ha="left", va="top",
+                        family="monospace", fontsize=8,
+                        bbox={"facecolor": "white", "alpha": 0.7, "edgecolor": "none"})
+        self._overlay = (text, dict(others or {}), every)
+
+    def update_overlay(self) -> list:
+        """Refresh the overlay text. Returns the changed artists."""
+        if self._overlay is None or not self.enabled:
+            return []
+        text, others, every = self._overlay
+        if self.frame % every:
+            return []
+        blocks = [self.format_summary("frames ")]
+        for title, profiler in others.items():
+            blocks.append(profiler.format_summary(f"{title} "))
+        text.set_text("\n".join(blocks))
+        return [text]
+
+    # --------------------------
+    # Trace
+    # --------------------------
+    def _open_trace(self) -> None:
+        if self.trace_path.endswith(".json"):
+            self._trace_file = open(self.trace_path, "w")
+            self._trace_file.write('{"frames": [')
+        else:
+            self._trace_file = open(self.trace_path + ".rows", "w")
+
+    def _write_row(self, row: dict) -> None:
+        """Append one frame to the trace file."""
+        if self._trace_file is None:
+            self._open_trace()
+        if self.trace_path.endswith(".json"):
+            self._trace_file.write(("," if self._trace_rows else "") + "\n" + json.dumps(row))
+        else:
+            self._trace_file.write(json.dumps(row) + "\n")
+            self._trace_columns.update(row)
+        self._trace_rows += 1
+
+    def close(self) -> None:
+        """Finish the trace file, if any."""
+        if self.trace_path is None or not self.enabled or self._trace_closed:
+            return
+        self._trace_closed = True
+        if self._trace_file is None:
+            self._open_trace()
+        if self.trace_path.endswith(".json"):
+            self._trace_file.write('\n], "summary": ' + json.dumps(self.summary()) + "}\n")
+            self._trace_file.close()
+            return
+        self._trace_file.close()
+        # every phase or counter seen in the run is a column, sorted to diff runs
+        columns = sorted(self._trace_columns - {"frame", "time"})
+        rows_path = self.trace_path + ".rows"
+        with open(rows_path) as rows, open(self.trace_path, "w", newline="") as file:
+            writer = csv.DictWriter(file, ["frame", "time"] + columns, restval="")
+            writer.writeheader()
+            for line in rows:
+                writer.writerow(json.loads(line))
+        os.remove(rows_path)
+
+
+# Stand-in for the callers given no profiler
+DISABLED = Profiler(enabled=False)
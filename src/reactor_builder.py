@@ -1,16 +1,25 @@
 from __future__ import annotations
 # reactor_builder.py
+import os
+from typing import NamedTuple
 import numpy as np
 
 from src.area_reactor import ReactorArea
 from src.particle_manager import ParticleManager
 from src.control_rods import ControlRod
 from src.neutron_monitor_flux import NeutronMonitor
+from src.neutron_energy_distribution import neutron_energy_distribution
+from src.trajectory_recorder import TrajectoryRecorder
+from src.scenario import CompiledScenario, load_scenario, build_reactor
+from src.rod_motion import MotionSchedule
+from src.materials import material_table
 
 def element_on_grid(coordinates_list: list, width: float, depth: float, 
-                    height:float, color: str, type_element: str) -> list:
+                    height:float, color: str, type_element: str,
+                    collision_behavior: str = "reflect") -> list:
     """
     Works for absorber and fuel rods
+    collision_behavior: "absorb", "reflect", "transmit" or "fission" (src/collision_engine.py)
     """
     # if statement for debug and experimentation in the code
     if not coordinates_list:    # when coordinates_list is None or []
@@ -19,7 +28,8 @@ def element_on_grid(coordinates_list: list, width: float, depth: float,
     elements = []
     for i, (x, y) in enumerate(coordinates_list):
         elements.append(ControlRod(x, y, width, depth, height, color, 
-                                   f"{type_element}\n{i+1}"))
+                                   f"{type_element}\n{i+1}",
+                                   collision_behavior=collision_behavior))
     return elements
 
 def flux_monitor_on_grid(coordinates_list: list, width: float, depth: float, 
@@ -38,46 +48,132 @@ def populate_reactor(reactor: ReactorArea, reactor_elements: list) -> None:
         
 def populate_particles(particle_manager: ParticleManager, fuel_rods: list, 
                        reactor_height: float, energies: np.ndarray | None = None, 
-                       particles_per_fuel: int = 5, particle_mass: float=1.0) -> None:
+                       particles_per_fuel: int = 5, particle_mass: float=1.0,
+                       rng: np.random.Generator | None = None) -> None:
     """
     Create particle in each fuel rod and adds to ParticleManager
     fuel_rods: list of objects of ControlRod class.
     energies: array with energies in MeV, if None, energy by default
     particle_per_fuel: number of particles er fuel rod
+    rng: random generator for positions and directions, a new one if None
     """
     print('NOTE:\
           energy assumed in arbitrary units\
               (MeV not yet converted to Joules)\
                   src/reactor_builder.py')
     energy_by_default = 1.0 # MeV
-    all_fuel_index = []
-    for i, fuel in enumerate(fuel_rods):
-        all_fuel_index.extend([i] * particles_per_fuel)
-        
+    if rng is None:
+        rng = np.random.default_rng()
+    num_particles = len(fuel_rods) * particles_per_fuel
+    if num_particles == 0:
+        return
+
     # Use the energy
     if energies is None:
-        energies = np.full(len(all_fuel_index), energy_by_default)
-        
-    # Generate particles
-    for idx, fuel_idx in enumerate(all_fuel_index):
-        fuel = fuel_rods[fuel_idx]
-        energy = energies[idx]
-        
-        # random position in z-axis
-        position = np.array([
-            fuel.x_position, fuel.y_position, 
-            np.random.uniform(0, reactor_height)
-            ])
-    
-        # velocity(Energy) E = 1/2 * m * v**2
-        speed = np.sqrt(2 * energy / particle_mass) # module
-        direction = np.random.uniform(-1, 1, 3)     # (x, y, z)
-        norm = np.linalg.norm(direction)
-        if norm == 0:
-            direction = np.array([1.0, 0.0, 0.0])
-        else:
-            direction /= norm      # unit vector
-        velocity = direction * speed
-        
-        # Create particle in ParticleManager
-        particle_manager.spawn(position, velocity, energy)
+        energies = np.full(num_particles, energy_by_default)
+    energies = np.asarray(energies, dtype=np.float64)[:num_particles]
+
+    # Fuel rod center of every particle, particles_per_fuel per rod
+    fuel_xy = np.array([(fuel.x_position, fuel.y_position) for fuel in fuel_rods],
+                       dtype=np.float64)
+    fuel_xy = np.repeat(fuel_xy, particles_per_fuel, axis=0)
+
+    # random position in z-axis
+    positions = np.empty((num_particles, 3))
+    positions[:, :2] = fuel_xy
+    positions[:, 2]  = rng.uniform(0, reactor_height, size=num_particles)
+
+    velocities = random_velocities(energies, rng, particle_mass)
+
+    # Create all particles in ParticleManager at once
+    particle_manager.spawn_many(positions, velocities, energies)
+
+
+def random_velocities(energies: np.ndarray, rng: np.random.Generator,
+                      particle_mass: float = 1.0) -> np.ndarray:
+    """Velocity of each energy, random direction."""
+    num_particles = energies.shape[0]
+    # velocity(Energy) E = 1/2 * m * v**2
+    speed = np.sqrt(2 * energies / particle_mass)           # module
+    direction = rng.uniform(-1, 1, (num_particles, 3))    # (x, y, z)
+    norm = np.linalg.norm(direction, axis=1)
+    zero = norm == 0
+    direction[zero] = (1.0, 0.0, 0.0)
+    norm[zero] = 1.0
+    direction /= norm[:, None]      # unit vector
+    return direction * speed[:, None]
+
+
+class ReactorSetup(NamedTuple):
+    """Everything built by build_scenario / build_demo_reactor."""
+    reactor: ReactorArea
+    absorber_rods: list
+    fuel_rods: list
+    monitors: list
+    particle_manager: ParticleManager
+    energies: np.ndarray
+    settings: dict | None = None    # source / run / materials sections of the scenario
+    schedule: MotionSchedule | None = None  # [[motion]] of the scenario (src/rod_motion.py)
+
+
+# Layout of the demo reactor (formerly hardcoded in main.py)
+DEMO_SCENARIO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "scenarios", "demo.json")
+
+
+def build_scenario(scenario: str | CompiledScenario,
+                   particles_per_fuel: int | None = None,
+                   distribution_name: str | None = None,
+                   recorder: TrajectoryRecorder | None = None,
+                   rng: np.random.Generator | None = None) -> ReactorSetup:
+    """
+    Reactor and particles of a scenario file (src/scenario.py).
+        scenario: path of a .json (or .toml, Python 3.11+) file, or an already compiled one
+        particles_per_fuel, distribution_name: override the [source] section
+    recorder: trajectory recording of the run (src/trajectory_recorder.py)
+    rng: random generator for energies, positions and directions, and for
+         the collisions in the materials of the components (src/materials.py)
+    """
+    compiled = load_scenario(scenario) if isinstance(scenario, str) else scenario
+    reactor, groups = build_reactor(compiled)
+    source = compiled.settings.get("source", {})
+    if particles_per_fuel is None:
+        particles_per_fuel = int(source.get("particles_per_fuel", 5))
+    if distribution_name is None:
+        distribution_name = source.get("distribution", "debug_uniform")
+    fuel_rods = groups["fuel"]
+
+    if rng is None:
+        rng = np.random.default_rng()
+    # Cross-sections of the materials named by the scenario, if any
+    reactor.materials = material_table(reactor.components, compiled.settings.get("materials"), rng)
+
+    # Manage a collection of particles in the reactor
+    particle_manager = ParticleManager(recorder=recorder)
+    num_particles = len(fuel_rods) * particles_per_fuel
+
+    # src.neutron_energy_distribution
+    energies = neutron_energy_distribution(distribution_name, num_particles, rng)
+
+    # Particle system
+    populate_particles(particle_manager, fuel_rods, reactor.height, energies,
+                       particles_per_fuel, float(source.get("particle_mass", 1.0)), rng)
+
+    schedule = None
+    if compiled.settings.get("motion"):
+        schedule = MotionSchedule.from_settings(compiled.settings["motion"], reactor, groups)
+
+    return ReactorSetup(reactor, groups["absorber"], fuel_rods, groups["monitor"],
+                        particle_manager, energies, compiled.settings, schedule)
+
+
+def build_demo_reactor(particles_per_fuel: int = 5,
+                       distribution_name: str = "debug_uniform",
+                       recorder: TrajectoryRecorder | None = None,
+                       rng: np.random.Generator | None = None) -> ReactorSetup:
+    """
+    Demo layout (scenarios/demo.json): 10 x 10 x 8 reactor with 3 absorbers,
+    2 fuel rods and 1 flux monitor, particles_per_fuel neutrons born in each
+    fuel rod.
+    """
+    return build_scenario(DEMO_SCENARIO, particles_per_fuel, distribution_name, recorder, rng)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+# reactor_drawing.py
+"""
+Immediate-mode drawing of the reactor on a 3D matplotlib axes.
+
+The geometry modules (area_reactor, control_rods, neutron_monitor_flux)
+only need NumPy: their draw methods import this module on first use, so
+matplotlib is not loaded by headless runs and worker processes.
+"""
+from mpl_toolkits.mplot3d import Axes3D
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+
+
+def draw_reactor_frame(ax: Axes3D, reactor, color: str = "white") -> None:
+    """
+    Draw the outer wireframe reactor box, in color (white suits a dark
+    background, pick a dark one on white).
+    """
+    width, depth, height = reactor.width, reactor.depth, reactor.height
+
+    # Line segments (pairs of indices)          #    7 ----------6
+    edges_of_reactor = [                        #   / |         /|
+        (0,1), (1,2), (2,3), (3,0),             #  4--|--------5 |
+        (4,5), (5,6), (6,7), (7,4),             #  |  3--------|-2
+        (0,4), (1,5), (2,6), (3,7),             #  | /         |/
+    ]                                           #  0 ----------1
+
+    # 8 corners of the reactor
+    corners = [
+        (0, 0, 0), (width, 0, 0), (width, depth, 0), (0, depth, 0), # 0, 1, 2, 3
+        (0, 0, height), (width, 0, height), (width, depth, height), # 4, 5, 6,
+        (0, depth, height)                                          # 7
+    ]
+
+    # Connect the edges of the container (reactor)
+    for (i,j) in edges_of_reactor:
+        x = [corners[i][0], corners[j][0]]
+        y = [corners[i][1], corners[j][1]]
+        z = [corners[i][2], corners[j][2]]
+        ax.plot(x, y, z, color=color, linewidth=1.2)
+
+
+def draw_component(ax: Axes3D, component) -> None:
+    """
+    Draw a rod or a monitor as a vertical rectangular prism, with its label
+    above the top. faces() starts at base_height, so monitors keep their
+    fixed height.
+    """
+    poly3d = Poly3DCollection(component.faces(), facecolors=component.color_rod,
+                              alpha=0.35, linewidths=0.5)
+    ax.add_collection3d(poly3d)
+
+    z1 = component.base_height + component.height
+    ax.text(component.x_position, component.y_position, z1 + 0.2, component.label,
+            color="black")
+
+
+def draw_reactor(ax: Axes3D, reactor, frame_color: str = "white") -> None:
+    """Draw the frame (in frame_color) and all components."""
+    draw_reactor_frame(ax, reactor, frame_color)
+    for component in reactor.components:
+        component.draw(ax)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+# reactor_geometry.py
+"""
+Packs the reactor components into NumPy tables for the physics code.
+
+Every component is an axis-aligned box: row j of `lower` / `upper` holds
+its minimum / maximum (x, y, z) corner, in the same order as
+ReactorArea.components.
+"""
+import numpy as np
+
+# Behavior codes, same strings used by collision_engine.handle_collision
+BEHAVIOR_NONE     = 0
+BEHAVIOR_ABSORB   = 1
+BEHAVIOR_REFLECT  = 2
+BEHAVIOR_TRANSMIT = 3
+BEHAVIOR_FISSION  = 4   # absorbed in fissile material, see src/criticality.py
+
+BEHAVIOR_CODES = {
+    "absorb":   BEHAVIOR_ABSORB,
+    "reflect":  BEHAVIOR_REFLECT,
+    "transmit": BEHAVIOR_TRANSMIT,
+    "fission":  BEHAVIOR_FISSION,
+}
+
+
+def component_box(component: object) -> tuple:
+    """
+    (x_min, y_min, z_min, x_max, y_max, z_max) of one component.
+    Same bounds as handle_collision: missing base_height / height count as 0.
+    """
+    base = getattr(component, "base_height", 0)
+    height = getattr(component, "height", 0)
+    return (component.x_position - component.width / 2,
+            component.y_position - component.depth / 2,
+            base,
+            component.x_position + component.width / 2,
+            component.y_position + component.depth / 2,
+            base + height)
+
+
+def component_bounds(components: list) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns:
+        lower, upper: arrays of shape (M, 3) with the box corners.
+    """
+    boxes = np.array([component_box(c) for c in components], dtype=np.float64)
+    boxes = boxes.reshape(-1, 6)
+    return boxes[:, :3].copy(), boxes[:, 3:].copy()
+
+
+def behavior_codes(components: list) -> np.ndarray:
+    """
+    Behavior code of each component, "reflect" when it has none.
+    Unknown behaviors map to BEHAVIOR_NONE (the component is ignored).
+    """
+    return np.array([BEHAVIOR_CODES.get(getattr(c, "collision_behavior", "reflect"),
+                                        BEHAVIOR_NONE) for c in components],
+                    dtype=np.int8)
+
+
+def reactor_limits(reactor: object) -> np.ndarray:
+    """Upper corner of the reactor walls, the lower one is (0, 0, 0)."""
+    return np.array([reactor.width, reactor.depth, reactor.height], dtype=np.float64)
@@ -0,0 +1,248 @@
+from __future__ import annotations
+# reactor_renderer.py
+"""
+Retained-mode drawing of the reactor.
+
+The artists are created once: the wireframe, one Poly3DCollection and one
+label per component, and a single scatter for all the particles. Each frame
+only moves what changed (rod vertices when a slider moved, particle
+offsets and colors) instead of clearing the axes and drawing again.
+
+Above lod_threshold alive particles the scatter switches to a level of
+detail (src/particle_lod.py): a stratified subsample of max_points
+particles, semi-transparent voxels of the density, or density heatmaps on
+three walls. Colors keep the energy normalization of the scatter.
+"""
+import numpy as np
+from matplotlib import cm
+from matplotlib.colors import Normalize
+from mpl_toolkits.mplot3d import Axes3D
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+
+from src.area_reactor import ReactorArea
+from src.particle_lod import (LOD_MODES, LOD_THRESHOLD, density_grid, stratified_subsample,
+                              voxel_centers, wall_cells, wall_projections)
+from src.particle_manager import ParticleManager
+from src.reactor_geometry import component_box
+from src.simulation_worker import Snapshot
+
+
+def box_faces(box: tuple) -> list:
+    """6 faces of a (x0, y0, z0, x1, y1, z1) box, as ControlRod.faces."""
+    x0, y0, z0, x1, y1, z1 = box
+    return [
+        [(x0, y0, z0), (x1, y0, z0), (x1, y1, z0), (x0, y1, z0)],   # bottom
+        [(x0, y0, z1), (x1, y0, z1), (x1, y1, z1), (x0, y1, z1)],   # top
+        [(x0, y0, z0), (x1, y0, z0), (x1, y0, z1), (x0, y0, z1)],   # front
+        [(x0, y1, z0), (x1, y1, z0), (x1, y1, z1), (x0, y1, z1)],   # back
+        [(x0, y0, z0), (x0, y1, z0), (x0, y1, z1), (x0, y0, z1)],   # left
+        [(x1, y0, z0), (x1, y1, z0), (x1, y1, z1), (x1, y0, z1)],   # right
+    ]
+
+
+class ReactorRenderer:
+    """
+    Keeps the artists of one reactor on one 3D axes and updates them in place.
+    """
+
+    def __init__(self, ax: Axes3D, reactor: ReactorArea, energy_distribution: np.ndarray,
+                 cmap_name: str = "turbo", point_size: float = 10,
+                 lod_mode: str = "subsample", lod_threshold: int | None = LOD_THRESHOLD,
+                 max_points: int | None = None, lod_shape: tuple = (24, 24, 24)) -> None:
+        """
+        Args:
+            energy_distribution: energies used for the color normalization,
+                                 same as draw_particles / add_energy_colorbar
+            cmap_name: Matplotlib colormap name (e.g. 'turbo', 'bwr', 'coolwarm')
+            lod_mode: "subsample", "voxels" or "walls", used above lod_threshold
+                      alive particles (None: always draw every particle)
+            max_points: particles kept by "subsample", lod_threshold by default
+            lod_shape: voxels of the density grid of "voxels" / "walls"
+        """
+        if lod_mode not in LOD_MODES:
+            raise ValueError(f"LOD mode '{lod_mode}' not supported, use one of {LOD_MODES}")
+        self.ax = ax
+        self.reactor = reactor
+        self.lod_mode = lod_mode
+        self.lod_threshold = lod_threshold
+        self.max_points = max_points or lod_threshold
+        self.lod_shape = tuple(int(n) for n in lod_shape)
+        self.lod_active = False
+        self._limits = np.array([reactor.width, reactor.depth, reactor.height], dtype=np.float64)
+
+        ax.set_xlim(0, reactor.width)
+        ax.set_ylim(0, reactor.depth)
+        ax.set_zlim(0, reactor.height)
+
+        # Static geometry, drawn only once
+        reactor.draw_frame(ax)
+
+        # One collection and one label per component, with the box drawn
+        self._polys = []
+        self._labels = []
+        self._boxes = []
+        for component in reactor.components:
+            poly3d = Poly3DCollection(component.faces(), facecolors=component.color_rod,
+                                      alpha=0.35, linewidths=0.5)
+            ax.add_collection3d(poly3d)
+            z1 = component.base_height + component.height
+            label = ax.text(component.x_position, component.y_position, z1 + 0.2,
+                            component.label, color="black")
+            self._polys.append(poly3d)
+            self._labels.append(label)
+            self._boxes.append(component_box(component))
+        # revision of each component when its vertices were last set
+        self._revisions = [getattr(component, "revision", None)
+                           for component in reactor.components]
+        # bottom and top of each drawn box, compared with the snapshot heights
+        self._bottoms = np.array([box[2] for box in self._boxes], dtype=np.float64)
+        self._tops = np.array([box[5] for box in self._boxes], dtype=np.float64)
+
+        # All the particles in a single scatter, colored by energy
+        if energy_distribution is None or len(energy_distribution) == 0:
+            norm = Normalize(vmin=0.0, vmax=1.0)
+        else:
+            norm = Normalize(vmin=np.min(energy_distribution), vmax=np.max(energy_distribution))
+        self.norm = norm
+        self.cmap = cm.get_cmap(cmap_name)
+        self.scatter = ax.scatter([], [], [], c=[], cmap=self.cmap, norm=norm, s=point_size)
+
+        # Level of detail artists, empty until the threshold is crossed
+        self._voxels = None
+        self._walls = None
+        if lod_mode == "voxels":
+            self._voxel_centers = voxel_centers(self._limits, self.lod_shape)
+            self._voxels = ax.scatter([], [], [], marker="s", s=point_size * 6,
+                                      depthshade=False, linewidths=0)
+        elif lod_mode == "walls":
+            self._walls = Poly3DCollection(wall_cells(self._limits, self.lod_shape),
+                                           facecolors=(0.0, 0.0, 0.0, 0.0), linewidths=0)
+            ax.add_collection3d(self._walls)
+
+    def update_geometry(self) -> list:
+        """
+        Move the vertices of the components whose box changed. Components
+        with change tracking (ControlRod.revision) are skipped when their
+        revision did not change, without computing their box.
+        Returns:
+            the artists that were modified
+        """
+        changed = []
+        for i, component in enumerate(self.reactor.components):
+            revision = getattr(component, "revision", None)
+            if revision is not None and revision == self._revisions[i]:
+                continue
+            self._revisions[i] = revision
+            box = component_box(component)
+            if box == self._boxes[i]:
+                continue
+            changed += self._move_box(i, box)
+        return changed
+
+    def update_heights(self, heights: np.ndarray, base_heights: np.ndarray) -> list:
+        """
+        Move the vertices of the components whose height or base_height
+        changed, from published values (Snapshot.heights / base_heights):
+        the reactor itself is not read, the worker thread owns it.
+        Returns:
+            the artists that were modified
+        """
+        tops = base_heights + heights
+        changed = []
+        for i in np.flatnonzero((base_heights != self._bottoms) | (tops != self._tops)):
+            x0, y0, _, x1, y1, _ = self._boxes[i]
+            changed += self._move_box(i, (x0, y0, float(base_heights[i]),
+                                          x1, y1, float(tops[i])))
+        return changed
+
+    def _move_box(self, i: int, box: tuple) -> list:
+        """Set the vertices and label height of component i to `box`."""
+        self._boxes[i] = box
+        self._bottoms[i], self._tops[i] = box[2], box[5]
+        self._polys[i].set_verts(box_faces(box))
+        self._labels[i].set_3d_properties(box[5] + 0.2, None)
+        return [self._polys[i], self._labels[i]]
+
+    def update_particles(self, positions: np.ndarray, energies: np.ndarray) -> list:
+        """
+        Replace the scatter offsets and colors, or the level of detail
+        artists when there are more than lod_threshold particles.
+        """
+        changed = [self.scatter]
+        lod = self.lod_threshold is not None and positions.shape[0] > self.lod_threshold
+        if lod and self.lod_mode == "subsample":
+            # same seed every frame: a paused simulation keeps the same subsample
+            keep = stratified_subsample(positions, self.max_points, self._limits,
+                                        np.random.default_rng(0))
+            positions, energies = positions[keep], energies[keep]
+        elif lod:
+            # the density replaces the scatter
+            changed += self.update_density(positions, energies)
+            positions, energies = positions[:0], energies[:0]
+        elif self.lod_active and self.lod_mode != "subsample":
+            changed += self.clear_density()
+        self.lod_active = lod
+        self.scatter._offsets3d = (positions[:, 0], positions[:, 1], positions[:, 2])
+        self.scatter.set_array(energies)
+        return changed
+
+    def update_density(self, positions: np.ndarray, energies: np.ndarray) -> list:
+        """Draw the density of these particles with the voxels / walls artists."""
+        counts, energy_sum = density_grid(positions, energies, self._limits, self.lod_shape)
+        if self._voxels is not None:
+            occupied = np.flatnonzero(counts.ravel())
+            colors = self._density_colors(counts.ravel()[occupied],
+                                          energy_sum.ravel()[occupied], 0.6)
+            centers = self._voxel_centers[occupied]
+            self._voxels._offsets3d = (centers[:, 0], centers[:, 1], centers[:, 2])
+            self._voxels.set_facecolor(colors)
+            return [self._voxels]
+        projections = wall_projections(counts, energy_sum)
+        colors = [self._density_colors(total.ravel(), energy.ravel(), 0.8)
+                  for total, energy in projections.values()]
+        self._walls.set_facecolor(np.concatenate(colors))
+        return [self._walls]
+
+    def clear_density(self) -> list:
+        """Hide the voxels / walls artists."""
+        if self._voxels is not None:
+            self._voxels._offsets3d = (np.zeros(0), np.zeros(0), np.zeros(0))
+            self._voxels.set_facecolor(np.zeros((0, 4)))
+            return [self._voxels]
+        self._walls.set_facecolor((0.0, 0.0, 0.0, 0.0))
+        return [self._walls]
+
+    def _density_colors(self, counts: np.ndarray, energy_sum: np.ndarray,
+                        max_alpha: float) -> np.ndarray:
+        """Color of the mean energy, opacity growing with the count (0 when empty)."""
+        occupied = counts > 0
+        mean = np.zeros(counts.shape[0])
+        np.divide(energy_sum, counts, out=mean, where=occupied)
+        colors = self.cmap(self.norm(mean))
+        peak = counts.max() if counts.shape[0] else 0
+        colors[:, 3] = np.where(occupied, 0.05 + (max_alpha - 0.05) * counts / max(peak, 1), 0.0)
+        return colors
+
+    def update(self, particle_manager: ParticleManager) -> list:
+        """
+        Update geometry and alive particles.
+        Returns:
+            every artist that changed in this frame
+        """
+        bank = particle_manager.bank
+        alive = bank.alive
+        return self.update_geometry() + self.update_particles(bank.position[alive],
+                                                              bank.energy[alive])
+
+    def update_snapshot(self, snapshot: Snapshot) -> list:
+        """
+        Same as update(), from a snapshot published by a SimulationWorker:
+        rod heights and particles both come from the snapshot.
+        """
+        return (self.update_heights(snapshot.heights, snapshot.base_heights)
+                + self.update_particles(snapshot.positions, snapshot.energies))
+
+    def artists(self) -> list:
+        """All the artists that can change from one frame to the next."""
+        lod = [artist for artist in (self._voxels, self._walls) if artist is not None]
+        return self._polys + self._labels + [self.scatter] + lod
@@ -0,0 +1,156 @@
+from __future__ import annotations
+# rod_motion.py
+"""
+Scripted, time based motion of the control rods and monitors.
+
+A MotionSchedule is a list of moves: from time `start`, drive an attribute
+("height" or "base_height") of some components towards `target` at
+`speed` (units per time, inf: at once). Helpers:
+    scram(rows, time, height)               full insertion, at once by default
+    withdraw(rows, start, speed, height=0)  gradual withdrawal
+
+apply(reactor, time, dt) moves every scheduled component for the step
+[time, time + dt], all the moves at once in NumPy, and only sets the
+components whose value really changes: the others keep their revision, so
+the geometry tables, the spatial index and the renderer do not see them.
+
+When several moves of the same component have started, the one that
+started last wins (a scram stops a withdrawal). The schedule has no state
+of its own: the next value only depends on the time and the current one,
+so a run resumed from a checkpoint moves the rods the same way.
+
+Scenario files (src/scenario.py) can list the moves:
+    [[motion]]
+    kind = "scram"              # "scram", "withdraw" or "move"
+    components = "absorber"     # a component kind, or a list of row numbers
+    time = 5.0                  # start time
+    speed = 4.0                 # optional, scram: at once, withdraw: required
+    target = 8.0                # optional, scram: reactor height, withdraw: 0
+    attribute = "height"        # optional, "base_height" moves monitors
+"""
+import numpy as np
+
+ATTRIBUTES = ("height", "base_height")
+
+
+class MotionSchedule:
+    """Moves of reactor components (rows of reactor.components) over time."""
+
+    def __init__(self) -> None:
+        self._rows: list = []
+        self._attribute: list = []
+        self._start: list = []
+        self._target: list = []
+        self._speed: list = []
+        self._arrays: tuple | None = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def move(self, rows, start: float, target: float, speed: float = np.inf,
+             attribute: str = "height") -> MotionSchedule:
+        """
+        From `start`, drive `attribute` of the components `rows` towards
+        `target` at `speed`. Returns the schedule, calls can be chained.
+        """
+        if attribute not in ATTRIBUTES:
+            raise ValueError(f"Attribute '{attribute}' not supported, use one of {ATTRIBUTES}")
+        if not speed > 0:
+            raise ValueError(f"Motion speed must be positive, got {speed}")
+        for row in np.atleast_1d(np.asarray(rows, dtype=np.intp)):
+            self._rows.append(int(row))
+            self._attribute.append(ATTRIBUTES.index(attribute))
+            self._start.append(float(start))
+            self._target.append(float(target))
+            self._speed.append(float(speed))
+        self._arrays = None
+        return self
+
+    def scram(self, rows, time: float, height: float, speed: float = np.inf) -> MotionSchedule:
+        """Insert the rods to `height` (e.g. the reactor height) from `time`."""
+        return self.move(rows, time, height, speed)
+
+    def withdraw(self, rows, start: float, speed: float,
+                 height: float = 0.0) -> MotionSchedule:
+        """Pull the rods out, down to `height`, at `speed`."""
+        return self.move(rows, start, height, speed)
+
+    def _tables(self) -> tuple:
+        if self._arrays is None:
+            self._arrays = (np.array(self._rows, dtype=np.intp),
+                            np.array(self._attribute, dtype=np.intp),
+                            np.array(self._start, dtype=np.float64),
+                            np.array(self._target, dtype=np.float64),
+                            np.array(self._speed, dtype=np.float64))
+        return self._arrays
+
+    def apply(self, reactor, time: float, dt: float) -> np.ndarray:
+        """
+        Move the components for the step [time, time + dt].
+        Returns:
+            rows of the components that changed
+        """
+        if not self._rows:
+            return np.zeros(0, dtype=np.intp)
+        rows, attribute, start, target, speed = self._tables()
+        end = time + dt
+        started = np.flatnonzero(start < end)
+        if started.shape[0] == 0:
+            return np.zeros(0, dtype=np.intp)
+
+        # Last started move of each (component, attribute), ties: last added
+        key = rows[started] * len(ATTRIBUTES) + attribute[started]
+        order = started[np.lexsort((started, start[started], key))]
+        key = rows[order] * len(ATTRIBUTES) + attribute[order]
+        last = np.append(key[1:] != key[:-1], True)
+        moves = order[last]
+
+        components = reactor.components
+        names = [ATTRIBUTES[a] for a in attribute[moves]]
+        current = np.array([getattr(components[r], name)
+                            for r, name in zip(rows[moves], names)], dtype=np.float64)
+        # distance covered in this step, from the start of the move if it
+        # started inside the step (inf for a scram, capped by the gap)
+        reach = speed[moves] * (end - np.maximum(start[moves], time))
+        gap = target[moves] - current
+        value = current + np.sign(gap) * np.minimum(np.abs(gap), reach)
+
+        changed = np.flatnonzero(value != current)
+        for k in changed:
+            setattr(components[rows[moves[k]]], names[k], float(value[k]))
+        return rows[moves[changed]]
+
+    @classmethod
+    def from_settings(cls, entries: list, reactor, groups: dict | None = None) -> MotionSchedule:
+        """
+        Schedule of the [[motion]] entries of a scenario file.
+            groups: components by kind, as returned by scenario.build_reactor
+        """
+        schedule = cls()
+        rows_of = {id(component): j for j, component in enumerate(reactor.components)}
+        for entry in entries:
+            selected = entry.get("components", "absorber")
+            if isinstance(selected, str):
+                if groups is None or selected not in groups:
+                    raise ValueError(f"Motion components '{selected}' is not a component kind")
+                rows = [rows_of[id(component)] for component in groups[selected]]
+            else:
+                rows = [int(row) for row in selected]
+
+            kind = entry.get("kind", "move")
+            attribute = entry.get("attribute", "height")
+            start = float(entry.get("time", 0.0))
+            if kind == "scram":
+                schedule.move(rows, start, float(entry.get("target", reactor.height)),
+                              float(entry.get("speed", np.inf)), attribute)
+            elif kind == "withdraw":
+                if "speed" not in entry:
+                    raise ValueError("A withdraw motion needs a speed")
+                schedule.move(rows, start, float(entry.get("target", 0.0)),
+                              float(entry["speed"]), attribute)
+            elif kind == "move":
+                schedule.move(rows, start, float(entry["target"]),
+                              float(entry.get("speed", np.inf)), attribute)
+            else:
+                raise ValueError(f"Motion kind '{kind}' not supported")
+        return schedule
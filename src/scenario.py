@@ -0,0 +1,239 @@
+from __future__ import annotations
+# scenario.py
+"""
+Scenario files: the reactor layout, source and run settings in a JSON or
+TOML file instead of Python code (see scenarios/demo.json; TOML needs the
+tomllib module of Python 3.11+, scenarios/demo.toml is the same layout).
+
+    name = "demo"
+    [reactor]                       width, depth, height
+    [[components]]                  one group of identical boxes
+        kind        "absorber", "fuel", "monitor" or "rod"
+        positions   [[x, y], ...]  and / or
+        lattice     {origin = [x, y], pitch = [px, py], shape = [nx, ny],
+                     skip = [[i, j], ...]}
+        width, depth, height, base_height, color, label
+        behavior    collision behavior (default from the kind)
+        material    name of the material (optional), cross-sections of
+                    data/materials/<material>.csv (src/materials.py)
+        nu, fission_fraction        fission data of the fuel (optional)
+    [materials]                     walls = material of the reactor walls,
+                                    directory = of the material files
+    [source]                        distribution, particles_per_fuel, particle_mass
+    [run]                           dt, steps, mode, seed, ... (runner options)
+    [[motion]]                      scripted rod moves (src/rod_motion.py)
+
+The file is compiled once into packed NumPy tables (one row per component,
+same order as ReactorArea.components). The compiled tables are cached on
+disk, in a .npz named after the sha256 of the file content, so a lattice
+of thousands of positions is only expanded the first time.
+"""
+import hashlib
+import json
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+from src.area_reactor import ReactorArea
+from src.control_rods import ControlRod
+from src.neutron_monitor_flux import NeutronMonitor
+from src.reactor_geometry import BEHAVIOR_CODES
+
+# Bump when the compiled tables change, old cache files are then ignored
+COMPILED_VERSION = 1
+
+# Defaults of each component kind
+KINDS = {
+    "absorber": {"behavior": "absorb",   "color": "blue",  "label": "Abs"},
+    "fuel":     {"behavior": "transmit", "color": "green", "label": "Fuel"},
+    "monitor":  {"behavior": "transmit", "color": "gray",  "label": "flux"},
+    "rod":      {"behavior": "reflect",  "color": "black", "label": "Rod"},
+}
+
+
+class CompiledScenario(NamedTuple):
+    """
+    Packed form of a scenario file.
+        limits: (width, depth, height) of the reactor
+        center: (M, 2) x, y of each component
+        size: (M, 3) width, depth, height
+        base_height: (M,)
+        kind, label, color, behavior, material: (M,) strings
+        nu, fission_fraction: (M,) NaN when not given
+        settings: the other sections (name, source, run, materials)
+    """
+    limits: np.ndarray
+    center: np.ndarray
+    size: np.ndarray
+    base_height: np.ndarray
+    kind: np.ndarray
+    label: np.ndarray
+    color: np.ndarray
+    behavior: np.ndarray
+    material: np.ndarray
+    nu: np.ndarray
+    fission_fraction: np.ndarray
+    settings: dict
+
+
+def read_scenario(path: str) -> dict:
+    """Parse a .json or .toml scenario file."""
+    with open(path, "rb") as file:
+        return parse_scenario(file.read(), path)
+
+
+def parse_scenario(content: bytes, path: str = "scenario.json") -> dict:
+    if path.endswith(".toml"):
+        try:
+            import tomllib      # Python 3.11+
+        except ImportError as error:
+            raise ValueError("TOML scenarios need Python 3.11+, use JSON instead") from error
+        return tomllib.loads(content.decode("utf-8"))
+    if path.endswith(".json"):
+        return json.loads(content)
+    raise ValueError(f"Scenario '{path}' must be a .json or .toml file")
+
+
+def _group_positions(group: dict) -> np.ndarray:
+    """(K, 2) x, y of every box of a component group."""
+    blocks = []
+    if "positions" in group:
+        blocks.append(np.asarray(group["positions"], dtype=np.float64).reshape(-1, 2))
+    if "lattice" in group:
+        lattice = group["lattice"]
+        nx, ny = (int(n) for n in lattice["shape"])
+        i, j = np.meshgrid(np.arange(nx), np.arange(ny), indexing="ij")
+        keep = np.ones((nx, ny), dtype=bool)
+        for skip_i, skip_j in lattice.get("skip", []):
+            keep[skip_i, skip_j] = False
+        origin = np.asarray(lattice.get("origin", (0.0, 0.0)), dtype=np.float64)
+        pitch = np.asarray(lattice["pitch"], dtype=np.float64)
+        blocks.append(origin + np.stack((i[keep], j[keep]), axis=1) * pitch)
+    if not blocks:
+        raise ValueError("A component group needs 'positions' or 'lattice'")
+    return np.concatenate(blocks)
+
+
+def compile_scenario(scenario: dict) -> CompiledScenario:
+    """Expand the component groups into one row per component."""
+    reactor = scenario.get("reactor", {})
+    try:
+        limits = np.array([reactor["width"], reactor["depth"], reactor["height"]],
+                          dtype=np.float64)
+    except KeyError as error:
+        raise ValueError(f"Scenario reactor section misses {error}") from error
+
+    columns = {name: [] for name in ("center", "size", "base_height", "kind", "label",
+                                     "color", "behavior", "material", "nu",
+                                     "fission_fraction")}
+    for group in scenario.get("components", []):
+        kind = group.get("kind", "rod")
+        if kind not in KINDS:
+            raise ValueError(f"Component kind '{kind}' not supported")
+        defaults = KINDS[kind]
+        behavior = group.get("behavior", defaults["behavior"])
+        if behavior not in BEHAVIOR_CODES:
+            raise ValueError(f"Collision behavior '{behavior}' not supported")
+
+        center = _group_positions(group)
+        count = center.shape[0]
+        size = (group["width"], group["depth"], group.get("height", limits[2]))
+        label = group.get("label", defaults["label"])
+        columns["center"].append(center)
+        columns["size"].append(np.tile(np.asarray(size, dtype=np.float64), (count, 1)))
+        columns["base_height"].append(np.full(count, float(group.get("base_height", 0.0))))
+        columns["kind"].append(np.full(count, kind))
+        columns["label"].append(np.array([f"{label}\n{i + 1}" for i in range(count)]))
+        columns["color"].append(np.full(count, group.get("color", defaults["color"])))
+        columns["behavior"].append(np.full(count, behavior))
+        columns["material"].append(np.full(count, group.get("material", "")))
+        columns["nu"].append(np.full(count, float(group.get("nu", np.nan))))
+        columns["fission_fraction"].append(
+            np.full(count, float(group.get("fission_fraction", np.nan))))
+
+    if columns["center"]:
+        packed = {name: np.concatenate(values) for name, values in columns.items()}
+    else:
+        packed = {name: np.zeros(0) for name in columns}
+        packed["center"], packed["size"] = np.zeros((0, 2)), np.zeros((0, 3))
+    settings = {key: value for key, value in scenario.items()
+                if key not in ("reactor", "components")}
+    return CompiledScenario(limits=limits, settings=settings, **packed)
+
+
+def _cache_path(content: bytes, cache_dir: str) -> str:
+    digest = hashlib.sha256(content).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.v{COMPILED_VERSION}.npz")
+
+
+def load_scenario(path: str, cache_dir: str | None = None,
+                  use_cache: bool = True) -> CompiledScenario:
+    """
+    Compiled tables of a scenario file, from the cache when the same content
+    was already compiled.
+        cache_dir: where the compiled files are kept, by default a
+                   .scenario_cache directory next to the scenario file
+    """
+    with open(path, "rb") as file:
+        content = file.read()
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), ".scenario_cache")
+    cached = _cache_path(content, cache_dir)
+
+    if use_cache and os.path.exists(cached):
+        with np.load(cached) as data:
+            tables = {key: data[key] for key in data.files}
+        settings = json.loads(str(tables.pop("settings")))
+        return CompiledScenario(settings=settings, **tables)
+
+    compiled = compile_scenario(parse_scenario(content, path))
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        tables = compiled._asdict()
+        tables["settings"] = np.array(json.dumps(compiled.settings))
+        temporary = cached + ".tmp"
+        with open(temporary, "wb") as file:
+            np.savez(file, **tables)
+        os.replace(temporary, cached)
+    return compiled
+
+
+def build_components(compiled: CompiledScenario) -> list:
+    """One ControlRod / NeutronMonitor per row of the compiled tables."""
+    components = []
+    for j in range(compiled.kind.shape[0]):
+        x, y = compiled.center[j]
+        width, depth, height = compiled.size[j]
+        label, color = str(compiled.label[j]), str(compiled.color[j])
+        behavior = str(compiled.behavior[j])
+        if compiled.kind[j] == "monitor":
+            component = NeutronMonitor(x, y, width, depth, height, color, label,
+                                       collision_behavior=behavior)
+            component.set_base_height(float(compiled.base_height[j]))
+        else:
+            component = ControlRod(x, y, width, depth, height, color, label,
+                                   float(compiled.base_height[j]), behavior)
+        if compiled.material[j]:
+            component.material = str(compiled.material[j])
+        if not np.isnan(compiled.nu[j]):
+            component.nu = float(compiled.nu[j])
+        if not np.isnan(compiled.fission_fraction[j]):
+            component.fission_fraction = float(compiled.fission_fraction[j])
+        components.append(component)
+    return components
+
+
+def build_reactor(compiled: CompiledScenario) -> tuple[ReactorArea, dict]:
+    """
+    Reactor with all the components of the scenario.
+    Returns:
+        reactor, and its components grouped by kind ({"fuel": [...], ...})
+    """
+    width, depth, height = compiled.limits
+    reactor = ReactorArea(width=float(width), depth=float(depth), height=float(height))
+    groups = {kind: [] for kind in KINDS}
+    for kind, component in zip(compiled.kind, build_components(compiled)):
+        reactor.add(component)
+        groups[str(kind)].append(component)
+    return reactor, groups
@@ -0,0 +1,73 @@
+from __future__ import annotations
+# simulation_core.py
+"""
+One physics step of the simulation, without any drawing.
+Used by the animation (simulation_helpers.update_simulation) and by the
+headless runner (batch_runner.py).
+
+advance() is the fixed time step mode. advance_events() moves the
+particles event by event for the same time (src/event_transport.py):
+exact collisions, no tunnelling through thin rods.
+"""
+import time
+
+from src.area_reactor import ReactorArea
+from src.particle_manager import ParticleManager
+from src.collision_engine import handle_collisions, collide_walls, CollisionResults
+from src.flux_tally import score_monitor_tallies
+from src.event_transport import transport, EventResults
+
+
+def advance(reactor: ReactorArea, particle_manager: ParticleManager, dt: float,
+            timings: dict | None = None, tallies: list = ()) -> CollisionResults:
+    """
+    Move all particles by dt, resolve their collisions and score the
+    monitor tallies.
+        timings: optional dict, wall time of each phase (seconds) is added
+                 to timings["move"], timings["collide"], timings["walls"] and
+                 timings["tally"] (e.g. Profiler.phases, src/profiling.py)
+        tallies: extra tallies scored every step, objects with a
+                 score(bank, results, dt) method (e.g. mesh_tally.MeshTally)
+    """
+    bank = particle_manager.bank
+    if timings is None:
+        particle_manager.update_all(dt)
+        results = handle_collisions(bank, reactor)
+        score_monitor_tallies(reactor, bank, results, dt)
+        for tally in tallies:
+            tally.score(bank, results, dt)
+        return results
+
+    start = time.perf_counter()
+    particle_manager.update_all(dt)
+    moved = time.perf_counter()
+    # same as handle_collisions(bank, reactor), with the walls timed apart
+    results = handle_collisions(bank, reactor, walls=False)
+    collided = time.perf_counter()
+    results = collide_walls(bank, reactor, results)
+    reflected = time.perf_counter()
+    score_monitor_tallies(reactor, bank, results, dt)
+    for tally in tallies:
+        tally.score(bank, results, dt)
+    end = time.perf_counter()
+    timings["move"] = timings.get("move", 0.0) + moved - start
+    timings["collide"] = timings.get("collide", 0.0) + collided - moved
+    timings["walls"] = timings.get("walls", 0.0) + reflected - collided
+    timings["tally"] = timings.get("tally", 0.0) + end - reflected
+    return results
+
+
+def advance_events(reactor: ReactorArea, particle_manager: ParticleManager, duration: float,
+                   timings: dict | None = None, tallies: list = ()) -> EventResults:
+    """
+    Move all particles for `duration` with the event-driven transport,
+    scoring the monitor tallies and `tallies` along the way. Counts as one
+    step of the particle manager (trajectories are recorded at its end).
+        timings: optional dict, wall time is added to timings["transport"]
+    """
+    start = time.perf_counter()
+    results = transport(particle_manager.bank, reactor, duration, tallies=tallies)
+    particle_manager.end_step()
+    if timings is not None:
+        timings["transport"] = timings.get("transport", 0.0) + time.perf_counter() - start
+    return results
@@ -1,16 +1,25 @@
 from __future__ import annotations
 # simulation_helpers.py
-from matplotlib.widgets import Slider
+# matplotlib (Slider, draw_particles) is only imported by the functions that
+# draw, so that importing this module stays cheap for headless code
+from typing import TYPE_CHECKING
 
 from src.area_reactor import ReactorArea
+from src.simulation_core import advance
 from src.particle_manager import ParticleManager
-from src.particle_visualization import draw_particles
+from src.profiling import DISABLED, Profiler
+from src.simulation_worker import SimulationWorker
+
+if TYPE_CHECKING:
+    from src.reactor_renderer import ReactorRenderer
 
 def create_sliders(fig, elements_list: list, slider_position: tuple, 
                    slider_dimension: tuple, max_value: float, title: str, slider_color:str):
     """
     Create vertical sliders for a list of elements.
     """
+    from matplotlib.widgets import Slider
+
     x_pos, y_pos = slider_position
     slider_width, slider_height = slider_dimension   
     
@@ -27,22 +36,9 @@ def create_sliders(fig, elements_list: list, slider_position: tuple,
         
     return store_slider
 
-def update_simulation(ax, fig, reactor: ReactorArea, particle_manager: ParticleManager, 
-                      sliders_elements: list, elements_list: list, 
-                      monitor_sliders: list, monitors: list,
-                      animation_state:bool,
-                      energy_distribution: list, dt: float = 0.05) -> None:
-    """
-    Update full simulation step:
-        Apply slider values
-        Move particles
-        Redraw reactor and particles
-    """
-    ax.cla()
-    ax.set_xlim(0, reactor.width)
-    ax.set_ylim(0, reactor.depth)
-    ax.set_zlim(0, reactor.height)
-
+def apply_sliders(sliders_elements: list, elements_list: list,
+                  monitor_sliders: list, monitors: list) -> None:
+    """Push the slider values into the monitors and rods."""
     # Update monitor positions (keep height fixed)
     for slider, monitor in zip(monitor_sliders, monitors):
         monitor.base_height = slider.val
@@ -56,26 +52,94 @@ def update_simulation(ax, fig, reactor: ReactorArea, particle_manager: ParticleM
         elif hasattr(element, "base_height"):
             element.base_height = slider.val
 
+def send_sliders(worker: SimulationWorker, sliders_elements: list, elements_list: list,
+                 monitor_sliders: list, monitors: list) -> None:
+    """Same as apply_sliders, through the command queue of a background worker."""
+    for slider, monitor in zip(monitor_sliders, monitors):
+        worker.set_base_height(monitor, slider.val)
+
+    for slider, element in zip(sliders_elements, elements_list):
+        if hasattr(element, "set_height"):
+            worker.set_height(element, slider.val)
+        elif hasattr(element, "base_height"):
+            worker.set_base_height(element, slider.val)
+
+def update_simulation(ax, fig, reactor: ReactorArea, particle_manager: ParticleManager, 
+                      sliders_elements: list, elements_list: list, 
+                      monitor_sliders: list, monitors: list,
+                      animation_state:bool,
+                      energy_distribution: list, dt: float = 0.05,
+                      renderer: ReactorRenderer | None = None,
+                      worker: SimulationWorker | None = None,
+                      profiler: Profiler | None = None) -> list:
+    """
+    Update full simulation step:
+        Apply slider values
+        Move particles
+        Redraw reactor and particles
+    renderer: if given, its artists are updated in place instead of clearing
+              the axes and drawing everything again (src/reactor_renderer.py)
+    worker: if given (needs a renderer), the physics runs in this background
+            thread (src/simulation_worker.py): sliders, pause and dt are sent
+            as commands and only its latest snapshot is drawn
+    profiler: if given, each phase of the frame is timed (src/profiling.py)
+              and its overlay, if attached, is refreshed
+    Returns:
+        the artists changed in this frame (for FuncAnimation)
+    """
+    if profiler is None:
+        profiler = DISABLED
+
+    if worker is not None:
+        with profiler.phase("sliders"):
+            send_sliders(worker, sliders_elements, elements_list, monitor_sliders, monitors)
+            worker.set_running(animation_state["running"])
+            worker.set_dt(dt)
+        with profiler.phase("snapshot"):
+            snapshot = worker.latest()
+        with profiler.phase("render"):
+            artists = renderer.update_snapshot(snapshot)
+        profiler.end_frame()
+        return artists + profiler.update_overlay()
+
+    if renderer is None:
+        with profiler.phase("clear"):
+            ax.cla()
+            ax.set_xlim(0, reactor.width)
+            ax.set_ylim(0, reactor.depth)
+            ax.set_zlim(0, reactor.height)
+
+    with profiler.phase("sliders"):
+        apply_sliders(sliders_elements, elements_list, monitor_sliders, monitors)
+
     # Move particles
     if animation_state["running"]:
-        for particle in particle_manager.particles:
-            if particle.alive:
-                particle.move(dt)
-                # Wall collisions
-                limits = [reactor.width, reactor.depth, reactor.height]
-                for i in range(3):
-                    if particle.position[i] < 0:
-                        particle.position[i] = 0
-                        particle.velocity[i] *= -1
-                    elif particle.position[i] > limits[i]:
-                        particle.position[i] = limits[i]
-                        particle.velocity[i] *= -1
+        if profiler.enabled:
+            profiler.count("particle_steps", particle_manager.bank.count_alive())
+        # Collisions with all the components and the reactor walls included,
+        # the core adds its own phases (move, collide, walls, tally)
+        advance(reactor, particle_manager, dt,
+                timings=profiler.phases if profiler.enabled else None)
+
+    if renderer is not None:
+        # FuncAnimation redraws the canvas after this call
+        with profiler.phase("render"):
+            artists = renderer.update(particle_manager)
+        profiler.end_frame()
+        return artists + profiler.update_overlay()
 
     # Redraw
-    reactor.draw(ax)
+    from src.particle_visualization import draw_particles
+    with profiler.phase("reactor_draw"):
+        reactor.draw(ax)
     # Particle drawing stays separate
-    draw_particles(ax, particle_manager, energy_distribution)
-    fig.canvas.draw_idle()
+    with profiler.phase("draw_particles"):
+        draw_particles(ax, particle_manager, energy_distribution)
+    with profiler.phase("draw_idle"):
+        fig.canvas.draw_idle()
+    profiler.end_frame()
+    profiler.update_overlay()
+    return []
     
 def connect_keyboard(fig, animation_state: dict):
     """
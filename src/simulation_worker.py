@@ -0,0 +1,209 @@
+from __future__ import annotations
+# simulation_worker.py
+"""
+Physics stepping in a background thread, decoupled from the drawing.
+
+The worker advances the simulation at its own rate and publishes a
+snapshot of the particles after each step. Two snapshot buffers are used:
+the worker fills the back one while the UI reads the front one, and they
+are swapped under a lock. The UI never touches the reactor directly while
+the worker runs: slider changes are sent through a command queue.
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+from src.area_reactor import ReactorArea
+from src.particle_manager import ParticleManager
+from src.profiling import DISABLED, Profiler
+from src.rod_motion import MotionSchedule
+from src.simulation_core import advance
+
+
+class Snapshot:
+    """
+    State published by the worker after one step.
+        positions, energies: alive particles only
+        heights, base_heights: one value per reactor component
+    """
+
+    def __init__(self, num_components: int = 0) -> None:
+        self.step = 0
+        self.count = 0
+        self._positions = np.zeros((0, 3))
+        self._energies  = np.zeros(0)
+        self.heights      = np.zeros(num_components)
+        self.base_heights = np.zeros(num_components)
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self._positions[:self.count]
+
+    @property
+    def energies(self) -> np.ndarray:
+        return self._energies[:self.count]
+
+    def fill(self, step: int, particle_manager: ParticleManager, reactor: ReactorArea) -> None:
+        """Copy the current state, reusing the arrays when they are big enough."""
+        bank = particle_manager.bank
+        alive = bank.alive
+        count = int(np.count_nonzero(alive))
+        if count > self._energies.shape[0]:
+            self._positions = np.zeros((2 * count, 3))
+            self._energies  = np.zeros(2 * count)
+        np.compress(alive, bank.position, axis=0, out=self._positions[:count])
+        np.compress(alive, bank.energy, out=self._energies[:count])
+        for i, component in enumerate(reactor.components):
+            self.heights[i] = component.height
+            self.base_heights[i] = component.base_height
+        self.step = step
+        self.count = count
+
+    def copy(self) -> Snapshot:
+        snapshot = Snapshot(0)
+        snapshot.step = self.step
+        snapshot.count = self.count
+        snapshot._positions = self.positions.copy()
+        snapshot._energies  = self.energies.copy()
+        snapshot.heights = self.heights.copy()
+        snapshot.base_heights = self.base_heights.copy()
+        return snapshot
+
+
+class SimulationWorker(threading.Thread):
+    """
+    Background thread that owns the reactor and the particles.
+
+    Commands (see send()):
+        ("set_height", component_index, value)
+        ("set_base_height", component_index, value)
+        ("running", True / False)
+        ("dt", value)
+    """
+
+    def __init__(self, reactor: ReactorArea, particle_manager: ParticleManager,
+                 dt: float = 0.05, steps_per_second: float | None = None,
+                 profiler: Profiler | None = None,
+                 schedule: MotionSchedule | None = None) -> None:
+        """
+        Args:
+            steps_per_second: maximum stepping rate, None steps as fast as possible
+            profiler: times the phases of each step (src/profiling.py), one
+                      profiler frame per physics step
+            schedule: scripted rod moves (src/rod_motion.py), applied before
+                      each step at the simulated time of the worker
+        """
+        super().__init__(daemon=True)
+        self.reactor = reactor
+        self.particle_manager = particle_manager
+        self.dt = dt
+        self.steps_per_second = steps_per_second
+        self.running = False
+        self.step = 0
+        self.time = 0.0     # simulated time, sum of the dt of the steps
+        self.schedule = schedule
+        self.profiler = profiler if profiler is not None else DISABLED
+
+        self.commands: queue.Queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        num_components = len(reactor.components)
+        self._buffers = [Snapshot(num_components), Snapshot(num_components)]
+        self._front = 0
+        self._buffers[0].fill(0, particle_manager, reactor)
+
+        # last values sent by the UI, to skip commands that change nothing
+        self._sent: dict = {}
+        self._index = {id(component): i for i, component in enumerate(reactor.components)}
+
+    # --------------------------
+    # UI side
+    # --------------------------
+    def send(self, command: str, *args) -> None:
+        """Queue a command, skipped if the same value was already sent."""
+        key = (command,) + args[:-1]
+        if args and self._sent.get(key) == args[-1]:
+            return
+        if args:
+            self._sent[key] = args[-1]
+        self.commands.put((command,) + args)
+
+    def set_height(self, component: object, value: float) -> None:
+        self.send("set_height", self._index[id(component)], value)
+
+    def set_base_height(self, component: object, value: float) -> None:
+        self.send("set_base_height", self._index[id(component)], value)
+
+    def set_running(self, running: bool) -> None:
+        self.send("running", bool(running))
+
+    def set_dt(self, dt: float) -> None:
+        self.send("dt", dt)
+
+    def latest(self) -> Snapshot:
+        """Copy of the last published snapshot."""
+        with self._lock:
+            return self._buffers[self._front].copy()
+
+    def stop(self, timeout: float | None = 1.0) -> None:
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    # --------------------------
+    # Worker side
+    # --------------------------
+    def _apply_commands(self) -> None:
+        while True:
+            try:
+                command, *args = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            if command == "set_height":
+                self.reactor.components[args[0]].set_height(args[1])
+            elif command == "set_base_height":
+                self.reactor.components[args[0]].set_base_height(args[1])
+            elif command == "running":
+                self.running = args[0]
+            elif command == "dt":
+                self.dt = args[0]
+            else:
+                raise ValueError(f"Command '{command}' not supported")
+
+    def _publish(self) -> None:
+        back = 1 - self._front
+        self._buffers[back].fill(self.step, self.particle_manager, self.reactor)
+        with self._lock:
+            self._front = back
+
+    def run(self) -> None:
+        profiler = self.profiler
+        while not self._stop_event.is_set():
+            start = time.perf_counter()
+            with profiler.phase("commands"):
+                self._apply_commands()
+            if self.running:
+                if profiler.enabled:
+                    profiler.count("particle_steps", self.particle_manager.bank.count_alive())
+                if self.schedule is not None:
+                    with profiler.phase("motion"):
+                        self.schedule.apply(self.reactor, self.time, self.dt)
+                advance(self.reactor, self.particle_manager, self.dt,
+                        timings=profiler.phases if profiler.enabled else None)
+                self.step += 1
+                self.time += self.dt
+            with profiler.phase("publish"):
+                self._publish()
+            if self.running:
+                profiler.end_frame()
+            else:
+                # idle loops are not frames
+                profiler.drop_frame()
+
+            if not self.running:
+                # nothing to do until a command arrives
+                time.sleep(0.01)
+            elif self.steps_per_second:
+                time.sleep(max(0.0, 1.0 / self.steps_per_second - (time.perf_counter() - start)))
@@ -0,0 +1,276 @@
+from __future__ import annotations
+# spatial_index.py
+"""
+Uniform grid over the reactor volume to find which component boxes are
+near a particle, instead of testing every particle against every box.
+
+Each grid cell stores the indices of the boxes that overlap it. A query
+takes the segment prev_position -> position of each particle and returns
+only the (particle, component) pairs whose cells overlap the segment.
+
+morton_order sorts particles along a Z-order curve of their cells, so that
+particles close in space are close in memory (ParticleManager.sort_particles).
+"""
+import time
+import numpy as np
+
+# Cells per axis of the Morton order: 2**MORTON_BITS
+MORTON_BITS = 10
+
+
+class UniformGridIndex:
+    """
+    Uniform grid index over axis-aligned boxes inside [0, limits].
+    """
+
+    def __init__(self, limits: np.ndarray, cell_size: float) -> None:
+        """
+        Args:
+            limits: (width, depth, height) of the reactor.
+            cell_size: Edge of one cubic cell.
+        """
+        self.limits = np.asarray(limits, dtype=np.float64)
+        self.cell_size = float(cell_size)
+        self.shape = np.maximum(np.ceil(self.limits / self.cell_size), 1).astype(np.intp)
+        self.num_cells = int(np.prod(self.shape))
+
+        self.lower = np.zeros((0, 3))
+        self.upper = np.zeros((0, 3))
+        # Boxes of each cell in CSR form: the boxes of cell c are
+        # items[offsets[c]:offsets[c + 1]], sorted ...
+        self._offsets = np.zeros(self.num_cells + 1, dtype=np.intp)
+        self._items = np.zeros(0, dtype=np.intp)
+        # ... and {cell: set of boxes} of the cells changed by update() since,
+        # merged into the CSR arrays before the next query
+        self._cells: dict = {}
+        self._dirty = False
+
+        # Cost counters, see report()
+        self.stats = {"builds": 0, "build_time": 0.0,
+                      "updated_rows": 0, "update_time": 0.0,
+                      "queries": 0, "query_time": 0.0,
+                      "particles_queried": 0, "pairs_returned": 0}
+
+    # --------------------------
+    # Build and incremental update
+    # --------------------------
+    def _cell_range(self, lower: np.ndarray, upper: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """First and last (inclusive) cell along each axis covered by [lower, upper]."""
+        first = np.floor(lower / self.cell_size).astype(np.intp)
+        last  = np.floor(upper / self.cell_size).astype(np.intp)
+        first = np.clip(first, 0, self.shape - 1)
+        last  = np.clip(last, 0, self.shape - 1)
+        return first, last
+
+    def _box_cells(self, row: int) -> np.ndarray:
+        """Flat index of every cell overlapped by box `row`."""
+        first, last = self._cell_range(self.lower[row], self.upper[row])
+        ix, iy, iz = np.meshgrid(*(np.arange(f, l + 1) for f, l in zip(first, last)),
+                                 indexing="ij")
+        return np.ravel_multi_index((ix.ravel(), iy.ravel(), iz.ravel()), self.shape)
+
+    def build(self, lower: np.ndarray, upper: np.ndarray) -> None:
+        """Index all boxes from scratch, all of them in one vectorized pass."""
+        start = time.perf_counter()
+        self.lower = np.array(lower, dtype=np.float64).reshape(-1, 3)
+        self.upper = np.array(upper, dtype=np.float64).reshape(-1, 3)
+
+        # every (cell, box) pair: the cells of each box range, unraveled
+        first, last = self._cell_range(self.lower, self.upper)
+        span = last - first + 1
+        count = span.prod(axis=1)
+        box = np.repeat(np.arange(self.lower.shape[0]), count)
+        local = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        offset = np.empty((local.shape[0], 3), dtype=np.intp)
+        local, offset[:, 2] = np.divmod(local, span[box, 2])
+        offset[:, 0], offset[:, 1] = np.divmod(local, span[box, 1])
+        cell = np.ravel_multi_index((first[box] + offset).T, self.shape)
+
+        self._set_pairs(cell, box)
+        self._cells = {}
+        self._dirty = False
+        self.stats["builds"] += 1
+        self.stats["build_time"] += time.perf_counter() - start
+
+    def update(self, rows: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> None:
+        """
+        Move the boxes in `rows` to their new bounds, touching only their cells.
+            lower, upper: (len(rows), 3) new corners
+        """
+        start = time.perf_counter()
+        for k, row in enumerate(np.asarray(rows, dtype=np.intp).tolist()):
+            for cell in self._box_cells(row).tolist():
+                self._cell_set(cell).discard(row)
+            self.lower[row] = lower[k]
+            self.upper[row] = upper[k]
+            for cell in self._box_cells(row).tolist():
+                self._cell_set(cell).add(row)
+            self._dirty = True
+        self.stats["updated_rows"] += len(rows)
+        self.stats["update_time"] += time.perf_counter() - start
+
+    def sync(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """
+        Compare with the current bounds of all boxes and update the changed ones.
+        Returns:
+            Indices of the boxes that moved.
+        """
+        if lower.shape != self.lower.shape:
+            self.build(lower, upper)
+            return np.arange(lower.shape[0])
+        changed = np.flatnonzero(np.any((lower != self.lower) | (upper != self.upper), axis=1))
+        if changed.shape[0]:
+            self.update(changed, lower[changed], upper[changed])
+        return changed
+
+    def _cell_set(self, cell: int) -> set:
+        """Editable boxes of one cell, taken from the CSR arrays the first time."""
+        boxes = self._cells.get(cell)
+        if boxes is None:
+            boxes = set(self._items[self._offsets[cell]:self._offsets[cell + 1]].tolist())
+            self._cells[cell] = boxes
+        return boxes
+
+    def _set_pairs(self, cell: np.ndarray, box: np.ndarray) -> None:
+        """CSR arrays of (cell, box) pairs: grouped by cell, boxes sorted in a cell."""
+        order = np.argsort(cell * max(self.lower.shape[0], 1) + box)
+        self._items = box[order]
+        self._offsets = np.zeros(self.num_cells + 1, dtype=np.intp)
+        np.cumsum(np.bincount(cell, minlength=self.num_cells), out=self._offsets[1:])
+
+    def _flatten(self) -> None:
+        """Merge the cells edited by update() into the CSR arrays."""
+        if not self._dirty:
+            return
+        edited = np.zeros(self.num_cells, dtype=bool)
+        edited[list(self._cells)] = True
+        cell = np.repeat(np.arange(self.num_cells), np.diff(self._offsets))
+        kept = ~edited[cell]
+        new_cell = np.fromiter((c for c, boxes in self._cells.items() for _ in boxes),
+                               dtype=np.intp)
+        new_box = np.fromiter((row for boxes in self._cells.values() for row in boxes),
+                              dtype=np.intp)
+        self._set_pairs(np.concatenate((cell[kept], new_cell)),
+                        np.concatenate((self._items[kept], new_box)))
+        self._cells = {}
+        self._dirty = False
+
+    # --------------------------
+    # Queries
+    # --------------------------
+    def candidates(self, position0: np.ndarray,
+                   position1: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Boxes that may be touched by the segments position0 -> position1.
+        Returns:
+            rows, components: candidate pairs, sorted by row then component,
+                              without duplicates.
+        """
+        start = time.perf_counter()
+        self._flatten()
+        first, last = self._cell_range(np.minimum(position0, position1),
+                                       np.maximum(position0, position1))
+        span = last - first + 1
+
+        # Most segments stay inside one cell: one lookup each, and the pairs
+        # come out already sorted and unique
+        single = (span[:, 0] == 1) & (span[:, 1] == 1) & (span[:, 2] == 1)
+        rows = np.flatnonzero(single)
+        all_rows, all_items = self._gather(rows, first[rows])
+
+        # Longer segments: visit every cell of their bounding box
+        multi = np.flatnonzero(~single)
+        if multi.shape[0]:
+            first, span = first[multi], span[multi]
+            count = span.prod(axis=1)
+            owner = np.repeat(np.arange(multi.shape[0]), count)
+            # k-th cell of each box of cells, unraveled into (dx, dy, dz)
+            local = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+            offset = np.empty((local.shape[0], 3), dtype=np.intp)
+            local, offset[:, 2] = np.divmod(local, span[owner, 2])
+            offset[:, 0], offset[:, 1] = np.divmod(local, span[owner, 1])
+            rows, items = self._gather(multi[owner], first[owner] + offset)
+
+            # a long segment sees the same box from several cells
+            num_boxes = max(self.lower.shape[0], 1)
+            keys = np.unique(np.concatenate((all_rows, rows)) * num_boxes
+                             + np.concatenate((all_items, items)))
+            all_rows, all_items = np.divmod(keys, num_boxes)
+        rows, items = all_rows, all_items
+
+        self.stats["queries"] += 1
+        self.stats["query_time"] += time.perf_counter() - start
+        self.stats["particles_queried"] += position0.shape[0]
+        self.stats["pairs_returned"] += rows.shape[0]
+        return rows, items
+
+    def _gather(self, rows: np.ndarray, cells: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(row, box) pairs for the boxes stored in cells[i] of each rows[i]."""
+        cell = np.ravel_multi_index(cells.T, self.shape)
+        begin = self._offsets[cell]
+        count = self._offsets[cell + 1] - begin
+        # begin[i], begin[i] + 1, ..., begin[i] + count[i] - 1 for every cell
+        local = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        return np.repeat(rows, count), self._items[np.repeat(begin, count) + local]
+
+    def report(self) -> dict:
+        """Build, update and query cost so far."""
+        stats = dict(self.stats)
+        stats["cells"] = self.num_cells
+        stats["boxes"] = self.lower.shape[0]
+        stats["mean_query_time"] = stats["query_time"] / max(stats["queries"], 1)
+        stats["pairs_per_particle"] = stats["pairs_returned"] / max(stats["particles_queried"], 1)
+        return stats
+
+
+def default_cell_size(limits: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> float:
+    """
+    Cell edge close to the mean horizontal size of the boxes, so that a cell
+    holds only a few of them, but never more than 128 cells per axis.
+    """
+    limits = np.asarray(limits, dtype=np.float64)
+    if lower.shape[0] == 0:
+        return float(limits.max())
+    footprint = float(np.mean((upper - lower)[:, :2]))
+    return max(footprint, float(limits.max()) / 128, 1e-9)
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    """Insert two zero bits after each of the 21 low bits (x -> x0 0x1 00x2 ...)."""
+    x = values.astype(np.uint64) & np.uint64(0x1FFFFF)
+    for shift, mask in ((32, 0x1F00000000FFFF), (16, 0x1F0000FF0000FF),
+                        (8, 0x100F00F00F00F00F), (4, 0x10C30C30C30C30C3),
+                        (2, 0x1249249249249249)):
+        x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+    return x
+
+
+def morton_keys(cells: np.ndarray) -> np.ndarray:
+    """
+    Z-order key of (N, 3) integer cells (each index below 2**21): the bits
+    of x, y and z interleaved, so cells close in space get close keys.
+    """
+    cells = np.asarray(cells)
+    return (_spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << np.uint64(1))
+            | (_spread_bits(cells[:, 2]) << np.uint64(2)))
+
+
+def morton_order(positions: np.ndarray, limits: np.ndarray,
+                 bits: int = MORTON_BITS) -> np.ndarray:
+    """
+    Permutation of the positions sorted by the Morton key of their cell in a
+    2**bits per axis grid over [0, limits]. The order inside one cell is
+    arbitrary (but the same for the same positions).
+    """
+    if not 1 <= bits <= 21:
+        raise ValueError(f"Morton keys need 1 to 21 bits per axis, got {bits}")
+    side = 1 << bits
+    # truncation is the floor for the positions inside, the others are clipped
+    cells = (positions * (side / np.asarray(limits, dtype=np.float64))).astype(np.intp)
+    np.clip(cells, 0, side - 1, out=cells)
+    # spread bits of every cell index once, then one gather per axis
+    spread = _spread_bits(np.arange(side))
+    keys = spread[cells[:, 0]]
+    keys |= spread[cells[:, 1]] << np.uint64(1)
+    keys |= spread[cells[:, 2]] << np.uint64(2)
+    return np.argsort(keys)
@@ -0,0 +1,344 @@
+from __future__ import annotations
+# stream_server.py
+"""
+Live state of a running simulation streamed to viewers in other processes.
+
+The physics runs in a SimulationWorker thread (src/simulation_worker.py);
+an asyncio TCP server on localhost reads its latest snapshot at `rate`
+frames per second and sends it to every connected viewer. The server only
+copies the published snapshot, it never waits for the physics, and a
+viewer that reads too slowly has frames dropped instead of slowing
+anything down.
+
+Messages, both ways: 4 byte little-endian length, 1 byte kind, payload.
+    server -> viewer
+        b"H"  hello, JSON: limits, component labels, kinds of commands
+        b"F"  frame, binary (encode_frame / decode_frame)
+        b"E"  error, JSON {"error": text}
+    viewer -> server
+        b"C"  command, JSON {"command": ..., "component": j, "value": x}
+              command: "set_height", "set_base_height" (component: row of
+              reactor.components), "running" (value true / false), "dt"
+
+Frames are compact:
+    header          step, alive particles, particles sent, components, flags
+    positions       uint16 x 3, quantized over the reactor box
+                    (resolution: size / 65535)
+    energies        float16
+    heights,        float32, only when a component moved since the last
+    base_heights    frame sent to this viewer (flag HEIGHTS)
+    tallies         JSON {label: MonitorTally.summary()}
+With more than max_particles alive particles, an evenly spaced subset of
+them is sent (`sent` < `alive`).
+
+Command line (from the repository root):
+    python -m src.stream_server --port 8765 --rate 20 --max-particles 20000
+    python -m src.stream_server --client --port 8765 --frames 50
+"""
+import argparse
+import asyncio
+import json
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+from src.area_reactor import ReactorArea
+from src.simulation_worker import SimulationWorker, Snapshot
+
+# step, alive, sent, components, flags
+FRAME_HEADER = struct.Struct("<QIIHB")
+MESSAGE_HEADER = struct.Struct("<IB")
+FLAG_HEIGHTS = 1
+
+COMMANDS = ("set_height", "set_base_height", "running", "dt")
+
+# A viewer with more unsent bytes than this misses the next frames
+MAX_BUFFERED = 4 * 1024 * 1024
+
+
+class Frame(NamedTuple):
+    """Decoded frame, see decode_frame."""
+    step: int
+    alive: int
+    positions: np.ndarray           # (sent, 3) float32
+    energies: np.ndarray            # (sent,) float32
+    heights: np.ndarray | None      # None: unchanged since the last frame
+    base_heights: np.ndarray | None
+    tallies: dict
+
+
+def subsample(count: int, max_particles: int) -> np.ndarray | slice:
+    """Evenly spaced indices of at most max_particles out of count."""
+    if count <= max_particles:
+        return slice(0, count)
+    return np.linspace(0, count - 1, max_particles).astype(np.intp)
+
+
+def encode_frame(snapshot: Snapshot, limits: np.ndarray, max_particles: int,
+                 tallies: dict | None = None, send_heights: bool = True) -> bytes:
+    """Binary frame of a snapshot (payload of a b"F" message)."""
+    chosen = subsample(snapshot.count, max_particles)
+    positions = snapshot.positions[chosen]
+    energies = snapshot.energies[chosen]
+    quantized = np.rint(np.clip(positions / limits, 0.0, 1.0) * 65535).astype("<u2")
+    num_components = snapshot.heights.shape[0]
+    parts = [FRAME_HEADER.pack(snapshot.step, snapshot.count, positions.shape[0],
+                               num_components, FLAG_HEIGHTS if send_heights else 0),
+             quantized.tobytes(), energies.astype("<f2").tobytes()]
+    if send_heights:
+        parts += [snapshot.heights.astype("<f4").tobytes(),
+                  snapshot.base_heights.astype("<f4").tobytes()]
+    parts.append(json.dumps(tallies or {}).encode("utf-8"))
+    return b"".join(parts)
+
+
+def decode_frame(payload: bytes, limits: np.ndarray) -> Frame:
+    step, alive, sent, num_components, flags = FRAME_HEADER.unpack_from(payload)
+    offset = FRAME_HEADER.size
+    quantized = np.frombuffer(payload, "<u2", 3 * sent, offset).reshape(sent, 3)
+    offset += quantized.nbytes
+    energies = np.frombuffer(payload, "<f2", sent, offset)
+    offset += energies.nbytes
+    heights = base_heights = None
+    if flags & FLAG_HEIGHTS:
+        heights = np.frombuffer(payload, "<f4", num_components, offset).astype(np.float64)
+        offset += heights.shape[0] * 4
+        base_heights = np.frombuffer(payload, "<f4", num_components, offset).astype(np.float64)
+        offset += base_heights.shape[0] * 4
+    positions = quantized.astype(np.float32) / 65535 * np.asarray(limits, dtype=np.float32)
+    return Frame(step, alive, positions, energies.astype(np.float32), heights, base_heights,
+                 json.loads(payload[offset:].decode("utf-8")))
+
+
+def pack_message(kind: bytes, payload: bytes) -> bytes:
+    return MESSAGE_HEADER.pack(len(payload), kind[0]) + payload
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple[bytes, bytes]:
+    """(kind, payload) of the next message, IncompleteReadError at the end."""
+    length, kind = MESSAGE_HEADER.unpack(await reader.readexactly(MESSAGE_HEADER.size))
+    return bytes([kind]), await reader.readexactly(length)
+
+
+class StreamServer:
+    """
+    Streams the snapshots of a SimulationWorker to the connected viewers and
+    forwards their commands to it.
+    """
+
+    def __init__(self, worker: SimulationWorker, reactor: ReactorArea,
+                 host: str = "127.0.0.1", port: int = 8765, rate: float = 20.0,
+                 max_particles: int = 20000) -> None:
+        """
+        Args:
+            port: 0 picks a free port, see self.port once started
+            rate: frames per second sent to each viewer
+            max_particles: particles per frame, evenly spaced subset above
+        """
+        if rate <= 0:
+            raise ValueError(f"Frame rate must be positive, got {rate}")
+        self.worker = worker
+        self.reactor = reactor
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.max_particles = max_particles
+        self.limits = np.array([reactor.width, reactor.depth, reactor.height], dtype=np.float64)
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self._server: asyncio.AbstractServer | None = None
+
+    def hello(self) -> dict:
+        return {"limits": self.limits.tolist(),
+                "components": [str(c.label) for c in self.reactor.components],
+                "max_particles": self.max_particles, "rate": self.rate,
+                "commands": list(COMMANDS)}
+
+    def tallies(self) -> dict:
+        """Monitor summaries, read while the worker runs (values of about the same step)."""
+        return {str(c.label): c.tally.summary() for c in self.reactor.components
+                if getattr(c, "tally", None) is not None}
+
+    def command(self, message: dict) -> None:
+        """Forward one viewer command to the worker."""
+        command = message.get("command")
+        if command not in COMMANDS:
+            raise ValueError(f"Command '{command}' not supported")
+        if command in ("set_height", "set_base_height"):
+            component = int(message["component"])
+            if not 0 <= component < len(self.reactor.components):
+                raise ValueError(f"No component {component}")
+            self.worker.send(command, component, float(message["value"]))
+        elif command == "running":
+            self.worker.set_running(bool(message["value"]))
+        else:
+            self.worker.set_dt(float(message["value"]))
+
+    async def _send_frames(self, writer: asyncio.StreamWriter) -> None:
+        last_step = -1
+        last_heights = None
+        period = 1.0 / self.rate
+        loop = asyncio.get_running_loop()
+        while not writer.is_closing():
+            start = loop.time()
+            snapshot = self.worker.latest()
+            if snapshot.step != last_step:
+                if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                    self.frames_dropped += 1
+                else:
+                    heights = np.concatenate((snapshot.heights, snapshot.base_heights))
+                    moved = last_heights is None or not np.array_equal(heights, last_heights)
+                    payload = encode_frame(snapshot, self.limits, self.max_particles,
+                                           self.tallies(), send_heights=moved)
+                    writer.write(pack_message(b"F", payload))
+                    last_step, last_heights = snapshot.step, heights
+                    self.frames_sent += 1
+            await asyncio.sleep(max(0.0, period - (loop.time() - start)))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.write(pack_message(b"H", json.dumps(self.hello()).encode("utf-8")))
+        sender = asyncio.create_task(self._send_frames(writer))
+        try:
+            while True:
+                kind, payload = await read_message(reader)
+                if kind != b"C":
+                    continue
+                try:
+                    self.command(json.loads(payload))
+                except (ValueError, KeyError, TypeError) as error:
+                    writer.write(pack_message(b"E", json.dumps({"error": str(error)}).encode()))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            sender.cancel()
+            writer.close()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+
+
+class StreamClient:
+    """
+    Minimal viewer: receives the frames and sends commands. Stand-in for a
+    real viewer in tests and scripts.
+    """
+
+    def __init__(self) -> None:
+        self.info: dict = {}
+        self.errors: list = []
+        self.heights: np.ndarray | None = None
+        self.base_heights: np.ndarray | None = None
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def connect(self, host: str = "127.0.0.1", port: int = 8765) -> dict:
+        """Open the connection, returns the hello message of the server."""
+        self._reader, self._writer = await asyncio.open_connection(host, port)
+        kind, payload = await read_message(self._reader)
+        if kind != b"H":
+            raise ValueError("The server did not start with a hello message")
+        self.info = json.loads(payload)
+        return self.info
+
+    async def next_frame(self) -> Frame:
+        """Next frame, heights filled from the last ones when they did not change."""
+        while True:
+            kind, payload = await read_message(self._reader)
+            if kind == b"E":
+                self.errors.append(json.loads(payload)["error"])
+            elif kind == b"F":
+                frame = decode_frame(payload, np.array(self.info["limits"]))
+                if frame.heights is None:
+                    return frame._replace(heights=self.heights, base_heights=self.base_heights)
+                self.heights, self.base_heights = frame.heights, frame.base_heights
+                return frame
+
+    async def send(self, command: str, value, component: int | None = None) -> None:
+        message = {"command": command, "value": value}
+        if component is not None:
+            message["component"] = component
+        self._writer.write(pack_message(b"C", json.dumps(message).encode("utf-8")))
+        await self._writer.drain()
+
+    async def set_height(self, component: int, value: float) -> None:
+        await self.send("set_height", value, component)
+
+    async def set_running(self, running: bool) -> None:
+        await self.send("running", running)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+
+async def watch(host: str, port: int, frames: int, run: bool = True) -> list:
+    """Connect, start the simulation and print `frames` frames."""
+    client = StreamClient()
+    info = await client.connect(host, port)
+    print(f"connected: {len(info['components'])} components, reactor {info['limits']}")
+    if run:
+        await client.set_running(True)
+    received = []
+    for _ in range(frames):
+        frame = await client.next_frame()
+        received.append(frame)
+        print(f"step {frame.step:6d}  {frame.positions.shape[0]:7d} / {frame.alive} particles")
+    await client.close()
+    return received
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Stream a running simulation to viewers.")
+    parser.add_argument("--host", default="127.0.0.1", help="address, localhost by default")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--client", action="store_true",
+                        help="connect to a running server and print its frames")
+    parser.add_argument("--frames", type=int, default=20, help="client: frames to print")
+    parser.add_argument("--rate", type=float, default=20.0, help="frames per second")
+    parser.add_argument("--max-particles", type=int, default=20000,
+                        help="particles per frame, evenly spaced subset above")
+    parser.add_argument("--scenario", default=None, help="scenario file, demo reactor by default")
+    parser.add_argument("--particles-per-fuel", type=int, default=None)
+    parser.add_argument("--dt", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.client:
+        asyncio.run(watch(args.host, args.port, args.frames))
+        return
+
+    from src.reactor_builder import build_demo_reactor, build_scenario
+    rng = np.random.default_rng(args.seed)
+    if args.scenario is None:
+        setup = build_demo_reactor(args.particles_per_fuel or 5, rng=rng)
+    else:
+        setup = build_scenario(args.scenario, args.particles_per_fuel, rng=rng)
+    worker = SimulationWorker(setup.reactor, setup.particle_manager, dt=args.dt,
+                              schedule=setup.schedule)
+    worker.start()
+    server = StreamServer(worker, setup.reactor, args.host, args.port, args.rate,
+                          args.max_particles)
+    print(f"streaming on {args.host}:{args.port}, {args.rate} frames/s (Ctrl+C to stop)")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
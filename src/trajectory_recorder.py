@@ -0,0 +1,254 @@
+from __future__ import annotations
+# trajectory_recorder.py
+"""
+Optional recording of particle trajectories.
+
+Four modes, chosen per run with make_recorder():
+    "off":    nothing is recorded (default, no cost)
+    "ring":   last K positions of every particle, in a fixed-size buffer
+    "stream": sampled positions appended to a binary file on disk
+    "frames": what is needed to draw the run again (src/frame_export.py):
+              positions, energies and the heights of every component
+
+Stream file format, one record per recorded step (little endian):
+    int64 step, int64 count, count * int64 ids, count * 3 * float64 positions
+
+Frames file format, one record per recorded step (little endian):
+    int64 step, int64 count, int64 num_components, count * int64 ids,
+    count * 3 * float32 positions, count * float32 energies,
+    num_components * float32 heights, num_components * float32 base_heights
+"""
+import os
+
+import numpy as np
+
+from src.particle_bank import ParticleBank
+
+
+class TrajectoryRecorder:
+    """
+    Base recorder, records nothing ("off" mode).
+    ParticleManager calls record() after every move and reorder() when the
+    bank rows are compacted or sorted.
+    """
+    mode = "off"
+
+    def record(self, bank: ParticleBank, step: int) -> None:
+        pass
+
+    def reorder(self, indices: np.ndarray) -> None:
+        """The bank kept only rows `indices`, in that order."""
+        pass
+
+    def attach(self, reactor: object) -> None:
+        """Reactor of the run, once it is built (used by the "frames" mode)."""
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class RingTrajectoryRecorder(TrajectoryRecorder):
+    """
+    Keeps the last `length` positions of each particle.
+    Memory is length * capacity * 3 floats, whatever the number of steps.
+    """
+    mode = "ring"
+
+    def __init__(self, length: int, capacity: int = 1024) -> None:
+        if length < 1:
+            raise ValueError("ring length must be at least 1")
+        self.length = int(length)
+        self.head = 0           # slot written by the next record()
+        self.recorded = 0       # number of record() calls
+        self.size = 0
+        self._buffer = np.zeros((self.length, capacity, 3), dtype=np.float64)
+        # recorded value of `recorded` when each particle was first seen
+        self._first = np.zeros(capacity, dtype=np.int64)
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= self._first.shape[0]:
+            return
+        capacity = max(capacity, 2 * self._first.shape[0])
+        buffer = np.zeros((self.length, capacity, 3), dtype=np.float64)
+        buffer[:, :self.size] = self._buffer[:, :self.size]
+        first = np.zeros(capacity, dtype=np.int64)
+        first[:self.size] = self._first[:self.size]
+        self._buffer, self._first = buffer, first
+
+    def record(self, bank: ParticleBank, step: int) -> None:
+        n = bank.size
+        if n > self.size:
+            # new particles: their history starts now
+            self._reserve(n)
+            self._first[self.size:n] = self.recorded
+        self.size = n
+        self._buffer[self.head, :n] = bank.position
+        self.head = (self.head + 1) % self.length
+        self.recorded += 1
+
+    def reorder(self, indices: np.ndarray) -> None:
+        count = indices.shape[0]
+        # rows added since the last record() (e.g. split by a weight window)
+        # were never recorded: grow, and their history starts now
+        self._reserve(int(indices.max()) + 1 if count else 0)
+        first = self._first[indices]
+        first[indices >= self.size] = self.recorded
+        self._buffer[:, :count] = self._buffer[:, indices]
+        self._first[:count] = first
+        self.size = count
+
+    def history(self, row: int) -> np.ndarray:
+        """
+        Recorded positions of bank row `row`, oldest first.
+        Returns:
+            array of shape (K, 3), K <= length
+        """
+        count = min(self.recorded - self._first[row], self.length)
+        slots = (self.head - count + np.arange(count)) % self.length
+        return self._buffer[slots, row].copy()
+
+
+class StreamTrajectoryRecorder(TrajectoryRecorder):
+    """
+    Appends positions to a binary file every `every` steps.
+    Only alive particles whose id is a multiple of `stride` are written.
+    An existing file is overwritten: one file holds one run.
+    """
+    mode = "stream"
+
+    def __init__(self, path: str, every: int = 1, stride: int = 1) -> None:
+        self.path = path
+        self.every = max(int(every), 1)
+        self.stride = max(int(stride), 1)
+        self._file = open(path, "wb")
+
+    def record(self, bank: ParticleBank, step: int) -> None:
+        if step % self.every:
+            return
+        selected = bank.alive.copy()
+        if self.stride > 1:
+            selected &= bank.ids % self.stride == 0
+        rows = np.flatnonzero(selected)
+        header = np.array([step, rows.shape[0]], dtype="<i8")
+        self._file.write(header.tobytes())
+        self._file.write(bank.ids[rows].astype("<i8").tobytes())
+        self._file.write(bank.position[rows].astype("<f8").tobytes())
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+
+class FrameRecorder(StreamTrajectoryRecorder):
+    """
+    Appends, every `every` steps, the alive particles (one out of `stride`)
+    with their energies and the height / base_height of every component of
+    the attached reactor: a run can then be drawn again off-screen.
+    """
+    mode = "frames"
+
+    def __init__(self, path: str, every: int = 1, stride: int = 1) -> None:
+        super().__init__(path, every, stride)
+        self.reactor = None
+
+    def attach(self, reactor: object) -> None:
+        self.reactor = reactor
+
+    def record(self, bank: ParticleBank, step: int) -> None:
+        if step % self.every:
+            return
+        selected = bank.alive.copy()
+        if self.stride > 1:
+            selected &= bank.ids % self.stride == 0
+        rows = np.flatnonzero(selected)
+        components = self.reactor.components if self.reactor is not None else []
+        header = np.array([step, rows.shape[0], len(components)], dtype="<i8")
+        heights = np.array([[c.height for c in components],
+                            [c.base_height for c in components]], dtype="<f4")
+        self._file.write(header.tobytes())
+        self._file.write(bank.ids[rows].astype("<i8").tobytes())
+        self._file.write(bank.position[rows].astype("<f4").tobytes())
+        self._file.write(bank.energy[rows].astype("<f4").tobytes())
+        self._file.write(heights.tobytes())
+
+
+def index_frames(path: str) -> list:
+    """
+    Position of every record of a frames file, without reading the data.
+    Returns:
+        list of (offset, step, count, num_components)
+    """
+    records = []
+    size = os.path.getsize(path)
+    offset = 0
+    with open(path, "rb") as file:
+        while offset < size:
+            file.seek(offset)
+            step, count, num_components = np.frombuffer(file.read(24), dtype="<i8")
+            records.append((offset, int(step), int(count), int(num_components)))
+            offset += 24 + 8 * count + 16 * count + 8 * num_components
+    return records
+
+
+def read_frame(data: np.ndarray, record: tuple) -> dict:
+    """
+    One record of a frames file.
+        data: the file as uint8 (e.g. np.memmap(path, np.uint8, "r"))
+        record: item of index_frames
+    Returns:
+        dict with step, ids, positions, energies, heights, base_heights
+    """
+    offset, step, count, num_components = record
+    offset += 24
+    ids = np.frombuffer(data, dtype="<i8", count=count, offset=offset)
+    offset += 8 * count
+    positions = np.frombuffer(data, dtype="<f4", count=3 * count, offset=offset)
+    offset += 12 * count
+    energies = np.frombuffer(data, dtype="<f4", count=count, offset=offset)
+    offset += 4 * count
+    heights = np.frombuffer(data, dtype="<f4", count=2 * num_components, offset=offset)
+    return {"step": step, "ids": ids, "positions": positions.reshape(-1, 3),
+            "energies": energies, "heights": heights[:num_components],
+            "base_heights": heights[num_components:]}
+
+
+def read_stream(path: str):
+    """
+    Read back a file written by StreamTrajectoryRecorder.
+    Yields:
+        (step, ids, positions) for every recorded step
+    """
+    data = np.fromfile(path, dtype=np.uint8)
+    offset = 0
+    while offset < data.shape[0]:
+        step, count = np.frombuffer(data, dtype="<i8", count=2, offset=offset)
+        offset += 16
+        ids = np.frombuffer(data, dtype="<i8", count=count, offset=offset)
+        offset += 8 * count
+        positions = np.frombuffer(data, dtype="<f8", count=3 * count, offset=offset)
+        offset += 24 * count
+        yield int(step), ids, positions.reshape(-1, 3)
+
+
+def make_recorder(mode: str = "off", length: int = 16, path: str | None = None,
+                  every: int = 1, stride: int = 1) -> TrajectoryRecorder:
+    """
+    Recorder for one run.
+        mode: "off", "ring" (last `length` positions), "stream" (file `path`,
+              every `every` steps, one particle out of `stride`) or "frames"
+              (same, with energies and component heights)
+    """
+    if mode == "off":
+        return TrajectoryRecorder()
+    if mode == "ring":
+        return RingTrajectoryRecorder(length)
+    if mode == "stream":
+        if path is None:
+            raise ValueError("stream recording needs a file path")
+        return StreamTrajectoryRecorder(path, every, stride)
+    if mode == "frames":
+        if path is None:
+            raise ValueError("frames recording needs a file path")
+        return FrameRecorder(path, every, stride)
+    raise ValueError(f"Recording mode '{mode}' not supported")
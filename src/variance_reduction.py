@@ -0,0 +1,182 @@
+from __future__ import annotations
+# variance_reduction.py
+"""
+Variance reduction with statistical weights (ParticleBank.weight).
+
+An analog neutron has weight 1 and dies when it is absorbed, so few of
+them ever reach a small detector. With weights, a particle stands for
+`weight` neutrons, and the tallies score weight * track length:
+    implicit capture   a collision in a material never absorbs: the
+                       weight is multiplied by scatter / total instead
+                       (src/materials.py, MaterialTable.implicit_capture),
+                       and weight_cutoff roulettes the light particles
+    weight window      a mesh over the reactor with a [lower, upper]
+                       weight range per cell: heavier particles are split
+                       in several lighter ones, lighter ones are rouletted
+                       (killed, or brought to the survival weight)
+Splitting and roulette keep the expected weight, so the tallies stay
+unbiased, only their variance changes. Both run after the tallies of a
+step are scored (batch_runner.run_batch).
+
+The window of a detector problem comes from an importance map: high near
+the detector, where particles are split, low far from it, where they are
+rouletted. detector_importance is a simple one, exp(-distance / decay).
+
+Compare the figure of merit of the monitor tallies (flux_tally.RunningStat)
+of an analog and a weighted run:
+    python -m src.batch_runner --steps 2000 --seed 1
+    python -m src.batch_runner --steps 2000 --seed 1 --implicit-capture --weight-window 10 10 8
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from src.reactor_geometry import reactor_limits
+
+
+class WindowResult(NamedTuple):
+    """
+    Particles changed by one WeightWindow.apply.
+        split: particles above the window, created: copies added for them
+        rouletted: particles below the window, killed: the ones that lost
+    """
+    split: int
+    created: int
+    rouletted: int
+    killed: int
+
+
+def roulette(bank, rows: np.ndarray, survival: np.ndarray | float,
+             rng: np.random.Generator) -> np.ndarray:
+    """
+    Russian roulette of the particles `rows`: each one survives with
+    probability weight / survival and then gets the survival weight.
+    Returns:
+        rows of the killed particles
+    """
+    survival = np.broadcast_to(np.asarray(survival, dtype=np.float64), rows.shape)
+    weight = bank.weight[rows]
+    survive = rng.random(rows.shape[0]) * survival < weight
+    bank.weight[rows[survive]] = survival[survive]
+    killed = rows[~survive]
+    bank.alive[killed] = False
+    return killed
+
+
+def weight_cutoff(bank, cutoff: float, survival: float,
+                  rng: np.random.Generator) -> WindowResult:
+    """
+    Roulette the alive particles lighter than `cutoff` (implicit capture
+    without a weight window), as a window without upper bound.
+    """
+    rows = np.flatnonzero(bank.alive & (bank.weight < cutoff))
+    killed = roulette(bank, rows, survival, rng)
+    return WindowResult(0, 0, int(rows.shape[0]), int(killed.shape[0]))
+
+
+def split(bank, rows: np.ndarray, copies: np.ndarray) -> int:
+    """
+    Split each particle of `rows` in copies[k] particles of weight / copies[k],
+    the new ones appended to the bank at the same position.
+    Returns:
+        number of particles added
+    """
+    bank.weight[rows] /= copies
+    extra = np.repeat(rows, copies - 1)
+    if extra.shape[0]:
+        bank.spawn_many(bank.position[extra], bank.velocity[extra], bank.energy[extra],
+                        bank.weight[extra])
+    return int(extra.shape[0])
+
+
+def mesh_cells(positions: np.ndarray, limits: np.ndarray, shape: tuple) -> np.ndarray:
+    """Flat cell index of each position in a `shape` mesh over [0, limits]."""
+    shape_array = np.array(shape, dtype=np.intp)
+    cells = np.floor(positions / limits * shape_array).astype(np.intp)
+    np.clip(cells, 0, shape_array - 1, out=cells)
+    return np.ravel_multi_index(cells.T, shape)
+
+
+def cell_centers(limits: np.ndarray, shape: tuple) -> np.ndarray:
+    """(nx, ny, nz, 3) center of each cell of the mesh."""
+    axes = [(np.arange(n) + 0.5) * (limit / n) for limit, n in zip(limits, shape)]
+    return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1)
+
+
+def detector_importance(reactor, shape: tuple, targets: np.ndarray,
+                        decay_length: float | None = None) -> np.ndarray:
+    """
+    exp(-distance to the nearest target / decay_length) for each cell.
+        targets: (K, 3) points (e.g. centers of the monitors)
+        decay_length: a quarter of the mean reactor size by default
+    """
+    limits = reactor_limits(reactor)
+    if decay_length is None:
+        decay_length = float(limits.mean()) / 4
+    if not decay_length > 0:
+        raise ValueError(f"Decay length must be positive, got {decay_length}")
+    centers = cell_centers(limits, tuple(shape))
+    targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+    distance = np.min(np.linalg.norm(centers[..., None, :] - targets, axis=-1), axis=-1)
+    return np.exp(-distance / decay_length)
+
+
+class WeightWindow:
+    """
+    Weight window mesh over the reactor.
+        lower: (nx, ny, nz) lower weight bound of each cell
+        upper = lower * ratio, survival weight of the roulette = lower * sqrt(ratio)
+        max_split: copies of one particle at most, per step
+    """
+
+    def __init__(self, reactor, lower: np.ndarray, ratio: float = 5.0, max_split: int = 10,
+                 rng: np.random.Generator | None = None) -> None:
+        lower = np.asarray(lower, dtype=np.float64)
+        if lower.ndim != 3:
+            raise ValueError("The lower bounds must be an (nx, ny, nz) array")
+        if not ratio > 1:
+            raise ValueError(f"Window ratio must be larger than 1, got {ratio}")
+        if np.any(lower <= 0):
+            raise ValueError("Window lower bounds must be positive")
+        self.limits = reactor_limits(reactor)
+        self.shape = lower.shape
+        self.lower = lower.ravel()
+        self.upper = self.lower * ratio
+        self.survival = self.lower * np.sqrt(ratio)
+        self.max_split = int(max_split)
+        self.rng = np.random.default_rng() if rng is None else rng
+
+    @classmethod
+    def from_importance(cls, reactor, importance: np.ndarray, source_positions: np.ndarray,
+                        source_weight: float = 1.0, ratio: float = 5.0, max_split: int = 10,
+                        rng: np.random.Generator | None = None) -> WeightWindow:
+        """
+        Window inversely proportional to the importance, scaled so that the
+        source particles (source_weight, at source_positions) are at the
+        center of the window of their cells.
+        """
+        importance = np.asarray(importance, dtype=np.float64)
+        if np.any(importance <= 0):
+            raise ValueError("Importances must be positive")
+        limits = reactor_limits(reactor)
+        cells = mesh_cells(np.asarray(source_positions, dtype=np.float64).reshape(-1, 3),
+                           limits, importance.shape)
+        reference = float(importance.ravel()[cells].mean())
+        lower = source_weight / np.sqrt(ratio) * reference / importance
+        return cls(reactor, lower, ratio, max_split, rng)
+
+    def apply(self, bank) -> WindowResult:
+        """Split and roulette the alive particles outside the window of their cell."""
+        alive = np.flatnonzero(bank.alive)
+        cells = mesh_cells(bank.position[alive], self.limits, self.shape)
+        weight = bank.weight[alive]
+
+        light = weight < self.lower[cells]
+        killed = roulette(bank, alive[light], self.survival[cells[light]], self.rng)
+
+        heavy = weight > self.upper[cells]
+        copies = np.minimum(np.ceil(weight[heavy] / self.upper[cells[heavy]]),
+                            self.max_split).astype(np.intp)
+        created = split(bank, alive[heavy], copies)
+        return WindowResult(int(np.count_nonzero(heavy)), created,
+                            int(np.count_nonzero(light)), int(killed.shape[0]))
@@ -0,0 +1,85 @@
+from __future__ import annotations
+# test_collision_engine.py
+"""
+The batch engine (handle_collisions) must give the same bank as the
+original scalar code: handle_collision for each component until it
+returns True, then the per-axis wall loop of update_simulation.
+"""
+import numpy as np
+import pytest
+
+from src.collision_engine import NO_COMPONENT, handle_collision, handle_collisions
+from src.particle_manager import ParticleManager
+from src.scenario import build_reactor, compile_scenario
+
+FIELDS = ("position", "prev_position", "velocity", "energy", "alive")
+
+
+def make_reactor(num_components: int, seed: int):
+    """Random boxes of every behavior, some of them overlapping."""
+    rng = np.random.default_rng(seed)
+    groups = []
+    for k in range(num_components):
+        groups.append({"kind": "rod", "positions": [rng.uniform(1.0, 9.0, 2).tolist()],
+                       "width": float(rng.uniform(0.5, 2.5)),
+                       "depth": float(rng.uniform(0.5, 2.5)),
+                       "height": float(rng.uniform(1.0, 6.0)),
+                       "behavior": ("absorb", "reflect", "transmit", "fission")[k % 4]})
+    compiled = compile_scenario({"reactor": {"width": 10, "depth": 10, "height": 8},
+                                 "components": groups})
+    return build_reactor(compiled)[0]
+
+
+def make_particles(num_particles: int, seed: int) -> ParticleManager:
+    """Particles inside the reactor and beyond its walls after the move."""
+    rng = np.random.default_rng(seed)
+    particle_manager = ParticleManager(capacity=num_particles)
+    particle_manager.spawn_many(rng.uniform(0.0, [10, 10, 8], (num_particles, 3)),
+                                rng.normal(0.0, 10.0, (num_particles, 3)),
+                                rng.uniform(0.1, 10.0, num_particles))
+    particle_manager.update_all(0.1)
+    return particle_manager
+
+
+def scalar_collisions(particle_manager: ParticleManager, reactor, elastic: bool) -> np.ndarray:
+    """The original loops. Returns the component hit by each particle."""
+    hit = np.full(len(particle_manager.bank), NO_COMPONENT)
+    for i, particle in enumerate(particle_manager.particles):
+        for j, component in enumerate(reactor.components):
+            if handle_collision(particle, component, elastic):
+                hit[i] = j
+                break
+
+    # Wall collisions, per particle and per axis
+    limits = [reactor.width, reactor.depth, reactor.height]
+    for particle in particle_manager.particles:
+        if particle.alive:
+            for i in range(3):
+                if particle.position[i] < 0:
+                    particle.position[i] = 0
+                    particle.velocity[i] *= -1
+                elif particle.position[i] > limits[i]:
+                    particle.position[i] = limits[i]
+                    particle.velocity[i] *= -1
+    return hit
+
+
+@pytest.mark.parametrize("elastic", [True, False])
+@pytest.mark.parametrize("use_index", [True, False])
+@pytest.mark.parametrize("seed", range(4))
+def test_batch_matches_scalar(elastic: bool, use_index: bool, seed: int) -> None:
+    reactor = make_reactor(12, seed)
+    scalar = make_particles(2000, seed)
+    batch = make_particles(2000, seed)
+
+    hit = scalar_collisions(scalar, reactor, elastic)
+    results = handle_collisions(batch.bank, reactor, elastic=elastic, use_index=use_index)
+
+    np.testing.assert_array_equal(results.component, hit)
+    for name in FIELDS:
+        np.testing.assert_array_equal(getattr(batch.bank, name), getattr(scalar.bank, name),
+                                      err_msg=name)
+    # the population really exercises every branch
+    assert np.count_nonzero(hit != NO_COMPONENT) > 50
+    assert not batch.bank.alive.all()
+    assert results.wall.any()
@@ -0,0 +1,45 @@
+from __future__ import annotations
+# test_trajectory_recorder.py
+"""
+The ring recorder must follow the bank rows when particles are added
+between two steps (weight window splitting) and the bank is compacted
+before the next record().
+"""
+import numpy as np
+
+from src.particle_manager import ParticleManager
+from src.trajectory_recorder import RingTrajectoryRecorder
+from src.variance_reduction import split
+
+
+def test_split_then_compact_keeps_ring_histories():
+    rng = np.random.default_rng(0)
+    recorder = RingTrajectoryRecorder(3, capacity=8)
+    particle_manager = ParticleManager(capacity=8, recorder=recorder)
+    bank = particle_manager.bank
+    particle_manager.spawn_many(rng.uniform(0.0, 10.0, (8, 3)), rng.normal(0.0, 1.0, (8, 3)),
+                                np.ones(8))
+    positions = []
+    for _ in range(4):
+        particle_manager.update_all(0.1)
+        positions.append(bank.position.copy())
+
+    # the bank grows past the capacity of the ring, then dead rows are removed
+    bank.weight[:] = 4.0
+    created = split(bank, np.arange(8), np.full(8, 3))
+    assert created == 16 and bank.size == 24
+    bank.alive[::3] = False
+    kept = np.flatnonzero(bank.alive)
+    particle_manager.remove_dead()
+    assert recorder.size == bank.size == kept.shape[0]
+
+    for row, old in enumerate(kept):
+        history = recorder.history(row)
+        if old < 8:
+            np.testing.assert_array_equal(history, np.array(positions[-3:])[:, old])
+        else:
+            assert history.shape == (0, 3)
+
+    particle_manager.update_all(0.1)
+    for row in range(bank.size):
+        np.testing.assert_array_equal(recorder.history(row)[-1], bank.position[row])